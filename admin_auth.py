@@ -0,0 +1,19 @@
+"""
+管理接口鉴权模块
+设置 ADMIN_TOKEN 后管理接口需要携带 X-Admin-Token 请求头；
+未设置时只允许本机访问
+"""
+
+import hmac
+import os
+
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1', '::ffff:127.0.0.1')
+
+
+def is_admin_request(handler) -> bool:
+    """判断 BaseHTTPRequestHandler 当前请求是否有权访问管理接口"""
+    admin_token = os.getenv('ADMIN_TOKEN')
+    if admin_token:
+        provided = handler.headers.get('X-Admin-Token', '')
+        return hmac.compare_digest(provided.encode('utf-8'), admin_token.encode('utf-8'))
+    return handler.client_address[0] in LOOPBACK_ADDRESSES
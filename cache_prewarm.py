@@ -0,0 +1,194 @@
+"""
+缓存预热模块
+启动时从单词表或单词本导出文件读取常用词汇，通过预翻译任务队列
+按限速在后台翻译并写入缓存，减少冷启动时集中访问腾讯API
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Iterator, List, Optional
+
+from translation_jobs import JobQueueFullError
+
+logger = logging.getLogger(__name__)
+
+# 单词本导出/导入使用的中文列名（见 wordbook.html）
+WORDBOOK_WORD_COLUMN = '单词'
+PROGRESS_INTERVAL = 10.0
+
+
+def _iter_json_entries(data) -> Iterator[str]:
+    if isinstance(data, dict):
+        data = data.get('wordbook') or data.get('words') or []
+    for item in data:
+        if isinstance(item, str):
+            yield item
+        elif isinstance(item, dict):
+            word = item.get('word') or item.get(WORDBOOK_WORD_COLUMN)
+            if isinstance(word, str):
+                yield word
+
+
+def _iter_csv_entries(content: str) -> Iterator[str]:
+    import csv
+    import io
+
+    reader = csv.reader(io.StringIO(content))
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [column.strip().lstrip('\ufeff') for column in header]
+    if WORDBOOK_WORD_COLUMN in header:
+        column = header.index(WORDBOOK_WORD_COLUMN)
+    else:
+        # 没有表头的单列文件，第一行也是词条
+        column = 0
+        yield header[0]
+    for row in reader:
+        if len(row) > column:
+            yield row[column]
+
+
+def load_prewarm_entries(path: str) -> List[str]:
+    """
+    读取预热词条，支持：
+    - 单词本 localStorage 中的 JSON 数组（对象含 word 字段）或字符串数组
+    - wordbook.html 导出的 CSV（含“单词”列）
+    - 每行一个单词或短语的纯文本文件
+    """
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        content = f.read()
+
+    stripped = content.lstrip()
+    if path.lower().endswith('.json') or stripped.startswith(('[', '{')):
+        entries = _iter_json_entries(json.loads(content))
+    elif path.lower().endswith('.csv'):
+        entries = _iter_csv_entries(content)
+    else:
+        entries = content.splitlines()
+
+    seen = set()
+    result = []
+    for entry in entries:
+        entry = entry.strip()
+        if entry and entry not in seen:
+            seen.add(entry)
+            result.append(entry)
+    return result
+
+
+def parse_prewarm_args(argv: List[str]) -> Optional[dict]:
+    """
+    解析命令行预热参数：
+    --prewarm=PATH  --prewarm-source=en  --prewarm-target=zh  --prewarm-wait
+    """
+    options = {'path': None, 'source': 'en', 'target': 'zh', 'wait': False}
+    for arg in argv:
+        if arg.startswith('--prewarm='):
+            options['path'] = arg.split('=', 1)[1]
+        elif arg.startswith('--prewarm-source='):
+            options['source'] = arg.split('=', 1)[1]
+        elif arg.startswith('--prewarm-target='):
+            options['target'] = arg.split('=', 1)[1]
+        elif arg == '--prewarm-wait':
+            options['wait'] = True
+    return options if options['path'] else None
+
+
+class CachePrewarmer:
+    """
+    把预热词条提交为预翻译任务，并定期报告进度和缓存命中率
+
+    任务队列有总句数上限（TRANSLATION_JOB_MAX_QUEUED），词条按剩余空间分批提交，
+    每批最多占用上限的一半，给用户提交的文档任务留出空间；其余词条等队列消化后再提交
+    """
+
+    def __init__(self, job_queue, cache, interval: float = PROGRESS_INTERVAL):
+        self.job_queue = job_queue
+        self.cache = cache
+        self.interval = interval
+        self.jobs = []
+        self.total = None
+        self.source = 'en'
+        self.target = 'zh'
+        self._remaining = []
+        self._lock = threading.Lock()
+
+    def start(self, path: str, source: str = 'en', target: str = 'zh', wait: bool = False) -> None:
+        entries = load_prewarm_entries(path)
+        logger.info(f'缓存预热: 从 {path} 读取 {len(entries)} 个词条 ({source} -> {target})')
+        self.total = len(entries)
+        self.source = source
+        self.target = target
+        self._remaining = entries
+        self._submit_next()
+
+        if wait:
+            self._report_until_done()
+        else:
+            thread = threading.Thread(target=self._report_until_done, name='cache-prewarm', daemon=True)
+            thread.start()
+
+    def _submit_next(self) -> None:
+        """提交队列放得下的下一批词条"""
+        with self._lock:
+            self._submit_locked()
+
+    def _submit_locked(self) -> None:
+        if not self._remaining:
+            return
+        size = len(self._remaining)
+        if self.job_queue.max_queued > 0:
+            size = min(size, max(self.job_queue.max_queued // 2, 1) - self.job_queue.depth())
+            if size <= 0:
+                return
+        batch = self._remaining[:size]
+        try:
+            job = self.job_queue.submit(iter(batch), self.source, self.target, max_segments=len(batch))
+        except JobQueueFullError:
+            # 用户任务刚好占满了队列，下次报告进度时再试
+            return
+        self.jobs.append(job)
+        self._remaining = self._remaining[size:]
+        if self._remaining:
+            logger.info(f'缓存预热: 已提交 {self.submitted} 个词条，其余 {len(self._remaining)} 个等队列空闲后提交')
+
+    @property
+    def submitted(self) -> int:
+        return sum(job.total for job in self.jobs)
+
+    def _finished(self) -> bool:
+        return not self._remaining and all(job.status == 'completed' for job in self.jobs)
+
+    def _report_until_done(self) -> None:
+        last_report = time.monotonic()
+        while not self._finished():
+            time.sleep(0.5)
+            self._submit_next()
+            if time.monotonic() - last_report >= self.interval:
+                last_report = time.monotonic()
+                status = self.status()
+                logger.info(f'缓存预热进度: {status["done"]}/{self.total}, '
+                            f'已在缓存中 {status["cached"]} 个')
+        status = self.status()
+        logger.info(f'缓存预热完成: {self.total} 个词条, 已在缓存中 {status["cached"]} 个, '
+                    f'失败 {status["failed"]} 个, 缓存状态 {self.cache.stats()}')
+
+    def status(self) -> Optional[dict]:
+        if self.total is None:
+            return None
+        done = sum(job.done for job in self.jobs)
+        return {
+            'status': 'completed' if self._finished() else 'running',
+            'source': self.source,
+            'target': self.target,
+            'total': self.total,
+            'submitted': self.submitted,
+            'done': done,
+            'failed': sum(job.failed for job in self.jobs),
+            'cached': sum(job.cached for job in self.jobs),
+            'progress': round(done / self.total, 4) if self.total else 1.0,
+            'job_ids': [job.job_id for job in self.jobs],
+        }
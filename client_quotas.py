@@ -0,0 +1,253 @@
+"""
+客户端配额与公平调度模块
+按客户端（登记的 API 令牌或 IP）统计用量，每个客户端一个令牌桶配额；
+发往腾讯API的调用经过加权公平队列（起始时间公平排队），并发上限内按
+各客户端的虚拟时间轮流放行，大量请求的客户端只会让自己变慢，不会堵住其他学生
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from request_deadline import DeadlineExceededError
+from translation_jobs import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 5
+# 未登记令牌的客户端按IP计量，同一教室的学生经常共用一个出口地址，
+# 自动参考译文和通道请求也记在同一个桶里，默认值按一个班级而不是一个人估算
+DEFAULT_CLIENT_RATE = 10.0
+DEFAULT_CLIENT_BURST = 100.0
+DEFAULT_MAX_WAIT = 10.0
+DEFAULT_MAX_CLIENTS = 10000
+# 预翻译任务和缓存预热不经过 HTTP 请求，统一记在这个客户端名下；
+# 它们已经受 TRANSLATION_JOB_RATE 限速，因此不再套用客户端令牌桶
+BACKGROUND_CLIENT = 'jobs'
+DEFAULT_WEIGHTS = {BACKGROUND_CLIENT: 0.5}
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def _parse_pairs(value: Optional[str]) -> Dict[str, str]:
+    """解析 "a=1,b=2" 形式的环境变量"""
+    pairs = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            key, val = item.split('=', 1)
+            if key.strip() and val.strip():
+                pairs[key.strip()] = val.strip()
+    return pairs
+
+
+class ThrottledError(Exception):
+    """客户端超出配额，或在等待上限内没有轮到上游调用"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _ClientState:
+    def __init__(self, client_id: str, weight: float, bucket: Optional[RateLimiter]):
+        self.client_id = client_id
+        self.weight = weight
+        self.bucket = bucket
+        self.last_finish = 0.0
+        self.requests = 0
+        self.upstream_calls = 0
+        self.characters = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.last_seen = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'client': self.client_id,
+            'weight': self.weight,
+            'requests': self.requests,
+            'upstream_calls': self.upstream_calls,
+            'characters': self.characters,
+            'throttled': self.throttled,
+            'rejected': self.rejected,
+            'wait_ms': round(self.wait_seconds * 1000, 1),
+            'last_seen': self.last_seen,
+        }
+
+
+class FairScheduler:
+    """
+    限制同时进行的上游调用数，并按加权公平队列决定等待者的放行顺序
+
+    每次调用的起始标签为 max(虚拟时间, 该客户端上一次的结束标签)，
+    结束标签 = 起始标签 + 1 / 权重；放行时虚拟时间推进到被放行请求的起始标签。
+    """
+
+    def __init__(self, concurrency: Optional[int] = None, rate: Optional[float] = None,
+                 burst: Optional[float] = None, max_wait: Optional[float] = None,
+                 weights: Optional[Dict[str, float]] = None, tokens: Optional[Dict[str, str]] = None,
+                 max_clients: int = DEFAULT_MAX_CLIENTS):
+        self.concurrency = concurrency if concurrency is not None else \
+            int(_env_float('UPSTREAM_CONCURRENCY', DEFAULT_CONCURRENCY))
+        self.rate = rate if rate is not None else _env_float('CLIENT_RATE', DEFAULT_CLIENT_RATE)
+        self.burst = burst if burst is not None else _env_float('CLIENT_BURST', DEFAULT_CLIENT_BURST)
+        self.max_wait = max_wait if max_wait is not None else \
+            _env_float('CLIENT_MAX_WAIT', DEFAULT_MAX_WAIT)
+        self.weights = dict(DEFAULT_WEIGHTS)
+        self.weights.update(weights or {})
+        # 令牌 -> 客户端名；只认登记过的令牌，否则随便换个令牌就能拿到新配额
+        self.tokens = tokens or {}
+        self.max_clients = max_clients
+        self._clients = OrderedDict()
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._active = 0
+
+    @classmethod
+    def from_env(cls) -> 'FairScheduler':
+        """CLIENT_TOKENS="名称=令牌,..."，CLIENT_WEIGHTS="token:名称=2,ip:1.2.3.4=0.5,..." """
+        tokens = {token: name for name, token in _parse_pairs(os.getenv('CLIENT_TOKENS')).items()}
+        weights = {}
+        for client_id, weight in _parse_pairs(os.getenv('CLIENT_WEIGHTS')).items():
+            try:
+                weights[client_id] = float(weight)
+            except ValueError:
+                logger.warning(f'忽略无效的客户端权重: {client_id}={weight}')
+        return cls(weights=weights, tokens=tokens)
+
+    def identify(self, handler) -> str:
+        """根据 X-Client-Token 请求头或客户端地址确定客户端"""
+        token = handler.headers.get('X-Client-Token')
+        if token and token in self.tokens:
+            return 'token:' + self.tokens[token]
+        address = handler.client_address[0]
+        if os.getenv('TRUST_FORWARDED_FOR', '').lower() in ('1', 'true', 'yes'):
+            forwarded = handler.headers.get('X-Forwarded-For', '')
+            if forwarded:
+                address = forwarded.split(',')[0].strip()
+        return 'ip:' + address
+
+    def _client(self, client_id: str) -> _ClientState:
+        # 调用方持有 self._cond
+        state = self._clients.get(client_id)
+        if state is None:
+            bucket = None if client_id == BACKGROUND_CLIENT else RateLimiter(self.rate, self.burst)
+            weight = self.weights.get(client_id, 1.0)
+            state = _ClientState(client_id, weight if weight > 0 else 1.0, bucket)
+            self._clients[client_id] = state
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(client_id)
+        state.last_seen = time.time()
+        return state
+
+    def note_request(self, client_id: Optional[str]) -> None:
+        """记录一次翻译请求（包括缓存命中）"""
+        with self._cond:
+            self._client(client_id or BACKGROUND_CLIENT).requests += 1
+
+    def _wait_limit(self, started: float, deadline: Optional[float]) -> tuple:
+        limit = started + self.max_wait
+        if deadline is not None and deadline < limit:
+            return deadline, True
+        return limit, False
+
+    def admit(self, client_id: Optional[str], characters: int = 0,
+              deadline: Optional[float] = None) -> _ClientState:
+        """
+        检查客户端配额并计入用量，不占用上游调用名额；
+        超出配额时等待，超过等待上限抛出 ThrottledError，请求截止时间先到时抛出 DeadlineExceededError
+        """
+        client_id = client_id or BACKGROUND_CLIENT
+        with self._cond:
+            state = self._client(client_id)
+        started = time.monotonic()
+        limit, deadline_bound = self._wait_limit(started, deadline)
+
+        if state.bucket is not None and not state.bucket.try_acquire():
+            with self._cond:
+                state.throttled += 1
+            if not state.bucket.acquire(timeout=max(limit - time.monotonic(), 0)):
+                with self._cond:
+                    state.rejected += 1
+                if deadline_bound:
+                    raise DeadlineExceededError('翻译超时')
+                raise ThrottledError('请求过于频繁，请稍后再试', 1.0 / self.rate if self.rate > 0 else 1.0)
+
+        with self._cond:
+            state.upstream_calls += 1
+            state.characters += characters
+            state.wait_seconds += time.monotonic() - started
+        return state
+
+    def acquire_slot(self, state: _ClientState, deadline: Optional[float] = None) -> _ClientState:
+        """按加权公平队列等待一个上游调用名额，调用结束后必须 release"""
+        started = time.monotonic()
+        limit, deadline_bound = self._wait_limit(started, deadline)
+        with self._cond:
+            start_tag = max(self._virtual_time, state.last_finish)
+            state.last_finish = start_tag + 1.0 / state.weight
+            entry = (start_tag, next(self._sequence), state)
+            heapq.heappush(self._waiting, entry)
+            while (0 < self.concurrency <= self._active) or self._waiting[0] is not entry:
+                wait = limit - time.monotonic()
+                if wait <= 0:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    # 没有用到的份额还给该客户端，避免超时后排得更靠后
+                    state.last_finish = max(state.last_finish - 1.0 / state.weight, start_tag)
+                    state.rejected += 1
+                    self._cond.notify_all()
+                    if deadline_bound:
+                        raise DeadlineExceededError('翻译超时')
+                    raise ThrottledError('翻译服务繁忙，请稍后再试', 1.0)
+                self._cond.wait(wait)
+            heapq.heappop(self._waiting)
+            self._virtual_time = start_tag
+            self._active += 1
+            state.wait_seconds += time.monotonic() - started
+            # 下一个等待者也许还有空闲名额
+            self._cond.notify_all()
+        return state
+
+    def acquire(self, client_id: Optional[str], characters: int = 0,
+                deadline: Optional[float] = None) -> _ClientState:
+        """admit 加 acquire_slot：取得一个上游调用名额，调用结束后必须 release"""
+        return self.acquire_slot(self.admit(client_id, characters, deadline), deadline)
+
+    def release(self, state: _ClientState) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def stats(self, limit: int = 100) -> dict:
+        with self._cond:
+            clients = [state.to_dict() for state in self._clients.values()]
+            active, waiting = self._active, len(self._waiting)
+        clients.sort(key=lambda item: (item['upstream_calls'], item['requests']), reverse=True)
+        return {
+            'concurrency': self.concurrency,
+            'active': active,
+            'waiting': waiting,
+            'client_rate': self.rate,
+            'client_burst': self.burst,
+            'tracked_clients': len(clients),
+            'clients': clients[:limit],
+        }
@@ -5,13 +5,21 @@ const API_CONFIG = {
     // 本地开发环境
     development: {
         API_BASE_URL: 'http://localhost:8002',
-        USE_ENCRYPTION: false
+        USE_ENCRYPTION: false,
+        USE_CHANNEL: true,  // 翻译和词典查询经 /channel 的 WebSocket 连接发送
+        USE_GET_TRANSLATE: true,  // 短文本用 GET /translate，浏览器按 ETag 重新验证
+        USE_LLM_RELAY: true,  // DeepSeek 评估经代理的 /llm/evaluate 中转
+        USE_OFFLINE_DICTIONARY: true  // 单词卡片先查代理的 /dictionary 离线词典
     },
     
     // 生产环境 - Cloudflare Workers
     production: {
         API_BASE_URL: 'https://translation-api.3441653535.workers.dev',
-        USE_ENCRYPTION: false  // Cloudflare Workers已经处理了安全
+        USE_ENCRYPTION: false,  // Cloudflare Workers已经处理了安全
+        USE_CHANNEL: false,  // Worker 只转发普通 HTTP 请求
+        USE_GET_TRANSLATE: false,  // Worker 只接受 POST
+        USE_LLM_RELAY: false,  // Worker 没有评估中转，浏览器直接调用 DeepSeek
+        USE_OFFLINE_DICTIONARY: false  // Worker 没有离线词典，单词卡片直接用翻译接口
     }
 };
 
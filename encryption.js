@@ -74,19 +74,23 @@ class EncryptionManager {
         return this._encodeBase64(exported);
     }
 
-    async encrypt(data) {
+    async encrypt(data, additionalData) {
         if (!this.key) {
             throw new Error('No encryption key available');
         }
 
         const iv = window.crypto.getRandomValues(new Uint8Array(this.ivLength));
         const dataBuffer = this._encode(data);
+        const params = {
+            name: this.algorithm,
+            iv: iv
+        };
+        if (additionalData) {
+            params.additionalData = this._encode(additionalData);
+        }
 
         const encrypted = await window.crypto.subtle.encrypt(
-            {
-                name: this.algorithm,
-                iv: iv
-            },
+            params,
             this.key,
             dataBuffer
         );
@@ -119,9 +123,25 @@ class EncryptionManager {
         return this._decode(decrypted);
     }
 
-    async encryptObject(obj) {
+    async encryptObject(obj, additionalData) {
         const jsonString = JSON.stringify(obj);
-        return await this.encrypt(jsonString);
+        return await this.encrypt(jsonString, additionalData);
+    }
+
+    // 加密请求：时间戳和随机数作为附加认证数据，代理据此拒绝过期和重放的请求
+    async encryptRequest(obj) {
+        const timestamp = Date.now();
+        const nonce = this.generateNonce();
+        return {
+            encrypted: true,
+            timestamp: timestamp,
+            nonce: nonce,
+            data: await this.encryptObject(obj, `${timestamp}.${nonce}`)
+        };
+    }
+
+    generateNonce() {
+        return window.crypto.getRandomValues(new Uint32Array(1))[0].toString(36);
     }
 
     async decryptObject(encryptedData) {
@@ -170,24 +190,15 @@ class SecureHttpClient {
     }
 
     async postSecure(url, data, options = {}) {
-        const encryptedData = await this.encryptionManager.encryptObject(data);
-        const timestamp = Date.now();
-        const nonce = this._generateNonce();
-
-        const payload = {
-            encrypted: true,
-            timestamp: timestamp,
-            nonce: nonce,
-            data: encryptedData
-        };
+        const payload = await this.encryptionManager.encryptRequest(data);
 
         const response = await fetch(url, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
                 'X-Encrypted': 'true',
-                'X-Timestamp': timestamp.toString(),
-                'X-Nonce': nonce,
+                'X-Timestamp': payload.timestamp.toString(),
+                'X-Nonce': payload.nonce,
                 ...options.headers
             },
             body: JSON.stringify(payload)
@@ -235,7 +246,7 @@ class SecureHttpClient {
     }
 
     _generateNonce() {
-        return window.crypto.getRandomValues(new Uint32Array(1))[0].toString(36);
+        return this.encryptionManager.generateNonce();
     }
 }
 
@@ -1,33 +1,55 @@
 #!/usr/bin/env python3
 """
 HTTPS证书生成脚本
-用于开发和测试环境的自签名证书生成
+用于开发和测试环境的自签名证书生成。私钥、证书、PEM 和 PKCS12 打包文件都用 cryptography 在进程内生成，
+不需要 openssl 命令；默认使用 ECDSA P-256 私钥，TLS 握手比 RSA 2048 更快。
+
+非交互用法（容器启动、定时任务）：
+    python generate-https-certificate.py --domain=example.com --key-type=ecdsa --pem --pkcs12 --password=secret
+    python generate-https-certificate.py --renew-before=30     # 现有证书30天内不过期时跳过
+    python generate-https-certificate.py --info
+不带参数且在终端中运行时显示交互菜单
 """
 
 import os
 import sys
-import subprocess
 import json
+import ipaddress
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+from https_server_config import describe_certificate, load_certificate, read_certificate_info, _not_valid_after
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+KEY_TYPES = ('ecdsa', 'rsa')
+
+
+def _open_private(path):
+    """
+    以只允许当前用户读写的权限打开文件用于写入；os.open 的 mode 只在新建文件时生效，
+    覆盖已有文件时用 fchmod 收紧原来的权限
+    """
+    fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    if hasattr(os, 'fchmod'):
+        os.fchmod(fd, 0o600)
+    return os.fdopen(fd, 'wb')
+
 
 class CertificateGenerator:
     """证书生成器"""
-    
+
     def __init__(self, config_path='./config/encryption-config.json'):
         self.config_path = config_path
         self.config = self._load_config()
         self.cert_dir = Path('./secure/certificates')
         self.cert_dir.mkdir(parents=True, exist_ok=True)
-        
+
     def _load_config(self):
         """加载配置文件"""
         try:
@@ -39,7 +61,7 @@ class CertificateGenerator:
         except json.JSONDecodeError as e:
             logger.error(f"配置文件解析失败: {e}")
             raise
-            
+
     def _get_default_config(self):
         """获取默认配置"""
         return {
@@ -53,226 +75,286 @@ class CertificateGenerator:
                 "commonName": "localhost",
                 "organization": "Translation Practice",
                 "validityDays": 365,
+                "keyType": "ecdsa",
                 "keySize": 2048
             }
         }
-        
-    def generate_self_signed_certificate(self, domain='localhost'):
-        """生成自签名证书"""
+
+    def generate_self_signed_certificate(self, domain='localhost', key_type=None, validity_days=None):
+        """生成自签名证书；key_type 和 validity_days 未指定时使用配置文件中的 keyType / validityDays"""
         try:
             cert_config = self.config.get('certificate', {})
             common_name = cert_config.get('commonName', domain)
             organization = cert_config.get('organization', 'Translation Practice')
-            validity_days = cert_config.get('validityDays', 365)
+            validity_days = validity_days or cert_config.get('validityDays', 365)
+            key_type = (key_type or cert_config.get('keyType', 'ecdsa')).lower()
             key_size = cert_config.get('keySize', 2048)
-            
+
             cert_file = self.cert_dir / f"{domain}.crt"
             key_file = self.cert_dir / f"{domain}.key"
-            csr_file = self.cert_dir / f"{domain}.csr"
-            
+
             logger.info(f"开始为域名 {domain} 生成自签名证书...")
-            
-            # 生成私钥
-            logger.info("生成私钥...")
-            self._generate_private_key(key_file, key_size)
-            
-            # 生成证书签名请求
-            logger.info("生成证书签名请求...")
-            self._generate_csr(csr_file, key_file, common_name, organization)
-            
-            # 生成自签名证书
+
+            logger.info(f"生成私钥 ({key_type.upper()})...")
+            key = self._generate_private_key(key_type, key_size)
+
             logger.info("生成自签名证书...")
-            self._generate_self_signed_cert(cert_file, csr_file, key_file, validity_days)
-            
-            # 清理CSR文件
-            if csr_file.exists():
-                csr_file.unlink()
-                
+            cert = self._build_certificate(key, domain, common_name, organization, cert_config, validity_days)
+
+            self._write_private_key(key_file, key)
+            self._write_certificate(cert_file, cert)
+
             logger.info(f"证书生成成功!")
             logger.info(f"证书文件: {cert_file}")
             logger.info(f"私钥文件: {key_file}")
-            
+
             # 验证证书
             self._verify_certificate(cert_file, key_file)
-            
+
             return {
                 'cert_file': str(cert_file),
                 'key_file': str(key_file),
                 'valid_until': (datetime.now() + timedelta(days=validity_days)).strftime('%Y-%m-%d')
             }
-            
+
         except Exception as e:
             logger.error(f"生成证书失败: {e}")
             raise
-            
-    def _generate_private_key(self, key_file, key_size):
-        """生成私钥"""
-        cmd = [
-            'openssl', 'genrsa',
-            '-out', str(key_file),
-            str(key_size)
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            raise RuntimeError(f"生成私钥失败: {result.stderr}")
-            
-    def _generate_csr(self, csr_file, key_file, common_name, organization):
-        """生成证书签名请求"""
-        config_file = self.cert_dir / 'openssl.cnf'
-        self._create_openssl_config(config_file, common_name, organization)
-        
-        cmd = [
-            'openssl', 'req',
-            '-new',
-            '-key', str(key_file),
-            '-out', str(csr_file),
-            '-config', str(config_file),
-            '-batch'
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            raise RuntimeError(f"生成CSR失败: {result.stderr}")
-            
-    def _generate_self_signed_cert(self, cert_file, csr_file, key_file, validity_days):
-        """生成自签名证书"""
-        cmd = [
-            'openssl', 'x509',
-            '-req',
-            '-days', str(validity_days),
-            '-in', str(csr_file),
-            '-signkey', str(key_file),
-            '-out', str(cert_file),
-            '-extensions', 'v3_req',
-            '-extfile', str(self.cert_dir / 'openssl.cnf')
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            raise RuntimeError(f"生成自签名证书失败: {result.stderr}")
-            
-    def _create_openssl_config(self, config_file, common_name, organization):
-        """创建OpenSSL配置文件"""
-        config_content = f"""[req]
-default_bits = 2048
-prompt = no
-default_md = sha256
-distinguished_name = dn
-x509_extensions = v3_req
-
-[dn]
-C = CN
-ST = Guangdong
-L = Guangzhou
-O = {organization}
-OU = Development
-CN = {common_name}
-
-[v3_req]
-subjectAltName = @alt_names
-
-[alt_names]
-DNS.1 = {common_name}
-DNS.2 = localhost
-DNS.3 = 127.0.0.1
-IP.1 = 127.0.0.1
-IP.2 = ::1
-"""
-        
-        with open(config_file, 'w', encoding='utf-8') as f:
-            f.write(config_content)
-            
+
+    def _generate_private_key(self, key_type, key_size):
+        """生成私钥：ECDSA 使用 P-256 曲线，RSA 使用配置的 keySize"""
+        from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+        if key_type == 'ecdsa':
+            return ec.generate_private_key(ec.SECP256R1())
+        if key_type == 'rsa':
+            return rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+        raise ValueError(f"不支持的私钥类型: {key_type}，可选 {', '.join(KEY_TYPES)}")
+
+    def _build_certificate(self, key, domain, common_name, organization, cert_config, validity_days):
+        """构造并签名自签名证书，主题和扩展与原来的 openssl.cnf 相同"""
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+
+        name = x509.Name([
+            x509.NameAttribute(NameOID.COUNTRY_NAME, cert_config.get('country', 'CN')),
+            x509.NameAttribute(NameOID.STATE_OR_PROVINCE_NAME, cert_config.get('state', 'Guangdong')),
+            x509.NameAttribute(NameOID.LOCALITY_NAME, cert_config.get('locality', 'Guangzhou')),
+            x509.NameAttribute(NameOID.ORGANIZATION_NAME, organization),
+            x509.NameAttribute(NameOID.ORGANIZATIONAL_UNIT_NAME, 'Development'),
+            x509.NameAttribute(NameOID.COMMON_NAME, common_name),
+        ])
+
+        alt_names = []
+        for host in dict.fromkeys([domain, common_name, 'localhost', '127.0.0.1', '::1']):
+            try:
+                alt_names.append(x509.IPAddress(ipaddress.ip_address(host)))
+            except ValueError:
+                alt_names.append(x509.DNSName(host))
+
+        # 起始时间往前留一分钟，客户端时钟略慢时证书也已生效
+        now = datetime.now(timezone.utc)
+        builder = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - timedelta(minutes=1))
+            .not_valid_after(now + timedelta(days=validity_days))
+            .add_extension(x509.SubjectAlternativeName(alt_names), critical=False)
+            .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+            .add_extension(x509.KeyUsage(
+                digital_signature=True, key_encipherment=isinstance(key, rsa.RSAPrivateKey),
+                content_commitment=False, data_encipherment=False, key_agreement=False,
+                key_cert_sign=False, crl_sign=False, encipher_only=False, decipher_only=False), critical=True)
+            .add_extension(x509.ExtendedKeyUsage([ExtendedKeyUsageOID.SERVER_AUTH]), critical=False)
+            .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+        )
+        return builder.sign(key, hashes.SHA256())
+
+    def _write_private_key(self, key_file, key):
+        """以 PKCS8 PEM 格式写入私钥，文件权限只允许当前用户读写"""
+        from cryptography.hazmat.primitives import serialization
+
+        data = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                 serialization.NoEncryption())
+        with _open_private(key_file) as f:
+            f.write(data)
+
+    def _write_certificate(self, cert_file, cert):
+        from cryptography.hazmat.primitives import serialization
+
+        with open(cert_file, 'wb') as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+
+    def _load_private_key(self, key_file):
+        from cryptography.hazmat.primitives import serialization
+
+        with open(key_file, 'rb') as f:
+            return serialization.load_pem_private_key(f.read(), password=None)
+
     def _verify_certificate(self, cert_file, key_file):
-        """验证证书"""
+        """验证证书：证书中的公钥与私钥匹配，且自签名有效"""
+        from cryptography.hazmat.primitives import serialization
+
         logger.info("验证证书...")
-        
-        cmd = [
-            'openssl', 'x509',
-            '-in', str(cert_file),
-            '-noout',
-            '-text'
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode == 0:
-            logger.info("证书验证通过")
-            logger.info("\n证书信息:")
-            logger.info(result.stdout)
-        else:
-            logger.warning(f"证书验证失败: {result.stderr}")
-            
+
+        cert = load_certificate(cert_file)
+        key = self._load_private_key(key_file)
+        public_format = (serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+        if cert.public_key().public_bytes(*public_format) != key.public_key().public_bytes(*public_format):
+            logger.warning("证书验证失败: 证书与私钥不匹配")
+            return False
+        try:
+            cert.verify_directly_issued_by(cert)
+        except AttributeError:
+            # cryptography 40 以前没有 verify_directly_issued_by，只检查公钥匹配
+            pass
+        except Exception as e:
+            logger.warning(f"证书验证失败: {e}")
+            return False
+
+        logger.info("证书验证通过")
+        logger.info("\n证书信息:")
+        for field, value in describe_certificate(cert).items():
+            logger.info(f"  {field}: {value}")
+        return True
+
     def generate_pem_bundle(self, domain='localhost'):
         """生成PEM打包文件"""
         cert_file = self.cert_dir / f"{domain}.crt"
         key_file = self.cert_dir / f"{domain}.key"
         pem_file = self.cert_dir / f"{domain}.pem"
-        
+
         if not cert_file.exists() or not key_file.exists():
             raise FileNotFoundError("证书或私钥文件不存在")
-            
-        with open(pem_file, 'wb') as pem:
+
+        with _open_private(pem_file) as pem:
             with open(cert_file, 'rb') as cert:
                 pem.write(cert.read())
             with open(key_file, 'rb') as key:
                 pem.write(key.read())
-                
+
         logger.info(f"PEM打包文件已生成: {pem_file}")
         return str(pem_file)
-        
+
     def generate_pkcs12_bundle(self, domain='localhost', password=''):
-        """生成PKCS12打包文件"""
+        """生成PKCS12打包文件，未设置密码时不加密"""
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.serialization import pkcs12
+
         cert_file = self.cert_dir / f"{domain}.crt"
         key_file = self.cert_dir / f"{domain}.key"
         p12_file = self.cert_dir / f"{domain}.p12"
-        
+
         if not cert_file.exists() or not key_file.exists():
             raise FileNotFoundError("证书或私钥文件不存在")
-            
-        cmd = [
-            'openssl', 'pkcs12',
-            '-export',
-            '-out', str(p12_file),
-            '-inkey', str(key_file),
-            '-in', str(cert_file),
-            '-passout', f'pass:{password}'
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            raise RuntimeError(f"生成PKCS12文件失败: {result.stderr}")
-            
+
+        encryption = serialization.BestAvailableEncryption(password.encode('utf-8')) if password else \
+            serialization.NoEncryption()
+        try:
+            data = pkcs12.serialize_key_and_certificates(domain.encode('utf-8'), self._load_private_key(key_file),
+                                                         load_certificate(cert_file), None, encryption)
+        except ValueError as e:
+            raise RuntimeError(f"生成PKCS12文件失败: {e}")
+
+        with _open_private(p12_file) as f:
+            f.write(data)
+
         logger.info(f"PKCS12打包文件已生成: {p12_file}")
         return str(p12_file)
-        
-    def check_openssl_installed(self):
-        """检查OpenSSL是否已安装"""
+
+    def get_certificate_info(self, domain='localhost'):
+        """读取已有证书的信息，结果按文件修改时间缓存"""
+        cert_file = self.cert_dir / f"{domain}.crt"
+        if not cert_file.exists():
+            raise FileNotFoundError(f"证书文件不存在: {cert_file}")
+        return read_certificate_info(cert_file)
+
+    def needs_renewal(self, domain='localhost', renew_before_days=0):
+        """证书或私钥不存在、无法解析，或将在 renew_before_days 天内过期时返回 True"""
+        cert_file = self.cert_dir / f"{domain}.crt"
+        key_file = self.cert_dir / f"{domain}.key"
+        if not cert_file.exists() or not key_file.exists():
+            return True
         try:
-            result = subprocess.run(['openssl', 'version'], capture_output=True, text=True)
-            if result.returncode == 0:
-                logger.info(f"OpenSSL版本: {result.stdout.strip()}")
-                return True
-            else:
-                return False
-        except FileNotFoundError:
-            logger.error("OpenSSL未安装，请先安装OpenSSL")
-            return False
+            cert = load_certificate(cert_file)
+        except ValueError:
+            return True
+        expires = getattr(cert, 'not_valid_after_utc', None) or _not_valid_after(cert).replace(tzinfo=timezone.utc)
+        return expires - datetime.now(timezone.utc) <= timedelta(days=renew_before_days)
+
+
+def parse_cli_args(argv):
+    """解析 --key=value 形式的命令行参数；--pem、--pkcs12、--info 不带值"""
+    options = {'domain': 'localhost', 'key_type': None, 'days': None, 'pem': False, 'pkcs12': False,
+               'password': '', 'info': False, 'renew_before': None}
+    for arg in argv:
+        if not arg.startswith('--'):
+            raise ValueError(f"无法识别的参数: {arg}")
+        key, _, value = arg[2:].partition('=')
+        key = key.replace('-', '_')
+        if key in ('pem', 'pkcs12', 'info'):
+            options[key] = True
+        elif key == 'all':
+            options['pem'] = options['pkcs12'] = True
+        elif key in ('domain', 'password'):
+            options[key] = value
+        elif key == 'key_type':
+            if value.lower() not in KEY_TYPES:
+                raise ValueError(f"--key-type 可选 {', '.join(KEY_TYPES)}")
+            options[key] = value.lower()
+        elif key in ('days', 'renew_before'):
+            options[key] = int(value)
+        else:
+            raise ValueError(f"无法识别的参数: --{key}")
+    if not options['domain']:
+        raise ValueError("--domain 不能为空")
+    return options
+
+
+def run_cli(argv):
+    """非交互模式：按参数生成证书和打包文件，不读取标准输入"""
+    options = parse_cli_args(argv)
+    generator = CertificateGenerator()
+    domain = options['domain']
+
+    if options['info']:
+        print(json.dumps(generator.get_certificate_info(domain), ensure_ascii=False, indent=2))
+        return
+
+    if options['renew_before'] is not None and not generator.needs_renewal(domain, options['renew_before']):
+        logger.info(f"证书在 {options['renew_before']} 天内不会过期，跳过生成: {domain}")
+    else:
+        result = generator.generate_self_signed_certificate(domain, options['key_type'], options['days'])
+        print(f"证书有效期至: {result['valid_until']}")
+
+    if options['pem']:
+        print(f"PEM文件: {generator.generate_pem_bundle(domain)}")
+    if options['pkcs12']:
+        print(f"PKCS12文件: {generator.generate_pkcs12_bundle(domain, options['password'])}")
 
 
 def main():
     """主函数"""
+    if len(sys.argv) > 1 or not sys.stdin.isatty():
+        try:
+            run_cli(sys.argv[1:])
+        except Exception as e:
+            logger.error(f"程序执行失败: {e}")
+            sys.exit(1)
+        return
+
     print("=" * 60)
     print("HTTPS证书生成工具")
     print("=" * 60)
-    
+
     try:
         generator = CertificateGenerator()
-        
-        if not generator.check_openssl_installed():
-            print("\n错误: OpenSSL未安装")
-            print("请访问 https://www.openssl.org/ 下载并安装OpenSSL")
-            sys.exit(1)
-            
+
         print("\n选择操作:")
         print("1. 生成自签名证书 (localhost)")
         print("2. 生成自签名证书 (自定义域名)")
@@ -280,9 +362,9 @@ def main():
         print("4. 生成PKCS12打包文件")
         print("5. 全部生成")
         print("0. 退出")
-        
+
         choice = input("\n请选择 (0-5): ").strip()
-        
+
         if choice == '0':
             print("退出程序")
             sys.exit(0)
@@ -306,21 +388,21 @@ def main():
             domain = input("请输入域名 (默认: localhost): ").strip() or 'localhost'
             result = generator.generate_self_signed_certificate(domain)
             print(f"\n证书有效期至: {result['valid_until']}")
-            
+
             pem_file = generator.generate_pem_bundle(domain)
             print(f"PEM文件: {pem_file}")
-            
+
             password = input("请输入PKCS12密码 (可选): ").strip()
             p12_file = generator.generate_pkcs12_bundle(domain, password)
             print(f"PKCS12文件: {p12_file}")
         else:
             print("无效的选择")
             sys.exit(1)
-            
+
         print("\n" + "=" * 60)
         print("操作完成!")
         print("=" * 60)
-        
+
     except Exception as e:
         logger.error(f"程序执行失败: {e}")
         sys.exit(1)
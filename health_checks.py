@@ -0,0 +1,160 @@
+"""
+健康检查模块
+/health/live 只说明进程还能处理请求；/health/ready 汇总连接数、预翻译队列深度、
+缓存和上游探测结果，决定负载均衡是否应该继续转发流量。
+上游探测由后台线程按固定间隔执行并缓存结果，健康检查本身从不访问腾讯API。
+"""
+
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROBE_INTERVAL = 60.0
+DEFAULT_PROBE_TIMEOUT = 5.0
+DEFAULT_MAX_ACTIVE_REQUESTS = 64
+# 超过这么多个探测周期没有结果，视为探测线程失效
+STALE_PROBE_INTERVALS = 3
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+class UpstreamProbe:
+    """
+    定期向上游发送一个不带签名的 GET 请求
+
+    只要收到HTTP响应（包括鉴权失败之类的4xx）就说明上游可达，
+    这种请求不消耗翻译额度。
+    """
+
+    def __init__(self, url: str, interval: Optional[float] = None, timeout: Optional[float] = None):
+        self.url = url
+        self.interval = interval if interval is not None else \
+            _env_float('UPSTREAM_PROBE_INTERVAL', DEFAULT_PROBE_INTERVAL)
+        self.timeout = timeout if timeout is not None else \
+            _env_float('UPSTREAM_PROBE_TIMEOUT', DEFAULT_PROBE_TIMEOUT)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._result = None
+
+    def start(self) -> None:
+        if self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name='upstream-probe', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(self.interval)
+
+    def probe(self) -> dict:
+        start = time.perf_counter()
+        error = None
+        try:
+            with urllib.request.urlopen(self.url, timeout=self.timeout) as response:
+                response.read(1024)
+        except urllib.error.HTTPError as e:
+            e.close()
+        except (urllib.error.URLError, OSError) as e:
+            error = str(getattr(e, 'reason', e))
+
+        result = {
+            'ok': error is None,
+            'checked_at': time.time(),
+            'latency_ms': round((time.perf_counter() - start) * 1000, 1),
+            'error': error,
+        }
+        with self._lock:
+            previous = self._result
+            self._result = result
+        if error is not None and (previous is None or previous['ok']):
+            logger.warning(f'上游探测失败: {error}')
+        elif error is None and previous is not None and not previous['ok']:
+            logger.info('上游探测恢复')
+        return result
+
+    def status(self) -> dict:
+        with self._lock:
+            result = self._result
+        if result is None:
+            return {'ok': None, 'checked_at': None, 'latency_ms': None, 'error': None}
+        status = dict(result)
+        if self.interval > 0 and time.time() - result['checked_at'] > self.interval * STALE_PROBE_INTERVALS:
+            status['ok'] = None
+            status['error'] = '探测结果已过期'
+        return status
+
+
+class ReadinessCheck:
+    """
+    汇总就绪状态；上游探测尚无结果（ok 为 None）时不阻止就绪，
+    避免刚启动或探测被关闭时实例一直不接流量
+    """
+
+    def __init__(self, cache, job_queue=None, probe: Optional[UpstreamProbe] = None,
+                 max_active_requests: Optional[int] = None, max_queue_depth: Optional[int] = None):
+        self.cache = cache
+        self.job_queue = job_queue
+        self.probe = probe
+        self.max_active_requests = max_active_requests if max_active_requests is not None else \
+            int(_env_float('READINESS_MAX_ACTIVE_REQUESTS', DEFAULT_MAX_ACTIVE_REQUESTS))
+        # 预翻译任务在后台按限速执行，默认只报告队列深度而不影响就绪
+        self.max_queue_depth = max_queue_depth if max_queue_depth is not None else \
+            int(_env_float('READINESS_MAX_QUEUE_DEPTH', 0))
+
+    def evaluate(self, server) -> tuple:
+        """返回 (是否就绪, 报告)"""
+        draining = getattr(server, 'draining', False)
+        active = getattr(server, 'active_requests', 0)
+        requests = {
+            'active': active,
+            'channels': getattr(server, 'upgraded_connections', 0),
+            'max': self.max_active_requests,
+            'ok': self.max_active_requests <= 0 or active <= self.max_active_requests,
+        }
+
+        depth = self.job_queue.depth() if self.job_queue is not None else 0
+        jobs = {
+            'depth': depth,
+            'max': self.max_queue_depth or None,
+            'ok': self.max_queue_depth <= 0 or depth <= self.max_queue_depth,
+        }
+
+        cache = {'ok': self.cache.is_available(), 'size': len(self.cache)}
+        upstream = self.probe.status() if self.probe is not None else {'ok': None}
+
+        ready = (not draining and requests['ok'] and jobs['ok'] and cache['ok']
+                 and upstream['ok'] is not False)
+        if draining:
+            status = 'draining'
+        else:
+            status = 'ready' if ready else 'not_ready'
+        return ready, {
+            'status': status,
+            'checks': {
+                'requests': requests,
+                'job_queue': jobs,
+                'cache': cache,
+                'upstream': upstream,
+            },
+        }
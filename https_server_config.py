@@ -1,14 +1,97 @@
 """
 HTTPS服务器配置模块
-用于配置和使用HTTPS证书
+用于配置和使用HTTPS证书；证书信息用 cryptography 在进程内解析，按文件修改时间缓存
 """
 
 import os
 import ssl
 import json
+import threading
 from pathlib import Path
-from http.server import HTTPServer
-from typing import Optional, Tuple
+from http.server import HTTPServer, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+# 证书路径 -> ((mtime_ns, size), 解析结果)；证书文件被替换后修改时间变化，下次查询重新解析
+_info_cache: Dict[str, Tuple[Tuple[int, int], dict]] = {}
+_info_lock = threading.Lock()
+
+
+def _format_time(value) -> str:
+    """与 openssl x509 -dates 的输出格式一致，例如 Oct  9 02:02:50 2026 GMT"""
+    return f'{value:%b} {value.day:2d} {value:%H:%M:%S %Y} GMT'
+
+
+def _not_valid_after(cert):
+    # cryptography 42 起提供带时区的 *_utc 属性，旧版本只有不带时区的 UTC 时间
+    value = getattr(cert, 'not_valid_after_utc', None)
+    return value.replace(tzinfo=None) if value is not None else cert.not_valid_after
+
+
+def _not_valid_before(cert):
+    value = getattr(cert, 'not_valid_before_utc', None)
+    return value.replace(tzinfo=None) if value is not None else cert.not_valid_before
+
+
+def _format_name(name) -> str:
+    """按 openssl 的格式输出，例如 C = CN, ST = Guangdong, ..., CN = localhost"""
+    return ', '.join(f'{attribute.rfc4514_attribute_name} = {attribute.value}' for attribute in name)
+
+
+def describe_certificate(cert) -> dict:
+    """
+    x509.Certificate 的主要信息；subject、issuer、notBefore、notAfter、serial
+    与原来 openssl x509 -subject -issuer -dates -serial 输出的字段相同
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+    
+    public_key = cert.public_key()
+    if isinstance(public_key, ec.EllipticCurvePublicKey):
+        key = f'ECDSA {public_key.curve.name}'
+    elif isinstance(public_key, rsa.RSAPublicKey):
+        key = f'RSA {public_key.key_size}'
+    else:
+        key = type(public_key).__name__
+    try:
+        san = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+        names = [str(name) for name in san.get_values_for_type(x509.DNSName)] + \
+                [str(address) for address in san.get_values_for_type(x509.IPAddress)]
+    except x509.ExtensionNotFound:
+        names = []
+    return {
+        'subject': _format_name(cert.subject),
+        'issuer': _format_name(cert.issuer),
+        'notBefore': _format_time(_not_valid_before(cert)),
+        'notAfter': _format_time(_not_valid_after(cert)),
+        'serial': format(cert.serial_number, 'X'),
+        'key': key,
+        'subjectAltName': names,
+        'fingerprint_sha256': cert.fingerprint(hashes.SHA256()).hex(':').upper(),
+    }
+
+
+def load_certificate(cert_file):
+    """读取 PEM 证书文件，返回 x509.Certificate"""
+    from cryptography import x509
+    
+    with open(cert_file, 'rb') as f:
+        return x509.load_pem_x509_certificate(f.read())
+
+
+def read_certificate_info(cert_file) -> dict:
+    """解析证书文件，结果按 (修改时间, 文件大小) 缓存，证书未变化时不再读取和解析"""
+    path = str(cert_file)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _info_lock:
+        cached = _info_cache.get(path)
+    if cached is not None and cached[0] == version:
+        return dict(cached[1])
+    info = describe_certificate(load_certificate(path))
+    with _info_lock:
+        _info_cache[path] = (version, info)
+    return dict(info)
 
 
 class HTTPSConfig:
@@ -72,11 +155,12 @@ class HTTPSConfig:
         
         return context
         
-    def create_https_server(self, handler_class, host: str = '0.0.0.0', port: int = 8443, domain: str = 'localhost') -> HTTPServer:
+    def create_https_server(self, handler_class, host: str = '0.0.0.0', port: int = 8443, domain: str = 'localhost',
+                            server_class=ThreadingHTTPServer) -> HTTPServer:
         """创建HTTPS服务器"""
         ssl_context = self.create_ssl_context(domain)
         
-        server = HTTPServer((host, port), handler_class)
+        server = server_class((host, port), handler_class)
         server.socket = ssl_context.wrap_socket(server.socket, server_side=True)
         
         return server
@@ -90,35 +174,15 @@ class HTTPSConfig:
         
     def get_certificate_info(self, domain: str = 'localhost') -> dict:
         """获取证书信息"""
-        import subprocess
-        from datetime import datetime
-        
         cert_file = self.cert_dir / f"{domain}.crt"
         
         if not cert_file.exists():
             raise FileNotFoundError(f"证书文件不存在: {cert_file}")
-            
-        cmd = [
-            'openssl', 'x509',
-            '-in', str(cert_file),
-            '-noout',
-            '-subject',
-            '-issuer',
-            '-dates',
-            '-serial'
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            raise RuntimeError(f"获取证书信息失败: {result.stderr}")
-            
-        info = {}
-        for line in result.stdout.strip().split('\n'):
-            if '=' in line:
-                key, value = line.split('=', 1)
-                info[key.strip()] = value.strip()
-                
-        return info
+        
+        try:
+            return read_certificate_info(cert_file)
+        except ValueError as e:
+            raise RuntimeError(f"获取证书信息失败: {e}")
 
 
 class HTTPSServer:
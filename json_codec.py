@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON编解码模块
+代理中所有请求体解析、上游请求签名、响应和加密信封都通过这里序列化。
+安装了 orjson 时自动使用，否则回退到标准库 json；
+设置环境变量 JSON_BACKEND=stdlib 可以强制使用标准库
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Any, Union
+
+try:
+    if os.getenv('JSON_BACKEND', '').lower() == 'stdlib':
+        raise ImportError
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'stdlib'
+
+# 与 orjson 对齐：紧凑格式、直接输出UTF-8，不转义非ASCII字符
+_STDLIB_SEPARATORS = (',', ':')
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化为UTF-8字节，调用方应复用结果而不是重复序列化"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=_STDLIB_SEPARATORS).encode('utf-8')
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+# 解析失败时两个后端抛出的异常都是 ValueError 的子类
+DecodeError = ValueError
+
+
+def _benchmark_payloads() -> dict:
+    word = {'text': 'serendipity', 'source': 'en', 'target': 'zh'}
+    sentence = '这是一个用于测试序列化性能的中文句子，其中包含一些常见的标点符号。'
+    passage = {'text': sentence * 60, 'source': 'zh', 'target': 'en'}
+    return {
+        'word': (word, {'result': '意外发现珍奇事物的本领'}),
+        'passage': (passage, {'result': 'This is a sentence used to test serialization. ' * 60}),
+    }
+
+
+def benchmark(rounds: int = 20000) -> None:
+    """比较旧路径（多次 json.dumps）与新路径（序列化一次并复用字节）的耗时"""
+    print(f'JSON后端: {BACKEND}')
+    for name, (request, response) in _benchmark_payloads().items():
+        body = json.dumps(request).encode('utf-8')
+        upstream = {'SourceText': request['text'], 'Source': request['source'],
+                    'Target': request['target'], 'ProjectId': 0}
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            json.loads(body.decode('utf-8'))
+            json.dumps(upstream, separators=(',', ':'))
+            json.dumps(upstream)
+            json.dumps(upstream, separators=(',', ':')).encode('utf-8')
+            json.dumps(response).encode('utf-8')
+        legacy = (time.perf_counter() - start) / rounds * 1e6
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            loads(body)
+            dumps(upstream)
+            dumps(response)
+        current = (time.perf_counter() - start) / rounds * 1e6
+
+        print(f'{name:8s} 请求体 {len(body):6d} 字节: 旧路径 {legacy:8.2f} us/请求, '
+              f'新路径 {current:8.2f} us/请求, 提升 {legacy / current:5.2f}x')
+
+
+if __name__ == '__main__':
+    rounds = 20000
+    for arg in sys.argv:
+        if arg.startswith('--rounds='):
+            rounds = int(arg.split('=')[1])
+    benchmark(rounds)
@@ -6,20 +6,16 @@ import json
 import secrets
 import hashlib
 import base64
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.backends import default_backend
 from typing import Tuple, Optional
 import logging
 
-logging.basicConfig(level=logging.INFO)
+# cryptography 只在真正生成、派生或加解密密钥时才导入，
+# 代理只通过 ENCRYPTION_KEY 环境变量取密钥时不需要加载它
 logger = logging.getLogger(__name__)
 
 class KeyManager:
     def __init__(self, config_path: str = './config/encryption-config.json'):
         self.config = self._load_config(config_path)
-        self.backend = default_backend()
         
     def _load_config(self, config_path: str) -> dict:
         try:
@@ -46,19 +42,24 @@ class KeyManager:
         }
     
     def generate_key(self) -> bytes:
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
         return AESGCM.generate_key(bit_length=256)
     
     def derive_key(self, password: str, salt: Optional[bytes] = None) -> Tuple[bytes, bytes]:
         if salt is None:
             salt = os.urandom(16)
         
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+        from cryptography.hazmat.backends import default_backend
+        
         kdf_config = self.config['encryption']['keyDerivation']
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,
             salt=salt,
             iterations=kdf_config['iterations'],
-            backend=self.backend
+            backend=default_backend()
         )
         
         key = kdf.derive(password.encode('utf-8'))
@@ -70,6 +71,7 @@ class KeyManager:
         
         derived_key, _ = self.derive_key(master_password, salt)
         
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
         aesgcm = AESGCM(derived_key)
         encrypted_key = aesgcm.encrypt(nonce, key, None)
         
@@ -92,6 +94,7 @@ class KeyManager:
             
             derived_key, _ = self.derive_key(master_password, salt)
             
+            from cryptography.hazmat.primitives.ciphers.aead import AESGCM
             aesgcm = AESGCM(derived_key)
             key = aesgcm.decrypt(nonce, encrypted_key, None)
             
@@ -153,8 +156,15 @@ class KeyManager:
         return True
 
 class EnvironmentKeyManager:
-    def __init__(self):
-        self.key_manager = KeyManager()
+    def __init__(self, key_manager: Optional[KeyManager] = None):
+        self._key_manager = key_manager
+    
+    @property
+    def key_manager(self) -> KeyManager:
+        # 只有从密钥文件加载时才需要读取加密配置
+        if self._key_manager is None:
+            self._key_manager = KeyManager()
+        return self._key_manager
     
     def get_tencent_credentials(self) -> Tuple[str, str]:
         secret_id = os.getenv('TENCENT_SECRET_ID')
@@ -180,6 +190,7 @@ class EnvironmentKeyManager:
         raise ValueError("未找到加密密钥配置")
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     key_manager = KeyManager()
     
     print("=== 密钥管理测试 ===")
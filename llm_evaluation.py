@@ -0,0 +1,487 @@
+"""
+LLM 评估中转模块
+浏览器原来直接带着用户的密钥调用 DeepSeek 接口，逐句等待完整结果，相同的译文每次都重新评估。
+这里由代理转发评估请求：提示词在代理端生成，按模型和提示词内容的哈希缓存评估结果；
+上游调用交给固定大小的线程池，超出排队上限的请求直接拒绝；
+上游以流式返回，生成的片段边收边以 server-sent events 转发给浏览器，
+同时到达的相同请求合并为一次上游调用，共享同一份输出
+"""
+
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+import json_codec
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = 'https://api.deepseek.com/v1/chat/completions'
+DEFAULT_MODEL = 'deepseek-chat'
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_PENDING = 32
+DEFAULT_CACHE_SIZE = 5000
+DEFAULT_CACHE_TTL = 7 * 86400
+DEFAULT_TIMEOUT = 60.0
+MAX_TOKENS = 1000
+TEMPERATURE = 0.3
+MAX_TEXT_CHARS = 5000
+# 上游的这些状态码说明请求本身或密钥有问题，原样返回给浏览器；其余按网关错误处理
+PASSTHROUGH_STATUS = (400, 401, 402, 403, 404, 422, 429)
+
+PROMPT_TEMPLATE = '''请作为一名专业的英语翻译评估专家，评估以下中文到英文的翻译质量：
+
+中文原文：{chinese}
+
+英文翻译：{translation}
+
+请按照以下格式返回评估结果：
+1. 评分（0-100分）：[具体分数]
+2. 总体评价：[简要评价翻译质量]
+3. 错误分析：[列出具体错误，包括错误类型（语法错误、拼写错误、用词不当等）、位置和详细说明]
+
+请确保错误分析准确且具体，能够帮助用户改进翻译质量。'''
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+class LLMRelayError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def build_prompt(chinese: str, translation: str) -> str:
+    return PROMPT_TEMPLATE.format(chinese=chinese, translation=translation)
+
+
+def cache_key(model: str, prompt: str, scope: Optional[str] = None) -> str:
+    """
+    评估结果只取决于模型、生成参数和提示词；scope 不为空时（客户端自带密钥）结果只在持有同一密钥的请求间共享，
+    随便填一个密钥拿不到别人付费得到的结果
+    """
+    return hashlib.sha256(json_codec.dumps([model, MAX_TOKENS, TEMPERATURE, prompt, scope])).hexdigest()
+
+
+def parse_llm_request(data: dict) -> Tuple[str, str, bool]:
+    """解析 POST /llm/evaluate 请求体，返回 (原文, 译文, 是否流式返回)"""
+    chinese = data.get('chinese', '')
+    translation = data.get('translation', '')
+    if not isinstance(chinese, str) or not isinstance(translation, str):
+        raise ValueError('chinese 和 translation 必须是字符串')
+    if not chinese.strip() or not translation.strip():
+        raise ValueError('缺少原文或译文')
+    if len(chinese) > MAX_TEXT_CHARS or len(translation) > MAX_TEXT_CHARS:
+        raise ValueError(f'原文和译文均不能超过{MAX_TEXT_CHARS}字符')
+    return chinese, translation, data.get('stream', True) is not False
+
+
+def client_api_key(headers) -> Optional[str]:
+    """浏览器在 X-LLM-Key 头中带上用户自己的密钥；代理配置了 LLM_API_KEY 时可以不带"""
+    value = headers.get('X-LLM-Key', '').strip()
+    return value or None
+
+
+def format_event(event: str, data: dict) -> bytes:
+    return b'event: ' + event.encode('ascii') + b'\ndata: ' + json_codec.dumps(data) + b'\n\n'
+
+
+def _upstream_error(error: urllib.error.HTTPError) -> LLMRelayError:
+    detail = ''
+    try:
+        body = json_codec.loads(error.read())
+        detail = body.get('error', '') or body.get('message', '')
+        if isinstance(detail, dict):
+            detail = detail.get('message', '')
+    except Exception:
+        pass
+    status = error.code if error.code in PASSTHROUGH_STATUS else 502
+    message = f'LLM接口返回{error.code}'
+    return LLMRelayError(status, f'{message}: {detail}' if detail else message)
+
+
+class _Stream:
+    """一次上游调用的输出，发起请求的客户端和合并进来的相同请求各自从头读取"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[LLMRelayError] = None
+        self._cond = threading.Condition()
+
+    def append(self, text: str) -> None:
+        with self._cond:
+            self.chunks.append(text)
+            self._cond.notify_all()
+
+    def finish(self, error: Optional[LLMRelayError] = None) -> None:
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def follow(self, timeout: float) -> Iterator[str]:
+        index = 0
+        while True:
+            with self._cond:
+                if index >= len(self.chunks) and not self.done:
+                    if not self._cond.wait_for(lambda: index < len(self.chunks) or self.done, timeout):
+                        raise LLMRelayError(504, 'LLM接口响应超时')
+                pending = self.chunks[index:]
+                finished = self.done and index + len(pending) == len(self.chunks)
+                error = self.error
+            index += len(pending)
+            yield from pending
+            if finished:
+                if error is not None:
+                    raise error
+                return
+
+
+class LLMEvaluationRelay:
+    """
+    LLM 评估中转
+
+    evaluate 返回评估文本片段的迭代器：缓存命中时只有一个完整片段，
+    否则跟随正在进行的上游调用，上游每生成一段就产出一段。上游调用在线程池中执行，
+    与发起请求的连接无关，浏览器中途断开时结果仍会写入缓存。
+    """
+
+    def __init__(self, api_url: Optional[str] = None, model: Optional[str] = None, api_key: Optional[str] = None,
+                 concurrency: Optional[int] = None, max_pending: Optional[int] = None,
+                 cache_size: Optional[int] = None, cache_ttl: Optional[float] = None,
+                 timeout: Optional[float] = None):
+        self.api_url = api_url or os.getenv('LLM_API_URL') or DEFAULT_API_URL
+        self.model = model or os.getenv('LLM_MODEL') or DEFAULT_MODEL
+        self.api_key = api_key if api_key is not None else (os.getenv('LLM_API_KEY') or None)
+        self.concurrency = max(concurrency if concurrency is not None else
+                               _env_int('LLM_CONCURRENCY', DEFAULT_CONCURRENCY), 1)
+        self.max_pending = max_pending if max_pending is not None else \
+            _env_int('LLM_MAX_PENDING', DEFAULT_MAX_PENDING)
+        self.cache_size = cache_size if cache_size is not None else _env_int('LLM_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+        self.cache_ttl = cache_ttl if cache_ttl is not None else _env_float('LLM_CACHE_TTL', DEFAULT_CACHE_TTL)
+        self.timeout = timeout if timeout is not None else _env_float('LLM_TIMEOUT', DEFAULT_TIMEOUT)
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='llm-relay')
+        self._cache = OrderedDict()  # key -> (评估文本, 写入时间)
+        self._inflight = {}  # key -> _Stream
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+        self.first_chunks = 0
+        self.first_chunk_ms = 0.0
+        self.upstream_ms = 0.0
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[1] > self.cache_ttl:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry[0]
+
+    def _cache_set(self, key: str, content: str) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[key] = (content, time.time())
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def evaluate(self, chinese: str, translation: str, client_key: Optional[str] = None) -> Tuple[bool, Iterator[str]]:
+        """返回 (是否命中缓存, 评估文本片段的迭代器)；上游出错时迭代器抛出 LLMRelayError"""
+        api_key = self.api_key or client_key
+        if not api_key:
+            raise LLMRelayError(401, '未配置LLM API密钥')
+        prompt = build_prompt(chinese, translation)
+        # 未配置服务端密钥时缓存和合并按客户端密钥隔开：只有用同一个密钥调用过上游的结果才会返回
+        scope = None if self.api_key else hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+        key = cache_key(self.model, prompt, scope)
+        with self._lock:
+            self.requests += 1
+            content = self._cache_get(key)
+            if content is not None:
+                self.cache_hits += 1
+                return True, iter([content])
+            stream = self._inflight.get(key)
+            if stream is not None:
+                self.coalesced += 1
+                return False, stream.follow(self.timeout)
+            if len(self._inflight) >= self.concurrency + self.max_pending:
+                self.rejected += 1
+                raise LLMRelayError(503, 'LLM评估请求过多，请稍后再试')
+            stream = _Stream()
+            self._inflight[key] = stream
+        self._pool.submit(self._run, key, prompt, api_key, stream)
+        return False, stream.follow(self.timeout)
+
+    def complete(self, chinese: str, translation: str, client_key: Optional[str] = None) -> dict:
+        """等待完整的评估结果，供不能接收事件流的客户端使用"""
+        cached, chunks = self.evaluate(chinese, translation, client_key)
+        return {'content': ''.join(chunks), 'cached': cached}
+
+    def open_stream(self, chinese: str, translation: str,
+                    client_key: Optional[str] = None) -> Iterator[bytes]:
+        """
+        返回编码好的事件流：每个片段一个 delta 事件，最后是带完整文本的 done 事件。
+        在返回前先等到第一个片段，密钥无效、限流这类在生成前就发生的错误以 LLMRelayError 抛出，
+        调用方可以用普通的 HTTP 状态码回复；开始输出后的错误以 error 事件结束事件流
+        """
+        cached, chunks = self.evaluate(chinese, translation, client_key)
+        first = next(chunks, '')
+
+        def events():
+            parts = [first]
+            yield format_event('delta', {'content': first})
+            try:
+                for text in chunks:
+                    parts.append(text)
+                    yield format_event('delta', {'content': text})
+            except LLMRelayError as e:
+                yield format_event('error', {'error': e.message, 'status': e.status})
+                return
+            yield format_event('done', {'content': ''.join(parts), 'cached': cached})
+        return events()
+
+    def _run(self, key: str, prompt: str, api_key: str, stream: _Stream) -> None:
+        start = time.perf_counter()
+        first_chunk_ms = None
+        error = None
+        try:
+            for text in self._call_upstream(prompt, api_key):
+                if first_chunk_ms is None:
+                    first_chunk_ms = (time.perf_counter() - start) * 1000
+                stream.append(text)
+            if not ''.join(stream.chunks).strip():
+                raise LLMRelayError(502, 'LLM接口返回内容为空')
+        except LLMRelayError as e:
+            error = e
+        except Exception as e:
+            error = LLMRelayError(502, f'LLM接口请求失败: {e}')
+        with self._lock:
+            self.upstream_calls += 1
+            self.upstream_ms += (time.perf_counter() - start) * 1000
+            if first_chunk_ms is not None:
+                self.first_chunks += 1
+                self.first_chunk_ms += first_chunk_ms
+            if error is None:
+                self._cache_set(key, ''.join(stream.chunks))
+            else:
+                self.upstream_errors += 1
+                logger.info(f'LLM评估失败: {error.message}')
+            del self._inflight[key]
+        stream.finish(error)
+
+    def _call_upstream(self, prompt: str, api_key: str) -> Iterator[str]:
+        body = json_codec.dumps({
+            'model': self.model,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'max_tokens': MAX_TOKENS,
+            'temperature': TEMPERATURE,
+            'stream': True,
+        })
+        request = urllib.request.Request(self.api_url, data=body, method='POST', headers={
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream',
+        })
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            raise _upstream_error(e)
+        with response:
+            # 不支持流式输出的兼容接口直接返回完整结果
+            if 'text/event-stream' not in response.headers.get('Content-Type', ''):
+                data = json_codec.loads(response.read())
+                yield data['choices'][0]['message']['content']
+                return
+            for line in response:
+                line = line.strip()
+                if not line.startswith(b'data:'):
+                    continue
+                data = line[5:].strip()
+                if data == b'[DONE]':
+                    return
+                choices = json_codec.loads(data).get('choices') or []
+                text = (choices[0].get('delta') or {}).get('content') if choices else None
+                if text:
+                    yield text
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        # 被取消的调用不会再执行，等待它们的请求直接结束
+        with self._lock:
+            streams = list(self._inflight.values())
+            self._inflight.clear()
+        for stream in streams:
+            if not stream.done:
+                stream.finish(LLMRelayError(503, '服务正在关闭'))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'api_url': self.api_url,
+                'model': self.model,
+                'server_key': self.api_key is not None,
+                'concurrency': self.concurrency,
+                'max_pending': self.max_pending,
+                'in_flight': len(self._inflight),
+                'requests': self.requests,
+                'cache_entries': len(self._cache),
+                'cache_hits': self.cache_hits,
+                'coalesced': self.coalesced,
+                'rejected': self.rejected,
+                'upstream_calls': self.upstream_calls,
+                'upstream_errors': self.upstream_errors,
+                'avg_first_chunk_ms': round(self.first_chunk_ms / self.first_chunks, 1) if self.first_chunks else None,
+                'avg_upstream_ms': round(self.upstream_ms / self.upstream_calls, 1) if self.upstream_calls else None,
+            }
+
+
+STUB_REPLY = '''1. 评分（0-100分）：{score}
+2. 总体评价：译文基本传达了原文的意思，个别用词可以更地道。
+3. 错误分析：
+- 用词不当：第1句中"{word}"一词可以换成更常用的表达。
+- 语法错误：注意句子的时态保持一致。'''
+
+
+def run_stub_server(port: int, delay: float = 0.05):
+    """
+    OpenAI 兼容的本地假 LLM 接口，把固定格式的评估结果逐词流式返回，用于测试中转。
+    密钥为 invalid 时返回401，译文中含有 RATE_LIMIT 时返回429
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class StubLLM(BaseHTTPRequestHandler):
+        calls = 0
+
+        def do_POST(self):
+            StubLLM.calls += 1
+            request = json_codec.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            prompt = request['messages'][0]['content']
+            if self.headers.get('Authorization', '') in ('', 'Bearer invalid'):
+                self._reply(401, {'error': {'message': 'Authentication Fails'}})
+                return
+            if 'RATE_LIMIT' in prompt:
+                self._reply(429, {'error': {'message': 'Rate limit reached'}})
+                return
+            translation = prompt.split('英文翻译：', 1)[-1].split('\n', 1)[0]
+            words = translation.split() or ['translation']
+            reply = STUB_REPLY.format(score=60 + len(translation) % 40, word=words[0])
+            if not request.get('stream'):
+                self._reply(200, {'choices': [{'message': {'role': 'assistant', 'content': reply}}]})
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            for index in range(0, len(reply), 8):
+                time.sleep(delay)
+                chunk = {'choices': [{'index': 0, 'delta': {'content': reply[index:index + 8]}}]}
+                self.wfile.write(b'data: ' + json_codec.dumps(chunk) + b'\n\n')
+                self.wfile.flush()
+            self.wfile.write(b'data: [DONE]\n\n')
+
+        def _reply(self, status, data):
+            body = json_codec.dumps(data)
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubLLM)
+    server.daemon_threads = True
+    return server, StubLLM
+
+
+def _demo(requests: int = 40, distinct: int = 10) -> None:
+    """用本地假接口比较首个片段和完整结果的延迟，以及缓存和请求合并的效果"""
+    server, stub = run_stub_server(0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    relay = LLMEvaluationRelay(api_url=f'http://127.0.0.1:{server.server_address[1]}/v1/chat/completions',
+                               api_key='demo', concurrency=4, cache_size=1000)
+    first_ms = []
+    total_ms = []
+    lock = threading.Lock()
+
+    def run(index):
+        start = time.perf_counter()
+        events = relay.open_stream('我每天早上七点起床。', f'I get up at seven every morning {index % distinct}.')
+        first = (time.perf_counter() - start) * 1000
+        for _ in events:
+            pass
+        with lock:
+            first_ms.append(first)
+            total_ms.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    first_ms.sort()
+    total_ms.sort()
+    print(f'{requests}个请求（{distinct}种译文）: 首个片段 p50 {first_ms[len(first_ms) // 2]:.0f} ms, '
+          f'完整结果 p50 {total_ms[len(total_ms) // 2]:.0f} ms, 假接口被调用{stub.calls}次')
+    start = time.perf_counter()
+    relay.complete('我每天早上七点起床。', 'I get up at seven every morning 0.')
+    print(f'缓存命中: {(time.perf_counter() - start) * 1000:.2f} ms')
+    print(relay.stats())
+    relay.stop()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    port = None
+    delay = 0.05
+    count = 40
+    for arg in sys.argv:
+        if arg.startswith('--stub-port='):
+            port = int(arg.split('=')[1])
+        elif arg.startswith('--delay='):
+            delay = float(arg.split('=')[1])
+        elif arg.startswith('--requests='):
+            count = int(arg.split('=')[1])
+    if port is not None:
+        stub_server, _ = run_stub_server(port, delay)
+        print(f'假LLM接口运行在 http://127.0.0.1:{port}/v1/chat/completions')
+        try:
+            stub_server.serve_forever()
+        except KeyboardInterrupt:
+            stub_server.server_close()
+    else:
+        _demo(count)
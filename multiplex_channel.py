@@ -0,0 +1,654 @@
+"""
+多路复用查询通道模块
+单词卡片、单词本和练习页面会发出大量很小的 POST 请求，每个请求都要重新建立连接、
+解析请求头并处理 CORS 预检。这里在代理上提供 GET /channel 的 WebSocket 通道：
+一条长连接上承载多个带 id 的翻译/词典请求，响应按完成顺序返回。词典查询和精确缓存命中
+在读取线程中直接回复，其余翻译交给共享线程池，每个连接同时占用的线程数有上限，
+一个连接的积压不会挡住其他连接。
+加密模式下每条消息单独用 AES-GCM 加密，id 保持明文用于匹配响应
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from urllib.parse import urlencode, urlsplit
+
+import json_codec
+from client_quotas import ThrottledError
+from offline_dictionary import dictionary_response
+from replay_protection import ReplayError
+from request_deadline import DeadlineExceededError, parse_deadline
+from request_tracing import current_trace
+from translation_memory import client_match
+from upstream_regions import UpstreamError
+from usage_accounting import BudgetExhaustedError
+
+logger = logging.getLogger(__name__)
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+CLOSE_NORMAL = 1000
+CLOSE_GOING_AWAY = 1001
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_TOO_BIG = 1009
+
+DEFAULT_WORKERS = 16
+DEFAULT_MAX_INFLIGHT = 64
+DEFAULT_SESSION_WORKERS = 4
+DEFAULT_MAX_MESSAGE = 1024 * 1024
+DEFAULT_IDLE_TIMEOUT = 300.0
+# 空闲时每隔这么久检查一次服务器是否正在关闭
+POLL_INTERVAL = 0.5
+# 一帧开始到达后，剩余部分必须在这个时间内收完
+FRAME_TIMEOUT = 30.0
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+class ChannelClosed(Exception):
+    def __init__(self, code: int = CLOSE_NORMAL, reason: str = ''):
+        super().__init__(reason)
+        self.code = code
+        self.reason = reason
+
+
+def _apply_mask(data: bytes, mask: bytes) -> bytes:
+    if not data:
+        return data
+    # 按整数一次异或，比逐字节循环快两个数量级
+    length = len(data)
+    key = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(data, 'little') ^ int.from_bytes(key, 'little')).to_bytes(length, 'little')
+
+
+def accept_key(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()).decode('ascii')
+
+
+class WebSocketConnection:
+    """
+    RFC 6455 的最小实现：文本/二进制消息（支持分片）、ping/pong 和关闭握手，不支持扩展。
+    握手之后直接读写套接字；发送加锁，线程池中的多个请求可以同时回复
+    """
+
+    def __init__(self, sock: socket.socket, initial: bytes = b'', max_message: int = DEFAULT_MAX_MESSAGE,
+                 client: bool = False):
+        self.sock = sock
+        self.max_message = max_message
+        # 客户端发出的帧必须带掩码，服务端发出的帧不能带
+        self.client = client
+        self.closed = False
+        self._buffer = bytearray(initial)
+        self._send_lock = threading.Lock()
+        sock.settimeout(FRAME_TIMEOUT)
+
+    def wait_readable(self, timeout: float) -> bool:
+        if self._buffer:
+            return True
+        # TLS 连接可能已有解密好的数据留在 SSL 缓冲区里，select 看不到
+        pending = getattr(self.sock, 'pending', None)
+        if pending is not None and pending():
+            return True
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        return bool(readable)
+
+    def _read_exact(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            try:
+                chunk = self.sock.recv(max(size - len(self._buffer), 65536))
+            except socket.timeout:
+                raise ChannelClosed(CLOSE_PROTOCOL_ERROR, '读取帧超时')
+            if not chunk:
+                raise ChannelClosed(CLOSE_GOING_AWAY, '连接已断开')
+            self._buffer += chunk
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def receive(self) -> Optional[bytes]:
+        """读取一条完整消息，期间自动回复 ping；对方关闭连接时返回 None"""
+        message = bytearray()
+        opcode = None
+        while True:
+            first, second = self._read_exact(2)
+            final = first & 0x80
+            frame_opcode = first & 0x0F
+            if bool(second & 0x80) == self.client:
+                raise ChannelClosed(CLOSE_PROTOCOL_ERROR, '帧的掩码位不正确')
+            length = second & 0x7F
+            if length == 126:
+                length = struct.unpack('!H', self._read_exact(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', self._read_exact(8))[0]
+            if len(message) + length > self.max_message:
+                raise ChannelClosed(CLOSE_TOO_BIG, '消息过大')
+            mask = b'' if self.client else self._read_exact(4)
+            payload = self._read_exact(length)
+            if mask:
+                payload = _apply_mask(payload, mask)
+
+            if frame_opcode == OP_PING:
+                self.send(OP_PONG, payload)
+            elif frame_opcode == OP_PONG:
+                pass
+            elif frame_opcode == OP_CLOSE:
+                code = struct.unpack('!H', payload[:2])[0] if len(payload) >= 2 else CLOSE_NORMAL
+                self.close(code)
+                return None
+            else:
+                if frame_opcode != OP_CONTINUATION:
+                    if opcode is not None:
+                        raise ChannelClosed(CLOSE_PROTOCOL_ERROR, '分片消息未结束')
+                    opcode = frame_opcode
+                elif opcode is None:
+                    raise ChannelClosed(CLOSE_PROTOCOL_ERROR, '没有起始帧的分片')
+                message += payload
+                if final:
+                    return bytes(message)
+
+    def send(self, opcode: int, payload: bytes) -> bool:
+        """发送一帧，连接已断开时返回 False"""
+        length = len(payload)
+        mask_bit = 0x80 if self.client else 0
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, mask_bit | length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, mask_bit | 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, mask_bit | 127, length)
+        if self.client:
+            mask = os.urandom(4)
+            header += mask
+            payload = _apply_mask(payload, mask)
+        with self._send_lock:
+            if self.closed and opcode != OP_CLOSE:
+                return False
+            try:
+                self.sock.sendall(header + payload)
+                return True
+            except OSError:
+                self.closed = True
+                return False
+
+    def send_text(self, payload: bytes) -> bool:
+        return self.send(OP_TEXT, payload)
+
+    def close(self, code: int = CLOSE_NORMAL, reason: str = '') -> None:
+        if self.closed:
+            return
+        self.send(OP_CLOSE, struct.pack('!H', code) + reason.encode('utf-8')[:120])
+        self.closed = True
+
+
+def websocket_handshake(handler) -> Optional[WebSocketConnection]:
+    """在 BaseHTTPRequestHandler 中完成升级握手；不是合法的 WebSocket 升级请求时返回 None，由调用方回复400"""
+    headers = handler.headers
+    key = headers.get('Sec-WebSocket-Key', '')
+    if (headers.get('Upgrade', '').lower() != 'websocket'
+            or 'upgrade' not in headers.get('Connection', '').lower()
+            or headers.get('Sec-WebSocket-Version') != '13' or not key):
+        return None
+    # 101 响应必须使用 HTTP/1.1 状态行；握手后这条连接不再处理 HTTP 请求
+    handler.protocol_version = 'HTTP/1.1'
+    handler.send_response(101, 'Switching Protocols')
+    handler.send_header('Upgrade', 'websocket')
+    handler.send_header('Connection', 'Upgrade')
+    handler.send_header('Sec-WebSocket-Accept', accept_key(key))
+    handler.end_headers()
+    handler.wfile.flush()
+    handler.close_connection = True
+
+    # 浏览器收到101之前不会发送帧；以防万一，把 rfile 已经缓冲的字节交给连接
+    sock = handler.connection
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        initial = handler.rfile.read1(65536) or b''
+    except OSError:
+        initial = b''
+    finally:
+        sock.settimeout(timeout)
+    return WebSocketConnection(sock, initial, _env_int('CHANNEL_MAX_MESSAGE', DEFAULT_MAX_MESSAGE))
+
+
+def error_response(error: Exception):
+    """把翻译路径上的异常转换为 (状态码, 响应)，与 HTTP 接口返回的内容一致"""
+    if isinstance(error, ReplayError):
+        return 401, {'error': str(error), 'replay_rejected': True}
+    if isinstance(error, ThrottledError):
+        return 429, {'error': str(error), 'retry_after': max(1, round(error.retry_after))}
+    if isinstance(error, BudgetExhaustedError):
+        return 503, {'error': str(error), 'cache_only': True}
+    if isinstance(error, DeadlineExceededError):
+        return 504, {'error': str(error), 'deadline_exceeded': True}
+    if isinstance(error, UpstreamError):
+        if error.deterministic:
+            return 400, {'error': error.message, 'code': error.code}
+        return 500, {'error': error.message}
+    if isinstance(error, ValueError):
+        return 400, {'error': str(error)}
+    logger.exception('通道请求处理失败')
+    return 500, {'error': str(error)}
+
+
+class _Request:
+    """读取线程解析好的一条请求；解密带防重放校验，每条消息只能解析一次"""
+
+    __slots__ = ('id', 'encrypted', 'op', 'payload', 'deadline', 'error')
+
+    def __init__(self):
+        self.id = None
+        self.encrypted = False
+        self.op = None
+        self.payload = None
+        self.deadline = None
+        self.error = None
+
+
+class _Session:
+    """
+    一条通道连接的状态，in_flight 计数用于背压和关闭前等待已收到的请求处理完；
+    running 是这个连接正占用的线程池线程数，超出上限的请求在 pending 中排队
+    """
+
+    def __init__(self, connection: WebSocketConnection, client: str, tracer, encryption, max_inflight: int):
+        self.connection = connection
+        self.client = client
+        self.tracer = tracer
+        self.encryption = encryption
+        self.max_inflight = max_inflight
+        self.in_flight = 0
+        self.running = 0
+        self.pending = deque()
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: self.in_flight < self.max_inflight)
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout: float) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self.in_flight == 0, timeout)
+
+
+class MultiplexChannel:
+    """
+    通道请求的分发器，两个代理各持有一个
+
+    请求消息：{"id": 1, "op": "translate", "text": ..., "source": ..., "target": ..., "deadline_ms": ...}
+    或 {"id": 2, "op": "dictionary", "word": ...} / {"id": 3, "op": "dictionary", "prefix": ..., "limit": ...}；
+    加密时为 {"id": 1, "encrypted": true, "timestamp": ..., "nonce": ..., "data": <AES-GCM 信封>}，
+    信封解密后是上面除 id 外的字段，时间戳和随机数的校验与 HTTP 加密请求相同。
+    响应消息：{"id": 1, "status": 200, "data": {...}}，加密请求的 data 同样是加密信封。
+    每个连接最多 max_inflight 个请求未回复，超过时暂停读取，由 TCP 把压力传回客户端；
+    其中最多 session_workers 个同时占用线程池，且总比线程池少一个线程，其他连接总有线程可用
+    """
+
+    def __init__(self, proxy, workers: Optional[int] = None, max_inflight: Optional[int] = None,
+                 idle_timeout: Optional[float] = None, session_workers: Optional[int] = None):
+        self.proxy = proxy
+        self.workers = max(workers if workers is not None else _env_int('CHANNEL_WORKERS', DEFAULT_WORKERS), 1)
+        self.max_inflight = max(max_inflight if max_inflight is not None else
+                                _env_int('CHANNEL_MAX_INFLIGHT', DEFAULT_MAX_INFLIGHT), 1)
+        session_workers = session_workers if session_workers is not None else \
+            _env_int('CHANNEL_SESSION_WORKERS', DEFAULT_SESSION_WORKERS)
+        self.session_workers = max(min(session_workers, self.workers - 1), 1)
+        self.idle_timeout = idle_timeout if idle_timeout is not None else \
+            _env_float('CHANNEL_IDLE_TIMEOUT', DEFAULT_IDLE_TIMEOUT)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='channel')
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.active_connections = 0
+        self.messages = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.inline = 0
+        self._ops = Counter()
+
+    def serve(self, connection: WebSocketConnection, client: str, tracer,
+              should_stop: Callable[[], bool], encryption=None) -> None:
+        """在请求处理线程中运行，直到连接关闭、空闲超时或服务器开始关闭"""
+        session = _Session(connection, client, tracer, encryption, self.max_inflight)
+        with self._lock:
+            self.connections += 1
+            self.active_connections += 1
+        idle = 0.0
+        try:
+            while not connection.closed:
+                if should_stop():
+                    break
+                if not connection.wait_readable(POLL_INTERVAL):
+                    idle += POLL_INTERVAL
+                    if idle >= self.idle_timeout:
+                        break
+                    continue
+                idle = 0.0
+                message = connection.receive()
+                if message is None:
+                    break
+                session.acquire()
+                request = self._parse(session, message)
+                cached = self._cached(session, request)
+                if cached is not None or request.error is not None or request.op != 'translate':
+                    # 出错、词典查询和缓存命中都是微秒级操作，不值得排进线程池
+                    self._handle(session, request, cached)
+                    with self._lock:
+                        self.inline += 1
+                else:
+                    self._schedule(session, request)
+            # 已收到的请求处理完再关闭，客户端不会丢失响应
+            session.wait_idle(FRAME_TIMEOUT)
+            connection.close(CLOSE_GOING_AWAY if should_stop() else CLOSE_NORMAL)
+        except ChannelClosed as e:
+            connection.close(e.code, e.reason)
+        except OSError:
+            connection.closed = True
+        finally:
+            with self._lock:
+                self.active_connections -= 1
+
+    def _parse(self, session: _Session, message: bytes) -> _Request:
+        request = _Request()
+        try:
+            data = json_codec.loads(message)
+            if not isinstance(data, dict):
+                raise ValueError('消息必须是JSON对象')
+            request.id = data.get('id')
+            if data.get('encrypted'):
+                if session.encryption is None:
+                    raise ValueError('代理未启用加密')
+                payload = session.encryption.decrypt_request(data)
+                # 解密失败的错误以明文返回，密钥不一致时客户端也解不开加密的错误信息
+                request.encrypted = True
+            else:
+                payload = data
+            request.payload = payload
+            request.op = payload.get('op')
+            # 截止时间从收到消息时开始计算，在线程池中排队的时间也算在内
+            request.deadline = parse_deadline({'X-Deadline-Ms': payload.get('deadline_ms')})
+        except Exception as e:
+            request.error = e
+        return request
+
+    def _cached(self, session: _Session, request: _Request) -> Optional[dict]:
+        """翻译请求命中精确缓存时返回响应数据，未命中返回 None"""
+        if request.error is not None or request.op != 'translate':
+            return None
+        text = request.payload.get('text', '')
+        if not isinstance(text, str) or not text.strip():
+            return None
+        response = self.proxy.cached_response(text, request.payload.get('source', 'en'),
+                                              request.payload.get('target', 'zh'), session.client)
+        return json_codec.loads(response.body) if response is not None else None
+
+    def _schedule(self, session: _Session, request: _Request) -> None:
+        with session._cond:
+            if session.running >= self.session_workers:
+                session.pending.append(request)
+                return
+            session.running += 1
+        self._submit(session, request)
+
+    def _submit(self, session: _Session, request: _Request) -> None:
+        try:
+            self._pool.submit(self._run, session, request)
+        except RuntimeError:
+            # 线程池已关闭，服务器正在退出，就地处理完剩下的请求
+            self._run(session, request)
+
+    def _run(self, session: _Session, request: _Request) -> None:
+        self._handle(session, request)
+        with session._cond:
+            if not session.pending:
+                session.running -= 1
+                return
+            request = session.pending.popleft()
+        # 下一个请求排到线程池队尾，其他连接的请求不用等这个连接的积压全部处理完
+        self._submit(session, request)
+
+    def _handle(self, session: _Session, request: _Request, cached: Optional[dict] = None) -> None:
+        start = time.perf_counter()
+        trace = session.tracer.start('WS', f'/channel/{request.op}' if request.op else '/channel')
+        status = 500
+        try:
+            try:
+                if request.error is not None:
+                    raise request.error
+                if cached is not None:
+                    status, data = 200, cached
+                else:
+                    status, data = self._dispatch(request.op, request.payload, session.client, request.deadline)
+            except Exception as e:
+                status, data = error_response(e)
+            trace.status = status
+            reply = {'id': request.id, 'status': status}
+            if request.encrypted:
+                reply['encrypted'] = True
+                reply['data'] = session.encryption.encrypt_object(data)
+            else:
+                reply['data'] = data
+            session.connection.send_text(json_codec.dumps(reply))
+        finally:
+            session.tracer.finish(trace)
+            session.release()
+            with self._lock:
+                self.messages += 1
+                self._ops[request.op or 'invalid'] += 1
+                self.errors += status >= 400
+                self.total_ms += (time.perf_counter() - start) * 1000
+
+    def _dispatch(self, op: Optional[str], payload: dict, client: str, deadline: Optional[float]):
+        if op == 'translate':
+            text = payload.get('text', '')
+            if not isinstance(text, str) or not text.strip():
+                return 400, {'error': '缺少翻译文本'}
+            result = self.proxy.translate(text, payload.get('source', 'en'), payload.get('target', 'zh'),
+                                          client, deadline)
+            response = {'result': result}
+            if current_trace().served_stale:
+                response['stale'] = True
+            if current_trace().fuzzy_match is not None:
+                response['fuzzy'] = client_match(current_trace().fuzzy_match)
+            return 200, response
+        if op == 'dictionary':
+            query = urlencode({name: payload[name] for name in ('word', 'prefix', 'limit') if payload.get(name)})
+            return dictionary_response(self.proxy.dictionary, query)
+        return 400, {'error': f'不支持的操作: {op}'}
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_inflight': self.max_inflight,
+                'session_workers': self.session_workers,
+                'connections': self.connections,
+                'active_connections': self.active_connections,
+                'messages': self.messages,
+                'errors': self.errors,
+                'inline': self.inline,
+                'avg_ms': round(self.total_ms / self.messages, 3) if self.messages else None,
+                'ops': dict(self._ops),
+            }
+
+
+class ChannelClient:
+    """供基准测试和脚本使用的通道客户端，request 返回 Future，响应由后台线程按 id 分发"""
+
+    def __init__(self, base_url: str, timeout: float = 10.0):
+        parts = urlsplit(base_url)
+        host = parts.hostname or 'localhost'
+        port = parts.port or 80
+        sock = socket.create_connection((host, port), timeout)
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        sock.sendall((f'GET /channel HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\n'
+                      f'Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n'
+                      f'Sec-WebSocket-Version: 13\r\n\r\n').encode('ascii'))
+        response = b''
+        while b'\r\n\r\n' not in response:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionError('握手时连接被关闭')
+            response += chunk
+        head, rest = response.split(b'\r\n\r\n', 1)
+        status_line = head.split(b'\r\n', 1)[0].decode('latin-1')
+        if ' 101 ' not in status_line or accept_key(key).encode('ascii') not in head:
+            raise ConnectionError(f'WebSocket 握手失败: {status_line}')
+        self.connection = WebSocketConnection(sock, rest, client=True)
+        self._futures: Dict[int, Future] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_loop, name='channel-client', daemon=True)
+        self._reader.start()
+
+    def request(self, payload: dict) -> Future:
+        future = Future()
+        with self._lock:
+            self._next_id += 1
+            request_id = self._next_id
+            self._futures[request_id] = future
+        self.connection.send_text(json_codec.dumps(dict(payload, id=request_id)))
+        return future
+
+    def _read_loop(self) -> None:
+        try:
+            while True:
+                message = self.connection.receive()
+                if message is None:
+                    break
+                reply = json_codec.loads(message)
+                with self._lock:
+                    future = self._futures.pop(reply.get('id'), None)
+                if future is not None:
+                    future.set_result(reply)
+        except (ChannelClosed, OSError):
+            pass
+        with self._lock:
+            futures = list(self._futures.values())
+            self._futures.clear()
+        for future in futures:
+            future.set_exception(ConnectionError('通道已关闭'))
+
+    def close(self) -> None:
+        self.connection.close()
+        self._reader.join(timeout=2)
+        self.connection.sock.close()
+
+
+def _benchmark(base_url: str, requests: int, concurrency: int, distinct: int) -> None:
+    """比较逐个 POST 和通道多路复用的吞吐量；先把所有文本各翻译一次，测量的是代理自身的开销"""
+    import urllib.request
+
+    texts = [f'benchmark word {index}' for index in range(distinct)]
+
+    def post(text):
+        body = json_codec.dumps({'text': text, 'source': 'en', 'target': 'zh'})
+        request = urllib.request.Request(base_url, data=body, method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.read()
+
+    def percentile(values, fraction):
+        return values[min(int(len(values) * fraction), len(values) - 1)]
+
+    # 预热逐条进行，不触发客户端配额的排队
+    client = ChannelClient(base_url)
+    for text in texts:
+        client.request({'op': 'translate', 'text': text}).result(timeout=60)
+
+    latencies = []
+
+    def timed_post(index):
+        start = time.perf_counter()
+        post(texts[index % distinct])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed_post, range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f'逐个 POST（{concurrency}并发）: {requests / elapsed:.0f} 请求/秒, '
+          f'p50 {percentile(latencies, 0.5):.2f} ms, p99 {percentile(latencies, 0.99):.2f} ms')
+
+    latencies = []
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def on_done(sent_at):
+        def callback(future):
+            latencies.append((time.perf_counter() - sent_at) * 1000)
+            slots.release()
+        return callback
+
+    start = time.perf_counter()
+    futures = []
+    for index in range(requests):
+        slots.acquire()
+        future = client.request({'op': 'translate', 'text': texts[index % distinct]})
+        future.add_done_callback(on_done(time.perf_counter()))
+        futures.append(future)
+    errors = sum(future.result(timeout=60)['status'] != 200 for future in futures)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f'通道多路复用（{concurrency}个在途请求）: {requests / elapsed:.0f} 请求/秒, '
+          f'p50 {percentile(latencies, 0.5):.2f} ms, p99 {percentile(latencies, 0.99):.2f} ms, 错误 {errors}')
+    client.close()
+
+
+if __name__ == '__main__':
+    url = 'http://localhost:8002'
+    count = 2000
+    parallel = 16
+    distinct_texts = 20
+    for arg in sys.argv:
+        if arg.startswith('--url='):
+            url = arg.split('=', 1)[1]
+        elif arg.startswith('--requests='):
+            count = int(arg.split('=')[1])
+        elif arg.startswith('--concurrency='):
+            parallel = int(arg.split('=')[1])
+        elif arg.startswith('--distinct='):
+            distinct_texts = int(arg.split('=')[1])
+    _benchmark(url, count, parallel, distinct_texts)
@@ -0,0 +1,408 @@
+"""
+离线词典模块
+单词卡片原来每查一个词都要请求 api.dictionaryapi.dev，再调用一次腾讯翻译。
+这里把本地词典数据（ECDICT CSV 或 dictionaryapi.dev 格式的 JSON）预先编译成一个索引文件：
+按小写词条排序的定长索引 + 词条字节 + 紧凑JSON记录，运行时用 mmap 打开，
+不需要把词典读进内存，二分查找完成精确查询、前缀联想和词形还原（went -> go）
+"""
+
+import csv
+import logging
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+import threading
+import time
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import json_codec
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = 'data/dictionary.idx'
+MAGIC = b'TMTDICT1'
+# 文件头：魔数、词条数
+_HEADER = struct.Struct('<8sI')
+# 索引项：词条偏移、词条长度、标志、保留、记录偏移、记录长度
+_ENTRY = struct.Struct('<IHBxII')
+FLAG_FORM = 1
+MAX_PREFIX_RESULTS = 50
+DEFAULT_PREFIX_RESULTS = 10
+
+POS_NAMES = {
+    'n': 'noun', 'v': 'verb', 'vt': 'verb', 'vi': 'verb', 'a': 'adjective', 'adj': 'adjective',
+    'ad': 'adverb', 'adv': 'adverb', 'prep': 'preposition', 'conj': 'conjunction',
+    'pron': 'pronoun', 'int': 'interjection', 'interj': 'interjection', 'num': 'numeral',
+    'art': 'article', 'aux': 'auxiliary verb', 'abbr': 'abbreviation',
+}
+_POS_LINE_RE = re.compile(r'^([a-z]+)\.\s*(.*)$')
+# ECDICT exchange 字段中表示变形的类型：过去式、过去分词、现在分词、第三人称单数、比较级、最高级、复数
+_FORM_TYPES = set('pdi3rts')
+
+# 词典里没有记录变形时按常见规则还原，依次尝试
+_SUFFIX_RULES = (
+    ('ies', 'y'), ('ied', 'y'), ('ier', 'y'), ('iest', 'y'),
+    ('sses', 'ss'), ('ches', 'ch'), ('shes', 'sh'), ('xes', 'x'), ('zes', 'z'), ('oes', 'o'),
+    ('ing', ''), ('ing', 'e'), ('ed', ''), ('ed', 'e'), ('d', ''),
+    ('est', ''), ('est', 'e'), ('er', ''), ('er', 'e'), ("'s", ''), ('s', ''),
+)
+
+
+def normalize_key(word: str) -> str:
+    return unicodedata.normalize('NFKC', word).strip().lower()
+
+
+def lemma_candidates(word: str) -> Iterator[str]:
+    """按后缀规则生成可能的原形，包括双写辅音（stopped -> stop）"""
+    for suffix, replacement in _SUFFIX_RULES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 2:
+            stem = word[:-len(suffix)]
+            yield stem + replacement
+            if not replacement and len(stem) >= 3 and stem[-1] == stem[-2] and stem[-1] not in 'aeiouls':
+                yield stem[:-1]
+
+
+def _split_pos_lines(text: str) -> List[Tuple[str, str]]:
+    """ECDICT 的释义字段按行分词性，形如 'n. 苹果\\nv. ...'"""
+    lines = []
+    for line in text.replace('\\n', '\n').split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        match = _POS_LINE_RE.match(line)
+        if match and match.group(1) in POS_NAMES:
+            lines.append((POS_NAMES[match.group(1)], match.group(2).strip()))
+        else:
+            lines.append(('', line))
+    return lines
+
+
+def _ecdict_entry(row: Dict[str, str]) -> Tuple[dict, List[str]]:
+    meanings = {}
+    for pos, definition in _split_pos_lines(row.get('definition') or ''):
+        meanings.setdefault(pos, {'partOfSpeech': pos, 'definitions': []})['definitions'].append(
+            {'definition': definition})
+    for pos, chinese in _split_pos_lines(row.get('translation') or ''):
+        meaning = meanings.setdefault(pos, {'partOfSpeech': pos, 'definitions': []})
+        meaning['chinese'] = f"{meaning['chinese']}；{chinese}" if 'chinese' in meaning else chinese
+
+    forms = []
+    for part in (row.get('exchange') or '').split('/'):
+        kind, _, form = part.partition(':')
+        if kind in _FORM_TYPES and form:
+            forms.append(form)
+    entry = {
+        'word': row['word'],
+        'phonetic': f"/{row['phonetic']}/" if row.get('phonetic') else '',
+        'meanings': list(meanings.values()),
+    }
+    return entry, forms
+
+
+def _dictionaryapi_entry(data: dict) -> Tuple[dict, List[str]]:
+    phonetic = data.get('phonetic') or next(
+        (item['text'] for item in data.get('phonetics', []) if item.get('text')), '')
+    meanings = []
+    for meaning in data.get('meanings', []):
+        definitions = []
+        for definition in meaning.get('definitions', []):
+            item = {'definition': definition.get('definition', '')}
+            if definition.get('example'):
+                item['example'] = definition['example']
+            definitions.append(item)
+        meanings.append({'partOfSpeech': meaning.get('partOfSpeech', ''), 'definitions': definitions})
+    return {'word': data['word'], 'phonetic': phonetic, 'meanings': meanings}, []
+
+
+def read_source(path: str) -> Iterator[Tuple[dict, List[str]]]:
+    """读取词典数据，逐条返回 (词条, 变形列表)；.csv 按 ECDICT 格式，.json/.jsonl 按 dictionaryapi.dev 格式"""
+    if path.endswith('.csv'):
+        with open(path, encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                if row.get('word'):
+                    yield _ecdict_entry(row)
+    elif path.endswith('.jsonl'):
+        with open(path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield _dictionaryapi_entry(json_codec.loads(line))
+    else:
+        with open(path, 'rb') as f:
+            for data in json_codec.loads(f.read()):
+                yield _dictionaryapi_entry(data)
+
+
+def build_index(entries: Iterable[Tuple[dict, List[str]]], output: str) -> int:
+    """编译索引文件，返回词条数。先写临时文件再替换，正在运行的代理继续使用旧文件直到重新打开"""
+    records = {}
+    forms = {}
+    for entry, entry_forms in entries:
+        key = normalize_key(entry['word'])
+        if not key:
+            continue
+        # 同一词条大小写不同时（March / march）保留小写的那个
+        if key not in records or entry['word'] == key:
+            records[key] = entry
+        for form in entry_forms:
+            forms.setdefault(normalize_key(form), key)
+
+    keys = sorted(records)
+    blobs = {key: json_codec.dumps(records[key]) for key in keys}
+    items = [(key.encode('utf-8'), 0, key) for key in keys]
+    items.extend((form.encode('utf-8'), FLAG_FORM, lemma) for form, lemma in forms.items()
+                 if form not in records and lemma in records)
+    items.sort(key=lambda item: item[0])
+
+    keys_start = _HEADER.size + _ENTRY.size * len(items)
+    key_offsets = []
+    offset = keys_start
+    for key_bytes, _, _ in items:
+        key_offsets.append(offset)
+        offset += len(key_bytes)
+    record_offsets = {}
+    for key in keys:
+        record_offsets[key] = offset
+        offset += len(blobs[key])
+    if offset >= 1 << 32:
+        raise ValueError('词典过大，索引文件超过 4GB')
+
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    temp = f'{output}.tmp'
+    with open(temp, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(items)))
+        for (key_bytes, flags, target), key_offset in zip(items, key_offsets):
+            f.write(_ENTRY.pack(key_offset, len(key_bytes), flags,
+                                record_offsets[target], len(blobs[target])))
+        for key_bytes, _, _ in items:
+            f.write(key_bytes)
+        for key in keys:
+            f.write(blobs[key])
+    os.replace(temp, output)
+    return len(keys)
+
+
+class OfflineDictionary:
+    """
+    mmap 打开的词典索引
+
+    索引项按词条字节序排列，精确查询和前缀查询都是对索引项的二分查找，
+    只在命中时解码对应的一条记录。变形（went）作为带 FLAG_FORM 的索引项指向原形的记录。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path if path is not None else os.getenv('DICTIONARY_INDEX', DEFAULT_INDEX_PATH)
+        self._mm = None
+        self._count = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.lemma_hits = 0
+        self.prefix_queries = 0
+        self.load_ms = None
+        if self.path:
+            self._open()
+
+    def _open(self) -> None:
+        if not os.path.exists(self.path):
+            logger.info(f'离线词典索引不存在: {self.path}')
+            return
+        start = time.perf_counter()
+        try:
+            with open(self.path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, count = _HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                mm.close()
+                raise ValueError('文件格式不正确')
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f'无法打开离线词典 {self.path}: {e}')
+            return
+        self._mm, self._count = mm, count
+        self.load_ms = (time.perf_counter() - start) * 1000
+        logger.info(f'离线词典已加载: {count} 个索引项, {self.load_ms:.2f} ms')
+
+    @property
+    def available(self) -> bool:
+        return self._mm is not None
+
+    def _entry(self, index: int) -> Tuple[int, int, int, int, int]:
+        return _ENTRY.unpack_from(self._mm, _HEADER.size + index * _ENTRY.size)
+
+    def _key(self, index: int) -> bytes:
+        key_offset, key_length = _ENTRY.unpack_from(self._mm, _HEADER.size + index * _ENTRY.size)[:2]
+        return self._mm[key_offset:key_offset + key_length]
+
+    def _lower_bound(self, key: bytes) -> int:
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _find(self, key: str, headword_only: bool = False) -> Optional[Tuple[dict, bool]]:
+        key_bytes = key.encode('utf-8')
+        index = self._lower_bound(key_bytes)
+        if index >= self._count or self._key(index) != key_bytes:
+            return None
+        _, _, flags, record_offset, record_length = self._entry(index)
+        is_form = bool(flags & FLAG_FORM)
+        if headword_only and is_form:
+            return None
+        return json_codec.loads(self._mm[record_offset:record_offset + record_length]), is_form
+
+    def lookup(self, word: str) -> Optional[dict]:
+        """查询词条；变形返回原形的词条，并带上 lemma 字段"""
+        if not self.available:
+            return None
+        key = normalize_key(word)
+        found = self._find(key) if key else None
+        inflected = found is not None and found[1]
+        if found is None and key:
+            for candidate in lemma_candidates(key):
+                found = self._find(candidate, headword_only=True)
+                if found is not None:
+                    inflected = True
+                    break
+        with self._lock:
+            self.lookups += 1
+            if found is not None:
+                self.hits += 1
+                self.lemma_hits += inflected
+        if found is None:
+            return None
+        entry = found[0]
+        if inflected:
+            entry['lemma'] = entry['word']
+            entry['query'] = word
+        return entry
+
+    def complete(self, prefix: str, limit: int = DEFAULT_PREFIX_RESULTS) -> List[str]:
+        """返回以 prefix 开头的词条（不含变形），按字母顺序"""
+        if not self.available:
+            return []
+        key = normalize_key(prefix).encode('utf-8')
+        words = []
+        if key:
+            index = self._lower_bound(key)
+            while index < self._count and len(words) < limit:
+                key_offset, key_length, flags, record_offset, record_length = self._entry(index)
+                if not self._mm[key_offset:key_offset + key_length].startswith(key):
+                    break
+                if not flags & FLAG_FORM:
+                    words.append(json_codec.loads(self._mm[record_offset:record_offset + record_length])['word'])
+                index += 1
+        with self._lock:
+            self.prefix_queries += 1
+        return words
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'available': self.available,
+                'path': self.path,
+                'index_entries': self._count,
+                'load_ms': round(self.load_ms, 3) if self.load_ms is not None else None,
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'lemma_hits': self.lemma_hits,
+                'prefix_queries': self.prefix_queries,
+            }
+
+
+def dictionary_response(dictionary: OfflineDictionary, query: str) -> Tuple[int, dict]:
+    """处理 GET /dictionary?word=... 或 ?prefix=...&limit=...，返回 (状态码, 响应)"""
+    from urllib.parse import parse_qs
+
+    if not dictionary.available:
+        return 503, {'error': '离线词典未配置'}
+    params = parse_qs(query)
+    word = params.get('word', [''])[0]
+    prefix = params.get('prefix', [''])[0]
+    if word:
+        entry = dictionary.lookup(word)
+        if entry is None:
+            return 404, {'error': '词典中没有该词', 'word': word}
+        return 200, entry
+    if prefix:
+        try:
+            limit = int(params.get('limit', [DEFAULT_PREFIX_RESULTS])[0])
+        except ValueError:
+            limit = DEFAULT_PREFIX_RESULTS
+        limit = min(max(limit, 1), MAX_PREFIX_RESULTS)
+        return 200, {'prefix': prefix, 'words': dictionary.complete(prefix, limit)}
+    return 400, {'error': '缺少 word 或 prefix 参数'}
+
+
+def _synthetic_entries(count: int) -> Iterator[Tuple[dict, List[str]]]:
+    rng = random.Random(0)
+    seen = set()
+    while len(seen) < count:
+        word = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 12)))
+        if word in seen:
+            continue
+        seen.add(word)
+        yield {
+            'word': word,
+            'phonetic': f'/{word}/',
+            'meanings': [{'partOfSpeech': 'noun', 'chinese': '测试释义',
+                          'definitions': [{'definition': f'a synthetic definition of {word}'}]}],
+        }, [word + 's', word + 'ed']
+
+
+def benchmark(index_path: Optional[str] = None, count: int = 300000, queries: int = 20000) -> None:
+    """测量索引的打开耗时和查询延迟；不指定索引时用随机词条生成一个"""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        if index_path is None:
+            index_path = os.path.join(directory, 'dictionary.idx')
+            start = time.perf_counter()
+            build_index(_synthetic_entries(count), index_path)
+            print(f'编译 {count} 个词条: {time.perf_counter() - start:.1f} s, '
+                  f'{os.path.getsize(index_path) / 1024 / 1024:.1f} MB')
+        dictionary = OfflineDictionary(index_path)
+        if not dictionary.available:
+            print(f'无法打开索引: {index_path}')
+            return
+        print(f'打开索引: {dictionary.load_ms:.3f} ms, {dictionary._count} 个索引项')
+        rng = random.Random(1)
+        keys = [dictionary._key(rng.randrange(dictionary._count)).decode('utf-8') for _ in range(queries)]
+        for name, func in (('精确/变形查询', dictionary.lookup), ('前缀查询', lambda key: dictionary.complete(key[:3]))):
+            latencies = []
+            for key in keys:
+                start = time.perf_counter()
+                func(key)
+                latencies.append((time.perf_counter() - start) * 1e6)
+            latencies.sort()
+            print(f'{name}: p50 {latencies[len(latencies) // 2]:.1f} us, '
+                  f'p99 {latencies[int(len(latencies) * 0.99)]:.1f} us')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    options = {}
+    for arg in sys.argv[1:]:
+        name, _, value = arg.lstrip('-').partition('=')
+        options[name] = value
+    output = options.get('output') or options.get('index') or os.getenv('DICTIONARY_INDEX', DEFAULT_INDEX_PATH)
+    if options.get('build'):
+        start = time.perf_counter()
+        sources = options['build'].split(',')
+        total = build_index((item for path in sources for item in read_source(path)), output)
+        print(f'已编译 {total} 个词条到 {output}，耗时 {time.perf_counter() - start:.1f} s')
+    elif options.get('lookup'):
+        entry = OfflineDictionary(output).lookup(options['lookup'])
+        print(json_codec.dumps(entry).decode('utf-8') if entry else '词典中没有该词')
+    elif 'benchmark' in options:
+        benchmark(options.get('index') or None)
+    else:
+        print('用法: python offline_dictionary.py --build=ecdict.csv[,more.json] [--output=data/dictionary.idx]\n'
+              '      python offline_dictionary.py --lookup=went [--index=data/dictionary.idx]\n'
+              '      python offline_dictionary.py --benchmark [--index=data/dictionary.idx]')
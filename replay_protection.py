@@ -0,0 +1,248 @@
+"""
+重放保护模块
+加密请求带时间戳（毫秒）和随机数，二者作为 AES-GCM 的附加认证数据参与解密，改动任何一个都会解密失败。
+时间戳与服务器时间相差超过 REPLAY_WINDOW 秒的请求直接拒绝；窗口内的请求按信封的 IV 查重，
+IV 由 GCM 认证且每次加密随机生成，同一个信封再次出现即为重放。
+
+已见过的 IV 记在按时间戳分桶的布隆过滤器里：每个窗口一个桶，共4个桶轮换使用，
+窗口内的时间戳最多落在相邻的3个桶中，最旧的桶在被复用时清空。查重和插入都是 O(1)，
+内存固定为 4 个按 REPLAY_CAPACITY 和 REPLAY_FP_RATE 计算大小的位数组；
+误判（把新请求当作重放）的概率不超过 REPLAY_FP_RATE，客户端用新的随机数重发即可
+"""
+
+import hashlib
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 300.0
+DEFAULT_CAPACITY = 200000
+DEFAULT_FP_RATE = 1e-6
+BUCKETS = 4
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+class ReplayError(Exception):
+    """时间戳缺失、超出窗口，或信封已经处理过"""
+
+
+def request_stamp(request: dict, headers=None) -> Tuple[Optional[str], Optional[str]]:
+    """取出请求的时间戳和随机数：优先用请求体中的 timestamp/nonce，其次是 X-Timestamp/X-Nonce 请求头"""
+    timestamp = request.get('timestamp')
+    nonce = request.get('nonce')
+    if (timestamp is None or nonce is None) and headers is not None:
+        timestamp = headers.get('X-Timestamp')
+        nonce = headers.get('X-Nonce')
+    if timestamp is None or nonce is None:
+        return None, None
+    return str(timestamp), str(nonce)
+
+
+def associated_data(timestamp: str, nonce: str) -> bytes:
+    """AES-GCM 附加认证数据，与 encryption.js 中的格式一致"""
+    return f'{timestamp}.{nonce}'.encode('utf-8')
+
+
+class _BloomFilter:
+    """定长位数组上的布隆过滤器，k 个位置由一次 blake2b 摘要双重哈希得到"""
+
+    __slots__ = ('bits', 'size', 'hashes', 'bucket', 'items', 'set_bits')
+
+    def __init__(self, size: int, hashes: int):
+        self.bits = bytearray(size // 8)
+        self.size = size
+        self.hashes = hashes
+        self.bucket = None
+        self.items = 0
+        self.set_bits = 0
+
+    def reset(self, bucket: int) -> None:
+        self.bits[:] = bytes(len(self.bits))
+        self.bucket = bucket
+        self.items = 0
+        self.set_bits = 0
+
+    def _positions(self, key: bytes):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        return ((h1 + i * h2) % size for i in range(self.hashes))
+
+    def contains(self, key: bytes) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def add(self, key: bytes) -> bool:
+        """插入 key，返回插入前是否（可能）已存在"""
+        bits = self.bits
+        new_bits = 0
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            index = position >> 3
+            if not bits[index] & mask:
+                bits[index] |= mask
+                new_bits += 1
+        if not new_bits:
+            return True
+        self.items += 1
+        self.set_bits += new_bits
+        return False
+
+    def false_positive_rate(self) -> float:
+        """按当前置位比例估计的误判率"""
+        return (self.set_bits / self.size) ** self.hashes
+
+
+class ReplayGuard:
+    """
+    加密请求的时间窗口检查和重放查重，window 为 0 时关闭
+
+    check_window 在解密前调用，只做时间戳检查，开销很小；
+    remember 在解密成功（附加认证数据校验通过）后调用，伪造的信封不会写入过滤器
+    """
+
+    def __init__(self, window: Optional[float] = None, capacity: Optional[int] = None,
+                 fp_rate: Optional[float] = None):
+        self.window = window if window is not None else _env_float('REPLAY_WINDOW', DEFAULT_WINDOW)
+        self.capacity = max(capacity if capacity is not None else
+                            _env_int('REPLAY_CAPACITY', DEFAULT_CAPACITY), 1)
+        fp_rate = fp_rate if fp_rate is not None else _env_float('REPLAY_FP_RATE', DEFAULT_FP_RATE)
+        self.fp_rate = min(max(fp_rate, 1e-12), 0.5)
+        # 标准的布隆过滤器参数：m = -n·ln(p)/ln(2)²，k = m/n·ln(2)
+        size = math.ceil(-self.capacity * math.log(self.fp_rate) / math.log(2) ** 2)
+        self.size = (size + 7) // 8 * 8
+        self.hashes = max(round(self.size / self.capacity * math.log(2)), 1)
+        self._filters = [_BloomFilter(self.size, self.hashes) for _ in range(BUCKETS)] if self.enabled else []
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.replays = 0
+        self.outside_window = 0
+        self.missing = 0
+        self._saturated_warned = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def require_stamp(self) -> None:
+        """请求没有时间戳或随机数时调用：启用重放保护时拒绝"""
+        if self.enabled:
+            with self._lock:
+                self.missing += 1
+            raise ReplayError('加密请求缺少时间戳或随机数')
+
+    def check_window(self, timestamp: str) -> float:
+        """解析毫秒时间戳并检查是否在窗口内，返回秒数"""
+        try:
+            issued = float(timestamp) / 1000
+        except ValueError:
+            raise ReplayError('请求时间戳格式错误')
+        if self.enabled and not abs(time.time() - issued) <= self.window:
+            with self._lock:
+                self.outside_window += 1
+            raise ReplayError('请求时间戳超出允许范围')
+        return issued
+
+    def remember(self, key, issued: float) -> None:
+        """记录信封的 IV，已经见过时抛出 ReplayError"""
+        if not self.enabled:
+            return
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        bucket = int(issued // self.window)
+        with self._lock:
+            bloom = self._filters[bucket % BUCKETS]
+            if bloom.bucket != bucket:
+                bloom.reset(bucket)
+            if bloom.add(key):
+                self.replays += 1
+                raise ReplayError('重复的请求')
+            self.accepted += 1
+            if bloom.items > self.capacity and not self._saturated_warned:
+                self._saturated_warned = True
+                logger.warning(f'重放保护过滤器已超过容量 {self.capacity}，误判率会上升，请调高 REPLAY_CAPACITY')
+
+    def stats(self) -> dict:
+        with self._lock:
+            active = [bloom for bloom in self._filters if bloom.bucket is not None]
+            return {
+                'enabled': self.enabled,
+                'window': self.window,
+                'capacity': self.capacity,
+                'target_fp_rate': self.fp_rate,
+                'hashes': self.hashes,
+                'bits_per_filter': self.size,
+                'memory_bytes': self.size // 8 * len(self._filters),
+                'accepted': self.accepted,
+                'replays': self.replays,
+                'outside_window': self.outside_window,
+                'missing': self.missing,
+                'buckets': [{'bucket': bloom.bucket, 'items': bloom.items,
+                             'fill': round(bloom.set_bits / bloom.size, 4),
+                             'fp_rate': bloom.false_positive_rate()} for bloom in active],
+                'max_fp_rate': max((bloom.false_positive_rate() for bloom in active), default=0.0),
+            }
+
+
+def benchmark(items: int = DEFAULT_CAPACITY, probes: int = 1000000, fp_rate: float = DEFAULT_FP_RATE) -> None:
+    """按容量插入 items 个随机 IV，测量每次查重的耗时，再用 probes 个从未见过的 IV 实测误判率"""
+    guard = ReplayGuard(window=DEFAULT_WINDOW, capacity=items, fp_rate=fp_rate)
+    now = time.time()
+    keys = [os.urandom(12) for _ in range(items)]
+    start = time.perf_counter()
+    for key in keys:
+        try:
+            guard.remember(key, now)
+        except ReplayError:
+            pass
+    per_check = (time.perf_counter() - start) / items * 1e6
+    bloom = guard._filters[int(now // guard.window) % BUCKETS]
+    false_positives = sum(bloom.contains(os.urandom(12)) for _ in range(probes))
+    replayed = 0
+    for key in keys[:1000]:
+        try:
+            guard.remember(key, now)
+        except ReplayError:
+            replayed += 1
+    stats = guard.stats()
+    print(f'容量 {items}, k={stats["hashes"]}, 内存 {stats["memory_bytes"] / 1024 / 1024:.2f} MiB（{BUCKETS}个桶）')
+    print(f'查重+插入 {per_check:.2f} us/请求，重放拦截 {replayed}/1000')
+    print(f'目标误判率 {stats["target_fp_rate"]:g}，估计 {stats["max_fp_rate"]:.2e}，'
+          f'实测 {false_positives}/{probes}')
+
+
+if __name__ == '__main__':
+    options = {'items': DEFAULT_CAPACITY, 'probes': 1000000, 'fp_rate': DEFAULT_FP_RATE}
+    for arg in sys.argv[1:]:
+        if arg.startswith('--') and '=' in arg:
+            key, value = arg[2:].split('=', 1)
+            key = key.replace('-', '_')
+            if key in options:
+                options[key] = type(options[key])(value)
+    benchmark(**options)
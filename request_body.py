@@ -0,0 +1,187 @@
+"""
+请求体读取模块
+为翻译代理提供带大小上限、读取总时限和分块传输(chunked)支持的请求体读取
+"""
+
+import os
+import socket
+import time
+from typing import Optional
+
+DEFAULT_MAX_BODY_SIZE = 1024 * 1024
+DEFAULT_READ_TIMEOUT = 10.0
+
+# 分块长度行本身的最大长度，防止恶意客户端发送超长的长度行
+MAX_CHUNK_LINE = 1024
+
+
+class RequestBodyError(Exception):
+    """请求体读取失败，携带应返回给客户端的HTTP状态码"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def get_max_body_size() -> int:
+    """从环境变量 MAX_REQUEST_BODY_SIZE 读取请求体上限（字节）"""
+    value = os.getenv('MAX_REQUEST_BODY_SIZE')
+    if not value:
+        return DEFAULT_MAX_BODY_SIZE
+    try:
+        return int(value)
+    except ValueError:
+        return DEFAULT_MAX_BODY_SIZE
+
+
+def get_read_timeout() -> float:
+    """从环境变量 REQUEST_READ_TIMEOUT 读取请求体读取超时（秒）"""
+    value = os.getenv('REQUEST_READ_TIMEOUT')
+    if not value:
+        return DEFAULT_READ_TIMEOUT
+    try:
+        return float(value)
+    except ValueError:
+        return DEFAULT_READ_TIMEOUT
+
+
+class _DeadlineReader:
+    """
+    按整个请求体的截止时间读取：每次读取前把连接超时设为剩余时间，且每次最多触发一次 recv，
+    逐字节慢速发送的客户端也不能把读取时间拖过截止时间
+    """
+
+    def __init__(self, rfile, connection, deadline: float):
+        self.rfile = rfile
+        self.connection = connection
+        self.deadline = deadline
+        self._readinto1 = getattr(rfile, 'readinto1', rfile.readinto)
+
+    def _arm(self) -> None:
+        left = self.deadline - time.monotonic()
+        if left <= 0:
+            raise socket.timeout('读取请求体超时')
+        self.connection.settimeout(left)
+
+    def readinto(self, view: memoryview) -> int:
+        self._arm()
+        return self._readinto1(view)
+
+    def readline(self, limit: int) -> bytes:
+        if not hasattr(self.rfile, 'peek'):
+            self._arm()
+            return self.rfile.readline(limit)
+        line = bytearray()
+        while len(line) < limit:
+            self._arm()
+            data = self.rfile.peek(1)[:limit - len(line)]
+            if not data:
+                break
+            end = data.find(b'\n')
+            # peek 返回的数据已在缓冲区中，read 不会再触发 recv
+            line += self.rfile.read(end + 1 if end >= 0 else len(data))
+            if end >= 0:
+                break
+        return bytes(line)
+
+
+def _read_into(rfile, view: memoryview) -> None:
+    """把数据读满给定的缓冲区视图，连接提前关闭时报错"""
+    pos = 0
+    size = len(view)
+    while pos < size:
+        n = rfile.readinto(view[pos:])
+        if not n:
+            raise RequestBodyError(400, '请求体不完整')
+        pos += n
+
+
+def _read_content_length_body(rfile, length: int) -> bytes:
+    buf = bytearray(length)
+    with memoryview(buf) as view:
+        _read_into(rfile, view)
+    return bytes(buf)
+
+
+def _read_chunk_line(rfile) -> bytes:
+    line = rfile.readline(MAX_CHUNK_LINE + 1)
+    if not line:
+        raise RequestBodyError(400, '分块请求体不完整')
+    if len(line) > MAX_CHUNK_LINE:
+        raise RequestBodyError(400, '分块长度行过长')
+    return line
+
+
+def _read_chunked_body(rfile, max_size: int) -> bytes:
+    # 每块直接读进按块长分配的缓冲区，最后拼接一次
+    chunks = []
+    total = 0
+    while True:
+        size_line = _read_chunk_line(rfile).split(b';', 1)[0].strip()
+        try:
+            chunk_size = int(size_line, 16)
+        except ValueError:
+            raise RequestBodyError(400, '分块长度无效')
+        if chunk_size < 0:
+            raise RequestBodyError(400, '分块长度无效')
+        if chunk_size == 0:
+            break
+        if total + chunk_size > max_size:
+            raise RequestBodyError(413, '请求体过大')
+
+        chunk = bytearray(chunk_size)
+        with memoryview(chunk) as view:
+            _read_into(rfile, view)
+        chunks.append(chunk)
+        total += chunk_size
+
+        if _read_chunk_line(rfile) not in (b'\r\n', b'\n'):
+            raise RequestBodyError(400, '分块格式错误')
+
+    # 丢弃trailer部分，直到空行
+    while _read_chunk_line(rfile) not in (b'\r\n', b'\n'):
+        pass
+
+    return b''.join(chunks)
+
+
+def read_request_body(handler, max_size: Optional[int] = None,
+                      timeout: Optional[float] = None) -> bytes:
+    """
+    读取 BaseHTTPRequestHandler 的请求体
+
+    Content-Length 超过上限时在分配任何缓冲区之前就返回413；
+    timeout 是读取整个请求体的总时间，超过后返回408。
+    """
+    if max_size is None:
+        max_size = get_max_body_size()
+    if timeout is None:
+        timeout = get_read_timeout()
+
+    transfer_encoding = handler.headers.get('Transfer-Encoding', '')
+    is_chunked = 'chunked' in transfer_encoding.lower()
+
+    if not is_chunked:
+        content_length = handler.headers.get('Content-Length')
+        if content_length is None:
+            raise RequestBodyError(411, '缺少Content-Length')
+        try:
+            length = int(content_length)
+        except ValueError:
+            raise RequestBodyError(400, 'Content-Length无效')
+        if length < 0:
+            raise RequestBodyError(400, 'Content-Length无效')
+        if length > max_size:
+            raise RequestBodyError(413, '请求体过大')
+
+    previous_timeout = handler.connection.gettimeout()
+    rfile = _DeadlineReader(handler.rfile, handler.connection, time.monotonic() + timeout)
+    try:
+        if is_chunked:
+            return _read_chunked_body(rfile, max_size)
+        return _read_content_length_body(rfile, length)
+    except socket.timeout:
+        raise RequestBodyError(408, '读取请求体超时')
+    finally:
+        handler.connection.settimeout(previous_timeout)
@@ -0,0 +1,54 @@
+"""
+请求截止时间模块
+每个翻译请求带一个绝对截止时间（time.monotonic），来自客户端的 X-Deadline-Ms 请求头
+或服务端默认值；排队、上游调用和换区域重试都只使用剩余时间，
+时间到了就放弃仍在进行的调用，返回过期缓存或快速超时
+"""
+
+import os
+import time
+from typing import Optional
+
+DEFAULT_DEADLINE_MS = 10000.0
+# 为写回响应预留的时间，避免在截止时间的最后一刻才开始返回
+DEFAULT_DEADLINE_MARGIN_MS = 20.0
+
+
+class DeadlineExceededError(Exception):
+    """请求截止时间已到，上游调用已被放弃"""
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def parse_deadline(headers) -> Optional[float]:
+    """
+    根据 X-Deadline-Ms（客户端愿意等待的毫秒数）计算截止时间；
+    客户端的值不能超过 REQUEST_DEADLINE_MS，REQUEST_DEADLINE_MS 为 0 且客户端未指定时不设截止时间
+    """
+    limit_ms = _env_float('REQUEST_DEADLINE_MS', DEFAULT_DEADLINE_MS)
+    budget_ms = limit_ms if limit_ms > 0 else None
+    try:
+        requested_ms = float(headers.get('X-Deadline-Ms') or 0)
+    except ValueError:
+        requested_ms = 0
+    if requested_ms > 0:
+        budget_ms = min(requested_ms, budget_ms) if budget_ms is not None else requested_ms
+    if budget_ms is None:
+        return None
+    margin_ms = _env_float('DEADLINE_MARGIN_MS', DEFAULT_DEADLINE_MARGIN_MS)
+    return time.monotonic() + max(budget_ms - margin_ms, 0) / 1000
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """距截止时间的秒数，没有截止时间时返回 None"""
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
@@ -0,0 +1,155 @@
+"""
+请求追踪模块
+为每个请求分配请求ID并记录各阶段耗时（读取请求体、解密、签名、上游调用、
+加密、写日志等），超过阈值的慢请求保存在固定大小的环形缓冲区中供管理接口查询
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOW_THRESHOLD_MS = 1000.0
+DEFAULT_SLOW_LOG_SIZE = 100
+
+# 客户端传入的 X-Request-ID 只接受简单字符，避免注入响应头或日志
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_local = threading.local()
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+class Trace:
+    """单个请求的追踪记录，同名阶段的耗时累加"""
+
+    def __init__(self, request_id: str, method: str, path: str):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+        self.status = None
+        self.spans = {}
+        # 截止时间已到时置位；served_stale 表示用过期缓存代替了上游结果
+        self.deadline_missed = False
+        self.served_stale = False
+        # 翻译记忆找到的近似句子 {'text', 'result', 'similarity', 'reused'}；text 是其他请求的原文，不返回给客户端
+        self.fuzzy_match = None
+
+    def add_span(self, name: str, duration: float) -> None:
+        span = self.spans.get(name)
+        if span is None:
+            self.spans[name] = [duration, 1]
+        else:
+            span[0] += duration
+            span[1] += 1
+
+    def finish(self) -> float:
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        return self.duration_ms
+
+    def to_dict(self) -> dict:
+        return {
+            'request_id': self.request_id,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            'deadline_missed': self.deadline_missed,
+            'served_stale': self.served_stale,
+            'spans': {
+                name: {'ms': round(total * 1000, 3), 'count': count}
+                for name, (total, count) in self.spans.items()
+            },
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def span(name: str):
+    """记录当前请求中一个阶段的耗时；不在请求处理线程中时不做任何事"""
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, time.perf_counter() - start)
+
+
+class RequestTracer:
+    """创建请求追踪并保留最近的慢请求"""
+
+    def __init__(self, threshold_ms: Optional[float] = None, capacity: Optional[int] = None):
+        self.threshold_ms = threshold_ms if threshold_ms is not None else \
+            _env_float('SLOW_REQUEST_THRESHOLD_MS', DEFAULT_SLOW_THRESHOLD_MS)
+        capacity = capacity if capacity is not None else \
+            int(_env_float('SLOW_REQUEST_LOG_SIZE', DEFAULT_SLOW_LOG_SIZE))
+        self._slow = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.total_requests = 0
+        self.slow_requests = 0
+        self.deadline_misses = 0
+        self.stale_fallbacks = 0
+
+    def start(self, method: str, path: str, request_id: Optional[str] = None) -> Trace:
+        if not request_id or not _REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex[:16]
+        trace = Trace(request_id, method, path.split('?', 1)[0])
+        _local.trace = trace
+        return trace
+
+    def finish(self, trace: Trace) -> None:
+        _local.trace = None
+        duration_ms = trace.finish()
+        with self._lock:
+            self.total_requests += 1
+            if trace.deadline_missed:
+                self.deadline_misses += 1
+                if trace.served_stale:
+                    self.stale_fallbacks += 1
+            if duration_ms < self.threshold_ms:
+                return
+            self.slow_requests += 1
+            self._slow.append(trace)
+        logger.warning(f'慢请求 {trace.request_id} {trace.method} {trace.path} '
+                       f'{duration_ms:.1f}ms {trace.to_dict()["spans"]}')
+
+    def recent_slow(self) -> List[dict]:
+        with self._lock:
+            traces = list(self._slow)
+        return [trace.to_dict() for trace in reversed(traces)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'threshold_ms': self.threshold_ms,
+                'capacity': self._slow.maxlen,
+                'total_requests': self.total_requests,
+                'slow_requests': self.slow_requests,
+                'deadline_misses': self.deadline_misses,
+                'stale_fallbacks': self.stale_fallbacks,
+            }
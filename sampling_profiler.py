@@ -0,0 +1,146 @@
+"""
+采样分析器模块
+按需在运行中的代理进程里周期性采集所有线程的调用栈，
+输出火焰图工具可直接使用的折叠栈（collapsed stacks）格式；
+未调用时不创建线程，也不安装任何钩子
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_INTERVAL = 0.005
+MAX_SECONDS = 60.0
+MIN_INTERVAL = 0.001
+
+# 栈顶是这些函数的线程只是在等待（select、队列、锁），默认不计入结果
+IDLE_FUNCTIONS = {
+    'select', 'poll', 'accept', 'wait', '_wait_for_tstate_lock',
+    'serve_forever', 'readinto', 'recv_into',
+}
+
+
+class ProfilerBusyError(Exception):
+    """已有采样正在进行"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """同一时间只允许一个采样任务"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def profile(self, seconds: float, interval: float = DEFAULT_INTERVAL,
+                include_idle: bool = False) -> dict:
+        seconds = min(max(seconds, 0.0), MAX_SECONDS)
+        # 间隔不超过采样时长，否则一次 sleep 就会持锁阻塞很久
+        interval = min(max(interval, MIN_INTERVAL), max(seconds, MIN_INTERVAL))
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError('已有采样正在进行')
+        try:
+            return self._sample(seconds, interval, include_idle)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float, include_idle: bool) -> dict:
+        stacks = Counter()
+        samples = 0
+        own_ident = threading.get_ident()
+        deadline = time.perf_counter() + seconds
+        started = time.perf_counter()
+
+        while time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                if not include_idle and frame.f_code.co_name in IDLE_FUNCTIONS:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f'thread-{ident}'))
+                stacks[';'.join(reversed(labels))] += 1
+            frame = None
+            samples += 1
+            time.sleep(interval)
+
+        return {
+            'seconds': round(time.perf_counter() - started, 3),
+            'interval_ms': interval * 1000,
+            'samples': samples,
+            'stacks': stacks,
+        }
+
+    @staticmethod
+    def to_collapsed(result: dict) -> str:
+        """每行 "帧;帧;帧 次数"，可直接交给 flamegraph.pl 或 speedscope"""
+        return ''.join(f'{stack} {count}\n' for stack, count in result['stacks'].most_common())
+
+
+def parse_profile_query(query: str) -> dict:
+    """解析 /admin/profile 的查询参数：seconds、interval_ms、idle、format"""
+    from urllib.parse import parse_qs
+
+    params = parse_qs(query)
+
+    def number(name: str, default: float) -> float:
+        try:
+            value = float(params.get(name, [default])[0])
+        except ValueError:
+            return default
+        # inf 和 nan 会让 time.sleep 抛出异常，按未提供处理
+        return value if math.isfinite(value) else default
+
+    return {
+        'seconds': number('seconds', 5.0),
+        'interval': number('interval_ms', DEFAULT_INTERVAL * 1000) / 1000,
+        'include_idle': params.get('idle', ['0'])[0] in ('1', 'true'),
+        'format': params.get('format', ['collapsed'])[0],
+    }
+
+
+profiler = SamplingProfiler()
+
+
+def run_profile_request(query: str) -> tuple:
+    """
+    执行一次采样并返回 (status, content_type, body_bytes)，
+    供两个代理的管理接口共用
+    """
+    import json
+
+    options = parse_profile_query(query)
+    try:
+        result = profiler.profile(options['seconds'], options['interval'], options['include_idle'])
+    except ProfilerBusyError as e:
+        body = json.dumps({'error': str(e)}, ensure_ascii=False).encode('utf-8')
+        return 409, 'application/json; charset=utf-8', body
+
+    if options['format'] == 'json':
+        result['stacks'] = dict(result['stacks'].most_common())
+        body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        return 200, 'application/json; charset=utf-8', body
+    return 200, 'text/plain; charset=utf-8', SamplingProfiler.to_collapsed(result).encode('utf-8')
+
+
+if __name__ == '__main__':
+    # 对自身做一次简单演示：采样一个忙碌的工作线程
+    def busy():
+        end = time.time() + 1.5
+        while time.time() < end:
+            sum(i * i for i in range(1000))
+
+    worker = threading.Thread(target=busy, name='busy-worker')
+    worker.start()
+    print(SamplingProfiler.to_collapsed(profiler.profile(1.0))[:2000])
+    worker.join()
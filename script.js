@@ -1753,7 +1753,13 @@ async function endPractice() {
         const scoringSystem = await selectScoringSystem();
         logMessage(`开始使用${scoringSystem.system}系统评估翻译质量`, 'info');
         
-        if (currentMode === 'sentence') {
+        // 备用评分优先交给代理并行计算整篇文章，代理不可用时仍在浏览器中逐句评估
+        const serverEvaluation = scoringSystem.system === 'fallback' ? await evaluateOnServer() : null;
+        
+        if (serverEvaluation) {
+            score = serverEvaluation.score;
+            detailedErrors = serverEvaluation.detailedErrors;
+        } else if (currentMode === 'sentence') {
             // 分句模式：为每个句子生成评分和错误分析
             for (let i = 0; i < sentences.length; i++) {
                 // 更新进度显示
@@ -2605,49 +2611,6 @@ function hideWordCard() {
     wordCard.style.display = 'none';
 }
 
-// 使用Free Dictionary API获取单词信息
-async function fetchWordInfo(word) {
-    try {
-        const response = await fetch(`https://api.dictionaryapi.dev/api/v2/entries/en/${word}`);
-        if (!response.ok) {
-            throw new Error('单词不存在');
-        }
-        
-        const data = await response.json();
-        const wordInfo = data[0];
-        
-        // 提取单词信息
-        const phonetic = wordInfo.phonetics?.[0]?.text || '';
-        const meanings = wordInfo.meanings.map(meaning => {
-            return {
-                partOfSpeech: meaning.partOfSpeech,
-                definitions: meaning.definitions.map(def => ({
-                    definition: def.definition,
-                    example: def.example || ''
-                }))
-            };
-        });
-        
-        return {
-            word: wordInfo.word,
-            phonetic,
-            meanings,
-            addedAt: new Date().toISOString(),
-            frequency: 1
-        };
-    } catch (error) {
-        console.error('获取单词信息失败:', error);
-        // 如果API调用失败，返回基本的单词信息
-        return {
-            word,
-            phonetic: '',
-            meanings: [{ partOfSpeech: 'unknown', definitions: [{ definition: '', example: '' }] }],
-            addedAt: new Date().toISOString(),
-            frequency: 1
-        };
-    }
-}
-
 // 添加单词到单词本
 async function addWordToWordbook() {
     if (!selectedWordData) return;
@@ -2835,6 +2798,8 @@ function loadApiKey() {
 }
 
 // 调用DeepSeek API进行翻译质量评估
+// 默认由浏览器直接调用 DeepSeek；config.js 中 USE_LLM_RELAY 为 true 时经代理的 /llm/evaluate 中转：
+// 提示词由代理生成，相同译文的评估结果在代理端缓存，生成中的内容以事件流返回
 async function evaluateTranslationWithDeepSeek(chineseText, translation) {
     const apiKey = sessionStorage.getItem('deepseek_api_key');
     if (!apiKey) {
@@ -2842,135 +2807,32 @@ async function evaluateTranslationWithDeepSeek(chineseText, translation) {
         throw new Error('DeepSeek API密钥未配置');
     }
 
-    const apiUrl = 'https://api.deepseek.com/v1/chat/completions';
-    
-    // 设计提示词让DeepSeek评估翻译质量
-    const prompt = `请作为一名专业的英语翻译评估专家，评估以下中文到英文的翻译质量：
-
-中文原文：${chineseText}
-
-英文翻译：${translation}
-
-请按照以下格式返回评估结果：
-1. 评分（0-100分）：[具体分数]
-2. 总体评价：[简要评价翻译质量]
-3. 错误分析：[列出具体错误，包括错误类型（语法错误、拼写错误、用词不当等）、位置和详细说明]
-
-请确保错误分析准确且具体，能够帮助用户改进翻译质量。`;
+    const relayUrl = getLlmRelayUrl();
+    if (relayUrl) {
+        updateLoadingPreview('');
+    }
 
     try {
         logMessage('发送DeepSeek API请求评估翻译质量', 'info');
         
-        // 创建AbortController用于设置超时
+        // 创建AbortController用于设置超时，中转时超时覆盖整个事件流的读取
         const controller = new AbortController();
-        const timeoutId = setTimeout(() => controller.abort(), 30000); // 30秒超时
-        
-        const response = await fetch(apiUrl, {
-            method: 'POST',
-            headers: {
-                'Authorization': `Bearer ${apiKey}`,
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                model: 'deepseek-chat',
-                messages: [
-                    {
-                        role: 'user',
-                        content: prompt
-                    }
-                ],
-                max_tokens: 1000,
-                temperature: 0.3
-            }),
-            signal: controller.signal // 传递信号
-        });
+        const timeoutId = setTimeout(() => controller.abort(), relayUrl ? 60000 : 30000);
         
-        // 清除超时定时器
-        clearTimeout(timeoutId);
-
-        if (!response.ok) {
-            let errorMessage = `DeepSeek API请求失败: ${response.status} ${response.statusText}`;
-            
-            // 尝试获取更详细的错误信息
-            let detailedError = '';
-            try {
-                const errorData = await response.json();
-                if (errorData.error) {
-                    detailedError = typeof errorData.error === 'string' ? errorData.error : 
-                                    (errorData.error.message || JSON.stringify(errorData.error));
-                    if (detailedError) {
-                        errorMessage += ` - ${detailedError}`;
-                    }
-                } else if (errorData.message) {
-                    errorMessage += ` - ${errorData.message}`;
-                }
-            } catch (e) {
-                // 如果无法解析JSON错误响应，尝试获取文本响应
-                try {
-                    const textError = await response.text();
-                    if (textError) {
-                        errorMessage += ` - ${textError}`;
-                    }
-                } catch (textError) {
-                    // 如果无法获取任何错误信息，继续使用基本错误信息
-                }
-            }
-            
-            logMessage(errorMessage, 'error');
-            
-            if (response.status === 401) {
-                throw new Error('DeepSeek API密钥无效，请检查并重新配置');
-            } else if (response.status === 403) {
-                throw new Error('DeepSeek API权限不足，请检查密钥权限');
-            } else if (response.status === 429) {
-                throw new Error('DeepSeek API请求频率过高，请稍后再试或升级套餐');
-            } else if (response.status === 404) {
-                throw new Error('DeepSeek API端点不存在，请检查API URL配置');
-            } else if (response.status >= 500) {
-                throw new Error('DeepSeek API服务器错误，请稍后再试');
-            } else {
-                throw new Error(errorMessage);
-            }
-        }
-
-        // 检查响应类型
-        const contentType = response.headers.get('content-type');
-        if (!contentType || !contentType.includes('application/json')) {
-            const textResponse = await response.text();
-            logMessage(`DeepSeek API返回非JSON响应: ${textResponse}`, 'error');
-            throw new Error('DeepSeek API返回格式错误，预期JSON格式');
-        }
-
-        const data = await response.json();
-        
-        // 更严格的API响应格式检查
-        if (!data || typeof data !== 'object') {
-            logMessage(`DeepSeek API返回格式错误: ${JSON.stringify(data)}`, 'error');
-            throw new Error('DeepSeek API返回格式错误，响应不是有效的JSON对象');
-        }
-
-        if (!Array.isArray(data.choices) || data.choices.length === 0) {
-            logMessage(`DeepSeek API返回格式错误: ${JSON.stringify(data)}`, 'error');
-            throw new Error('DeepSeek API返回格式错误，缺少必要的choices数组或数组为空');
-        }
-
-        const firstChoice = data.choices[0];
-        if (!firstChoice || typeof firstChoice !== 'object') {
-            logMessage(`DeepSeek API返回格式错误: ${JSON.stringify(data)}`, 'error');
-            throw new Error('DeepSeek API返回格式错误，第一个choice不是有效的对象');
-        }
-
-        if (!firstChoice.message || typeof firstChoice.message !== 'object') {
-            logMessage(`DeepSeek API返回格式错误: ${JSON.stringify(data)}`, 'error');
-            throw new Error('DeepSeek API返回格式错误，缺少必要的message对象');
+        let responseContent;
+        try {
+            responseContent = relayUrl ?
+                await requestDeepSeekViaRelay(relayUrl, apiKey, chineseText, translation, controller.signal) :
+                await requestDeepSeekDirect(apiKey, chineseText, translation, controller.signal);
+        } finally {
+            // 清除超时定时器
+            clearTimeout(timeoutId);
         }
 
-        if (typeof firstChoice.message.content !== 'string' || !firstChoice.message.content.trim()) {
-            logMessage(`DeepSeek API返回格式错误: ${JSON.stringify(data)}`, 'error');
-            throw new Error('DeepSeek API返回格式错误，message.content不是有效的非空字符串');
+        if (typeof responseContent !== 'string' || !responseContent.trim()) {
+            throw new Error('DeepSeek API返回格式错误，评估内容为空');
         }
 
-        const responseContent = firstChoice.message.content;
         logMessage('DeepSeek API请求成功，开始解析响应', 'info');
         
         // 解析API响应
@@ -2997,6 +2859,225 @@ async function evaluateTranslationWithDeepSeek(chineseText, translation) {
     }
 }
 
+// 配置了中转且代理地址是 HTTPS 或本机时返回代理地址，否则返回 null；
+// 用户的 DeepSeek 密钥不会以明文发往其他主机
+function getLlmRelayUrl() {
+    if (!window.API_CONFIG?.USE_LLM_RELAY) {
+        return null;
+    }
+    const proxyUrl = window.API_CONFIG.API_BASE_URL || 'http://localhost:8002';
+    let url;
+    try {
+        url = new URL(proxyUrl);
+    } catch (e) {
+        return null;
+    }
+    if (url.protocol !== 'https:' && !['localhost', '127.0.0.1', '[::1]'].includes(url.hostname)) {
+        logMessage('DeepSeek评估中转地址不是HTTPS，改为直接调用DeepSeek', 'warning');
+        return null;
+    }
+    return proxyUrl;
+}
+
+// 按状态码把 DeepSeek（或中转）的错误响应转换为提示信息
+async function deepSeekResponseError(response) {
+    let errorMessage = `DeepSeek API请求失败: ${response.status} ${response.statusText}`;
+    
+    // 尝试获取更详细的错误信息
+    try {
+        const errorData = await response.json();
+        if (errorData.error) {
+            const detailedError = typeof errorData.error === 'string' ? errorData.error :
+                                  (errorData.error.message || JSON.stringify(errorData.error));
+            if (detailedError) {
+                errorMessage += ` - ${detailedError}`;
+            }
+        } else if (errorData.message) {
+            errorMessage += ` - ${errorData.message}`;
+        }
+    } catch (e) {
+        // 如果无法解析JSON错误响应，继续使用基本错误信息
+    }
+    
+    logMessage(errorMessage, 'error');
+    
+    if (response.status === 401) {
+        return new Error('DeepSeek API密钥无效，请检查并重新配置');
+    } else if (response.status === 403) {
+        return new Error('DeepSeek API权限不足，请检查密钥权限');
+    } else if (response.status === 429) {
+        return new Error('DeepSeek API请求频率过高，请稍后再试或升级套餐');
+    } else if (response.status === 404) {
+        return new Error('DeepSeek API端点不存在，请检查API URL配置');
+    } else if (response.status >= 500) {
+        return new Error('DeepSeek API服务器错误，请稍后再试');
+    }
+    return new Error(errorMessage);
+}
+
+// 浏览器直接调用 DeepSeek，返回评估文本
+async function requestDeepSeekDirect(apiKey, chineseText, translation, signal) {
+    const apiUrl = 'https://api.deepseek.com/v1/chat/completions';
+    
+    // 设计提示词让DeepSeek评估翻译质量
+    const prompt = `请作为一名专业的英语翻译评估专家，评估以下中文到英文的翻译质量：
+
+中文原文：${chineseText}
+
+英文翻译：${translation}
+
+请按照以下格式返回评估结果：
+1. 评分（0-100分）：[具体分数]
+2. 总体评价：[简要评价翻译质量]
+3. 错误分析：[列出具体错误，包括错误类型（语法错误、拼写错误、用词不当等）、位置和详细说明]
+
+请确保错误分析准确且具体，能够帮助用户改进翻译质量。`;
+
+    const response = await fetch(apiUrl, {
+        method: 'POST',
+        headers: {
+            'Authorization': `Bearer ${apiKey}`,
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            model: 'deepseek-chat',
+            messages: [
+                {
+                    role: 'user',
+                    content: prompt
+                }
+            ],
+            max_tokens: 1000,
+            temperature: 0.3
+        }),
+        signal: signal // 传递信号
+    });
+
+    if (!response.ok) {
+        throw await deepSeekResponseError(response);
+    }
+
+    // 检查响应类型
+    const contentType = response.headers.get('content-type');
+    if (!contentType || !contentType.includes('application/json')) {
+        const textResponse = await response.text();
+        logMessage(`DeepSeek API返回非JSON响应: ${textResponse}`, 'error');
+        throw new Error('DeepSeek API返回格式错误，预期JSON格式');
+    }
+
+    const data = await response.json();
+    
+    // 更严格的API响应格式检查
+    if (!data || typeof data !== 'object') {
+        logMessage(`DeepSeek API返回格式错误: ${JSON.stringify(data)}`, 'error');
+        throw new Error('DeepSeek API返回格式错误，响应不是有效的JSON对象');
+    }
+
+    if (!Array.isArray(data.choices) || data.choices.length === 0) {
+        logMessage(`DeepSeek API返回格式错误: ${JSON.stringify(data)}`, 'error');
+        throw new Error('DeepSeek API返回格式错误，缺少必要的choices数组或数组为空');
+    }
+
+    const firstChoice = data.choices[0];
+    if (!firstChoice || typeof firstChoice !== 'object') {
+        logMessage(`DeepSeek API返回格式错误: ${JSON.stringify(data)}`, 'error');
+        throw new Error('DeepSeek API返回格式错误，第一个choice不是有效的对象');
+    }
+
+    if (!firstChoice.message || typeof firstChoice.message !== 'object') {
+        logMessage(`DeepSeek API返回格式错误: ${JSON.stringify(data)}`, 'error');
+        throw new Error('DeepSeek API返回格式错误，缺少必要的message对象');
+    }
+
+    if (typeof firstChoice.message.content !== 'string' || !firstChoice.message.content.trim()) {
+        logMessage(`DeepSeek API返回格式错误: ${JSON.stringify(data)}`, 'error');
+        throw new Error('DeepSeek API返回格式错误，message.content不是有效的非空字符串');
+    }
+
+    return firstChoice.message.content;
+}
+
+// 经代理的 /llm/evaluate 中转，边接收边显示生成的内容，返回评估文本
+async function requestDeepSeekViaRelay(proxyUrl, apiKey, chineseText, translation, signal) {
+    const response = await fetch(`${proxyUrl}/llm/evaluate`, {
+        method: 'POST',
+        headers: {
+            'X-LLM-Key': apiKey,
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            chinese: chineseText,
+            translation: translation
+        }),
+        signal: signal // 传递信号
+    });
+
+    if (!response.ok) {
+        throw await deepSeekResponseError(response);
+    }
+
+    return await readEvaluationStream(response);
+}
+
+// 读取代理转发的评估事件流，边接收边在加载提示中显示已生成的内容，返回完整的评估文本
+async function readEvaluationStream(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let content = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+        
+        // 事件之间以空行分隔，每个事件包含一行 event 和一行 data
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            const eventMatch = block.match(/^event: (.*)$/m);
+            const dataMatch = block.match(/^data: (.*)$/m);
+            if (!eventMatch || !dataMatch) {
+                continue;
+            }
+            const data = JSON.parse(dataMatch[1]);
+            
+            if (eventMatch[1] === 'delta') {
+                content += data.content;
+                updateLoadingPreview(content);
+            } else if (eventMatch[1] === 'done') {
+                if (data.cached) {
+                    logMessage('DeepSeek评估结果来自代理缓存', 'info');
+                }
+                return data.content;
+            } else if (eventMatch[1] === 'error') {
+                logMessage(`DeepSeek评估中途失败: ${data.error}`, 'error');
+                throw new Error(`DeepSeek API评估中途失败: ${data.error}`);
+            }
+        }
+    }
+    
+    throw new Error('DeepSeek API评估结果不完整，连接意外结束');
+}
+
+// 在加载提示中显示流式评估最新生成的一行，内容为空时恢复默认提示
+function updateLoadingPreview(content) {
+    const loadingMessage = document.getElementById('loading-message');
+    if (!loadingMessage) {
+        return;
+    }
+    const lines = content.trim().split('\n');
+    const line = lines[lines.length - 1].trim();
+    if (!line) {
+        loadingMessage.textContent = '正在评估，请稍候...';
+    } else {
+        loadingMessage.textContent = line.length > 60 ? line.slice(0, 60) + '…' : line;
+    }
+}
+
 // 验证DeepSeek API密钥有效性
 async function validateDeepSeekApiKey(apiKey) {
     if (!apiKey) {
@@ -3139,6 +3220,31 @@ function showUserMessage(message) {
     }, 3000);
 }
 
+// 调用代理的评估接口，一次提交所有句对；失败时返回 null
+async function evaluateOnServer() {
+    const proxyUrl = window.API_CONFIG?.API_BASE_URL || 'http://localhost:8002';
+    const pairs = currentMode === 'sentence'
+        ? sentences.map((chinese, index) => ({ chinese, translation: userTranslations[index] || '' }))
+        : [{ chinese: passages[currentPassageIndex], translation: userTranslations[0] || '' }];
+    
+    try {
+        const response = await fetch(`${proxyUrl}/evaluate`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ mode: currentMode === 'sentence' ? 'sentence' : 'passage', pairs })
+        });
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const result = await response.json();
+        logMessage(`代理评估完成：${result.stats.evaluated}句，耗时${result.stats.elapsed_ms}ms`, 'info');
+        return result;
+    } catch (error) {
+        logMessage(`代理评估不可用，改用浏览器评分: ${error.message}`, 'warning');
+        return null;
+    }
+}
+
 // 备用AI评分系统
 function evaluateTranslationWithFallback(chineseText, translation) {
     logMessage('使用备用评分系统评估翻译', 'info');
@@ -3,65 +3,99 @@
 
 import hashlib
 import hmac
-import json
+import json_codec
 import time
 import sys
 import os
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import BaseHTTPRequestHandler
 import urllib.request
 import urllib.error
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.backends import default_backend
+from urllib.parse import parse_qs
 import base64
-import secrets
+import threading
 import logging
-from typing import Tuple, Optional
-from key_manager import KeyManager, EnvironmentKeyManager
+from typing import Optional
+from key_manager import EnvironmentKeyManager
+from request_body import read_request_body, RequestBodyError
+from translation_cache import TranslationCache, CachedResponse
+from translation_jobs import TranslationJobQueue, JobQueueFullError, parse_job_request, get_max_document_size
+from cache_prewarm import CachePrewarmer, parse_prewarm_args
+from request_tracing import RequestTracer, current_trace, span
+from admin_auth import is_admin_request
+from sampling_profiler import run_profile_request
+from server_lifecycle import DrainingHTTPServer, GracefulShutdown
+from health_checks import ReadinessCheck, UpstreamProbe
+from client_quotas import FairScheduler, ThrottledError
+from usage_accounting import UsageTracker, BudgetExhaustedError, parse_usage_days
+from upstream_regions import RegionRouter, UpstreamError
+from request_deadline import DeadlineExceededError, parse_deadline
+from translation_batching import MicroBatcher
+from translation_memory import TranslationMemory, client_match
+from offline_dictionary import OfflineDictionary, dictionary_response
+from translation_evaluation import TranslationEvaluator, parse_evaluation_request
+from llm_evaluation import LLMEvaluationRelay, LLMRelayError, client_api_key, parse_llm_request
+from multiplex_channel import MultiplexChannel, websocket_handshake
+from replay_protection import ReplayGuard, ReplayError, associated_data, request_stamp
 
 sys.stdout.reconfigure(line_buffering=True)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/security.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+def configure_logging():
+    # 先确保日志目录存在，再挂文件处理器
+    os.makedirs('logs', exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('logs/security.log', encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
 DEBUG_FILE = 'debug.log'
 
 def debug_log(message):
-    with open(DEBUG_FILE, 'a', encoding='utf-8') as f:
-        f.write(message + '\n')
-    logger.debug(message)
+    with span('debug_log'):
+        with open(DEBUG_FILE, 'a', encoding='utf-8') as f:
+            f.write(message + '\n')
+        logger.debug(message)
 
 class ServerEncryptionManager:
-    def __init__(self, key_manager: KeyManager):
-        self.key_manager = key_manager
-        self.backend = default_backend()
+    def __init__(self, env_key_manager: EnvironmentKeyManager):
+        self.env_key_manager = env_key_manager
         self.encryption_key = None
+        self._aesgcm = None
+        self.replay_guard = ReplayGuard()
         self._load_encryption_key()
     
     def _load_encryption_key(self):
         try:
-            env_key_manager = EnvironmentKeyManager()
-            self.encryption_key = env_key_manager.get_encryption_key()
+            self.encryption_key = self.env_key_manager.get_encryption_key()
             logger.info("加密密钥加载成功")
         except Exception as e:
             logger.warning(f"无法从环境变量加载加密密钥: {e}, 生成新密钥")
-            self.encryption_key = self.key_manager.generate_key()
+            self.encryption_key = self.env_key_manager.key_manager.generate_key()
             logger.info("已生成新的加密密钥")
     
+    @property
+    def aesgcm(self):
+        # cryptography 在第一次加解密时才导入，密钥不变所以实例可以复用
+        if self._aesgcm is None:
+            from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+            self._aesgcm = AESGCM(self.encryption_key)
+        return self._aesgcm
+    
+    def preload(self):
+        """在后台线程中提前导入 cryptography，不阻塞服务器开始接受请求"""
+        threading.Thread(target=lambda: self.aesgcm, name='crypto-preload', daemon=True).start()
+    
     def encrypt_data(self, data: str) -> dict:
+        return self.encrypt_bytes(data.encode('utf-8'))
+    
+    def encrypt_bytes(self, data_bytes: bytes) -> dict:
         iv = os.urandom(12)
-        aesgcm = AESGCM(self.encryption_key)
-        
-        data_bytes = data.encode('utf-8')
-        encrypted = aesgcm.encrypt(iv, data_bytes, None)
+        encrypted = self.aesgcm.encrypt(iv, data_bytes, None)
         
         return {
             'iv': base64.b64encode(iv).decode('utf-8'),
@@ -69,30 +103,45 @@ class ServerEncryptionManager:
         }
     
     def decrypt_data(self, encrypted_data: dict) -> str:
+        return self.decrypt_bytes(encrypted_data).decode('utf-8')
+    
+    def decrypt_bytes(self, encrypted_data: dict, associated: Optional[bytes] = None) -> bytes:
         try:
             iv = base64.b64decode(encrypted_data['iv'])
             encrypted = base64.b64decode(encrypted_data['data'])
             
-            aesgcm = AESGCM(self.encryption_key)
-            decrypted = aesgcm.decrypt(iv, encrypted, None)
-            
-            return decrypted.decode('utf-8')
+            return self.aesgcm.decrypt(iv, encrypted, associated)
         except Exception as e:
             logger.error(f"解密失败: {e}")
             raise ValueError("解密失败，数据可能已损坏")
     
     def encrypt_object(self, obj: dict) -> dict:
-        json_str = json.dumps(obj, ensure_ascii=False)
-        return self.encrypt_data(json_str)
+        with span('encrypt'):
+            return self.encrypt_bytes(json_codec.dumps(obj))
     
-    def decrypt_object(self, encrypted_data: dict) -> dict:
-        json_str = self.decrypt_data(encrypted_data)
-        return json.loads(json_str)
+    def decrypt_object(self, encrypted_data: dict, associated: Optional[bytes] = None) -> dict:
+        with span('decrypt'):
+            return json_codec.loads(self.decrypt_bytes(encrypted_data, associated))
+    
+    def decrypt_request(self, request: dict, headers=None) -> dict:
+        """
+        解密 {"encrypted": true, "timestamp": ..., "nonce": ..., "data": <信封>} 形式的请求：
+        时间戳和随机数作为附加认证数据参与解密，解密成功后按信封的 IV 检查重放
+        """
+        envelope = request.get('data') or {}
+        timestamp, nonce = request_stamp(request, headers)
+        if timestamp is None:
+            self.replay_guard.require_stamp()
+            return self.decrypt_object(envelope)
+        issued = self.replay_guard.check_window(timestamp)
+        payload = self.decrypt_object(envelope, associated_data(timestamp, nonce))
+        self.replay_guard.remember(envelope.get('iv', ''), issued)
+        return payload
 
 class SecureTencentTranslationProxy:
-    def __init__(self, encryption_manager: ServerEncryptionManager):
+    def __init__(self, encryption_manager: ServerEncryptionManager, env_key_manager: EnvironmentKeyManager):
         self.encryption_manager = encryption_manager
-        self.env_key_manager = EnvironmentKeyManager()
+        self.env_key_manager = env_key_manager
         
         try:
             self.secret_id, self.secret_key = self.env_key_manager.get_tencent_credentials()
@@ -101,11 +150,20 @@ class SecureTencentTranslationProxy:
             logger.error(f"腾讯API凭证加载失败: {e}")
             raise
         
-        self.endpoint = 'tmt.tencentcloudapi.com'
         self.service = 'tmt'
         self.version = '2018-03-21'
-        self.region = 'ap-guangzhou'
         self.action = 'TextTranslate'
+        self.cache = TranslationCache()
+        self.scheduler = FairScheduler.from_env()
+        self.usage = UsageTracker.from_env()
+        self.router = RegionRouter.from_env()
+        self.batcher = MicroBatcher(self._call_upstream)
+        self.cache.refresher = self._translate_upstream
+        self.memory = TranslationMemory()
+        self.dictionary = OfflineDictionary()
+        self.evaluator = TranslationEvaluator()
+        self.llm = LLMEvaluationRelay()
+        self.channel = MultiplexChannel(self)
     
     def sha256_hex(self, s):
         if isinstance(s, bytes):
@@ -137,16 +195,16 @@ class SecureTencentTranslationProxy:
             else:
                 return hmac.new(key.encode('utf-8'), msg.encode('utf-8'), hashlib.sha256).hexdigest()
     
-    def generate_signature(self, payload):
+    def generate_signature(self, payload_bytes, host='tmt.tencentcloudapi.com'):
         timestamp = int(time.time())
         date = time.strftime('%Y-%m-%d', time.gmtime(timestamp))
         
         http_request_method = 'POST'
         canonical_uri = '/'
         canonical_query_string = ''
-        canonical_headers = 'content-type:application/json\nhost:tmt.tencentcloudapi.com\n'
+        canonical_headers = 'content-type:application/json\nhost:' + host + '\n'
         signed_headers = 'content-type;host'
-        hashed_request_payload = self.sha256_hex(json.dumps(payload, separators=(',', ':')))
+        hashed_request_payload = self.sha256_hex(payload_bytes)
         
         canonical_request = (http_request_method + '\n' +
                             canonical_uri + '\n' +
@@ -186,68 +244,181 @@ class SecureTencentTranslationProxy:
         
         return authorization, timestamp
     
-    def translate(self, text, source='en', target='zh'):
-        try:
-            logger.info(f'开始翻译: text={text[:50]}..., source={source}, target={target}')
-            authorization, timestamp = self.generate_signature({
-                'SourceText': text,
+    def _post(self, endpoint, payload_bytes, timeout, action=None):
+        """向一个区域发送已序列化的请求体，由 RegionRouter 在工作线程中调用"""
+        authorization, timestamp = self.generate_signature(payload_bytes, endpoint.host)
+        headers = {
+            'Authorization': authorization,
+            'Content-Type': 'application/json',
+            'Host': endpoint.host,
+            'X-TC-Action': action or self.action,
+            'X-TC-Timestamp': str(timestamp),
+            'X-TC-Version': self.version,
+            'X-TC-Region': endpoint.region
+        }
+        
+        debug_log(f'发送请求到: {endpoint.url}')
+        debug_log(f'请求头: {headers}')
+        debug_log(f'请求体: {payload_bytes.decode("utf-8")}')
+        
+        req = urllib.request.Request(endpoint.url, data=payload_bytes, headers=headers)
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.read()
+    
+    def _call_upstream(self, texts, source, target, deadline=None):
+        """
+        发送一次上游请求，由 MicroBatcher 调用；多条文本使用 TextTranslateBatch
+        返回 (译文列表, 区域, 发出的请求数)
+        """
+        batch = len(texts) > 1
+        if batch:
+            payload = {
+                'SourceTextList': texts,
                 'Source': source,
                 'Target': target,
                 'ProjectId': 0
-            })
-            
-            url = 'https://' + self.endpoint + '/'
-            headers = {
-                'Authorization': authorization,
-                'Content-Type': 'application/json',
-                'Host': self.endpoint,
-                'X-TC-Action': self.action,
-                'X-TC-Timestamp': str(timestamp),
-                'X-TC-Version': self.version,
-                'X-TC-Region': self.region
             }
-            
+        else:
             payload = {
-                'SourceText': text,
+                'SourceText': texts[0],
                 'Source': source,
                 'Target': target,
                 'ProjectId': 0
             }
-            
-            debug_log(f'发送请求到: {url}')
-            debug_log(f'请求头: {headers}')
-            debug_log(f'请求体: {json.dumps(payload)}')
-            
-            req = urllib.request.Request(url, data=json.dumps(payload, separators=(',', ':')).encode('utf-8'), headers=headers)
-            
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode('utf-8'))
-                debug_log(f'响应数据: {data}')
-                
-                if 'Response' in data and 'Error' in data['Response']:
-                    error_msg = data['Response']['Error'].get('Message', '翻译失败')
-                    logger.error(f'翻译API错误: {error_msg}')
-                    raise Exception(error_msg)
-                
-                if 'Response' in data and 'TargetText' in data['Response']:
-                    result = data['Response']['TargetText']
-                    logger.info(f'翻译成功: {result[:50]}...')
-                    return result
-                
-                raise Exception('翻译响应格式错误')
-                
+        # 签名和发送使用同一份序列化结果，保证哈希与请求体一致
+        payload_bytes = json_codec.dumps(payload)
+        action = 'TextTranslateBatch' if batch else self.action
+        
+        try:
+            raw_response, endpoint, sent = self.router.call(
+                lambda endpoint, timeout: self._post(endpoint, payload_bytes, timeout, action),
+                hedge=self.router.should_hedge(''.join(texts)), deadline=deadline)
         except urllib.error.HTTPError as e:
+            # 批内所有请求共用这个异常，响应体只能在这里读取一次
             error_msg = 'HTTP错误: ' + str(e.code)
+            error_code = None
             try:
-                error_data = json.loads(e.read().decode('utf-8'))
+                error_data = json_codec.loads(e.read())
                 debug_log(f'HTTP错误详情: {error_data}')
                 if 'Response' in error_data and 'Error' in error_data['Response']:
                     error_msg = error_data['Response']['Error'].get('Message', error_msg)
+                    error_code = error_data['Response']['Error'].get('Code')
             except:
                 pass
             logger.error(error_msg)
+            if error_code:
+                raise UpstreamError(error_code, error_msg, batch)
             raise Exception(error_msg)
+        
+        data = json_codec.loads(raw_response)
+        debug_log(f'响应数据({endpoint.region}): {data}')
+        
+        if 'Response' in data and 'Error' in data['Response']:
+            error = data['Response']['Error']
+            error_msg = error.get('Message', '翻译失败')
+            logger.error(f'翻译API错误: {error_msg}')
+            raise UpstreamError(error.get('Code', ''), error_msg, batch)
+        
+        if batch and 'Response' in data and 'TargetTextList' in data['Response']:
+            results = data['Response']['TargetTextList']
+            if len(results) == len(texts):
+                return results, endpoint, sent
+        if not batch and 'Response' in data and 'TargetText' in data['Response']:
+            return [data['Response']['TargetText']], endpoint, sent
+        
+        raise Exception('翻译响应格式错误')
+    
+    def _stale_fallback(self, text, source, target, error):
+        """截止时间已到：有过期缓存时返回过期结果，否则抛出原来的 DeadlineExceededError"""
+        trace = current_trace()
+        if trace is not None:
+            trace.deadline_missed = True
+        stale = self.cache.get_stale(text, source, target)
+        if stale is None:
+            logger.warning(f'翻译超时且没有可用缓存: text={text[:50]}')
+            raise error
+        if trace is not None:
+            trace.served_stale = True
+        logger.warning(f'翻译超时，返回过期缓存: text={text[:50]}')
+        return stale
+    
+    def cached_response(self, text, source='en', target='zh', client=None):
+        """精确缓存命中时返回预先序列化的响应，记账与 translate 的命中路径相同；未命中返回 None，调用方再走 translate"""
+        with span('cache'):
+            response = self.cache.get_response(text, source, target)
+        if response is None:
+            return None
+        self.scheduler.note_request(client)
+        logger.info(f'缓存命中: text={text[:50]}..., source={source}, target={target}')
+        self.usage.record_cached(source, target, len(text))
+        return response
+    
+    def translate(self, text, source='en', target='zh', client=None, deadline=None):
+        self.scheduler.note_request(client)
+        with span('cache'):
+            cached = self.cache.get(text, source, target)
+            negative = self.cache.get_error(text, source, target) if cached is None else None
+        if cached is not None:
+            logger.info(f'缓存命中: text={text[:50]}..., source={source}, target={target}')
+            self.usage.record_cached(source, target, len(text))
+            return cached
+        if negative is not None:
+            logger.info(f'命中错误缓存: text={text[:50]}..., code={negative[0]}')
+            raise UpstreamError(*negative)
+        
+        with span('memory'):
+            fuzzy = self.memory.lookup(text, source, target)
+        if fuzzy is not None:
+            reuse = self.memory.mode == 'reuse'
+            trace = current_trace()
+            if trace is not None:
+                trace.fuzzy_match = dict(fuzzy, reused=reuse)
+            if reuse:
+                # 复用的译文不写入精确缓存，原句再次出现时仍以自己的译文为准
+                logger.info(f'翻译记忆命中: text={text[:50]}..., similarity={fuzzy["similarity"]}')
+                self.usage.record_cached(source, target, len(text))
+                return fuzzy['result']
+        
+        return self._translate_upstream(text, source, target, client, deadline)
+    
+    def _translate_upstream(self, text, source, target, client=None, deadline=None):
+        """调用上游并写入缓存；缓存后台刷新也从这里进入，此时 client 为 None，记在 jobs 名下"""
+        self.usage.check_budget(len(text))
+        try:
+            with span('queue'):
+                admitted = self.scheduler.admit(client, len(text), deadline)
+        except DeadlineExceededError as e:
+            return self._stale_fallback(text, source, target, e)
+        try:
+            logger.info(f'开始翻译: text={text[:50]}..., source={source}, target={target}')
+            with span('upstream'):
+                # 上游调用名额只由批的发起者排队占用，加入别人批次的请求不再排队
+                result, endpoint, sent = self.batcher.submit(
+                    text, source, target, deadline,
+                    lambda: self.scheduler.acquire_slot(admitted, deadline), self.scheduler.release)
+            
+            logger.info(f'翻译成功: {result[:50]}...')
+            # 对冲请求同样计费
+            self.usage.record_upstream(source, target, len(text), calls=sent)
+            self.cache.set(text, source, target, result)
+            self.memory.add(text, source, target, result)
+            return result
+            
+        except DeadlineExceededError as e:
+            # 已发出的请求仍可能被上游计费，这里按失败调用记录
+            self.usage.record_upstream(source, target, len(text), ok=False)
+            return self._stale_fallback(text, source, target, e)
+        except ThrottledError:
+            # 批的发起者排队超时，没有发出上游请求
+            raise
+        except UpstreamError as e:
+            self.usage.record_upstream(source, target, len(text), ok=False)
+            # 合并调用的错误可能只由批内某一条文本引起，不能记到其他文本名下
+            if e.deterministic and not e.batch:
+                self.cache.set_error(text, source, target, e.code, e.message)
+            raise
         except Exception as e:
+            self.usage.record_upstream(source, target, len(text), ok=False)
             debug_log(f'翻译异常: {str(e)}')
             logger.error(f'翻译异常: {str(e)}')
             import traceback
@@ -257,17 +428,145 @@ class SecureTencentTranslationProxy:
 class SecureTranslationRequestHandler(BaseHTTPRequestHandler):
     encryption_manager = None
     proxy = None
+    job_queue = None
+    prewarmer = None
+    upstream_probe = None
+    readiness = None
+    tracer = RequestTracer()
     
     @classmethod
     def initialize(cls):
-        key_manager = KeyManager()
-        cls.encryption_manager = ServerEncryptionManager(key_manager)
-        cls.proxy = SecureTencentTranslationProxy(cls.encryption_manager)
+        env_key_manager = EnvironmentKeyManager()
+        cls.encryption_manager = ServerEncryptionManager(env_key_manager)
+        cls.proxy = SecureTencentTranslationProxy(cls.encryption_manager, env_key_manager)
+        cls.job_queue = TranslationJobQueue.from_env(cls.proxy.translate, cls.proxy.cache.contains)
+        cls.job_queue.start()
+        cls.proxy.usage.start()
+        cls.upstream_probe = UpstreamProbe(cls.proxy.router.endpoints[0].url)
+        cls.readiness = ReadinessCheck(cls.proxy.cache, cls.job_queue, cls.upstream_probe)
+    
+    cors_headers = (
+        ('Access-Control-Allow-Origin', '*'),
+        ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+        ('Access-Control-Allow-Headers', 'Content-Type, X-Encrypted, X-Timestamp, X-Nonce, X-Client-Token, X-Deadline-Ms, X-LLM-Key, If-None-Match'),
+        ('Access-Control-Expose-Headers', 'X-Request-ID, Retry-After, ETag'),
+    )
+    cors_header_bytes = ''.join(f'{name}: {value}\r\n' for name, value in cors_headers).encode('ascii')
     
     def _set_cors_headers(self):
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Encrypted, X-Timestamp, X-Nonce')
+        for name, value in self.cors_headers:
+            self.send_header(name, value)
+    
+    def end_headers(self):
+        trace = current_trace()
+        if trace is not None:
+            self.send_header('X-Request-ID', trace.request_id)
+        super().end_headers()
+    
+    def log_request(self, code='-', size='-'):
+        trace = current_trace()
+        if trace is not None:
+            trace.status = int(code) if isinstance(code, int) else code
+    
+    def _send_json(self, status, data, headers=None):
+        body = json_codec.dumps(data)
+        self.send_response(status)
+        self._set_cors_headers()
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_payload(self, status, data, is_encrypted):
+        if is_encrypted:
+            data = {'encrypted': True, 'data': self.encryption_manager.encrypt_object(data)}
+        self._send_json(status, data)
+    
+    def _send_cached(self, response):
+        """
+        写出预先序列化的翻译响应：状态行、响应头和响应体拼好后一次写出，不经过 send_header 和 JSON 序列化；
+        GET/HEAD 请求的 If-None-Match 与 ETag 相同时返回不带响应体的304，POST 忽略该请求头
+        """
+        if self.command in ('GET', 'HEAD') and response.matches(self.headers.get('If-None-Match')):
+            status, head, body = 304, b'ETag: ' + response.etag.encode('ascii') + b'\r\n', b''
+        else:
+            status, head, body = 200, response.header, response.body
+        self.log_request(status)
+        trace = current_trace()
+        request_id = b'X-Request-ID: ' + trace.request_id.encode('ascii') + b'\r\n' if trace is not None else b''
+        self.wfile.write(b''.join((
+            self.protocol_version.encode('ascii'), b' 200 OK\r\n' if status == 200 else b' 304 Not Modified\r\n',
+            b'Server: ', self.version_string().encode('ascii'), b'\r\nDate: ',
+            self.date_time_string().encode('ascii'), b'\r\n', self.cors_header_bytes, head, request_id,
+            b'\r\n', body)))
+    
+    def _send_translation(self, text, source, target, deadline, is_encrypted=False):
+        client = self.proxy.scheduler.identify(self)
+        if not is_encrypted:
+            # 加密响应每次都要用新的 IV 重新加密，只有明文响应能直接复用缓存里的字节
+            cached = self.proxy.cached_response(text, source, target, client)
+            if cached is not None:
+                self._send_cached(cached)
+                return
+        
+        with span('translate'):
+            result = self.proxy.translate(text, source, target, client, deadline)
+        
+        response = {'result': result}
+        if current_trace().served_stale:
+            response['stale'] = True
+        if current_trace().fuzzy_match is not None:
+            response['fuzzy'] = client_match(current_trace().fuzzy_match)
+        if len(response) == 1 and not is_encrypted:
+            # 普通结果同样带 ETag，浏览器下次可以直接重新验证
+            self._send_cached(CachedResponse(result))
+        else:
+            self._send_payload(200, response, is_encrypted)
+    
+    def _send_translate_error(self, e):
+        if isinstance(e, ReplayError):
+            logger.warning(f'拒绝加密请求: {e}')
+            self._send_json(401, {'error': str(e), 'replay_rejected': True})
+        elif isinstance(e, ThrottledError):
+            logger.warning(f'请求被限流: {e}')
+            self._send_json(429, {'error': str(e)}, {'Retry-After': str(max(1, round(e.retry_after)))})
+        elif isinstance(e, BudgetExhaustedError):
+            self._send_json(503, {'error': str(e), 'cache_only': True})
+        elif isinstance(e, DeadlineExceededError):
+            self._send_json(504, {'error': str(e), 'deadline_exceeded': True})
+        elif isinstance(e, UpstreamError):
+            if e.deterministic:
+                self._send_json(400, {'error': e.message, 'code': e.code})
+            else:
+                self._send_json(500, {'error': e.message})
+        else:
+            logger.error('翻译错误: ' + str(e))
+            import traceback
+            traceback.print_exc()
+            self._send_json(500, {'error': str(e)})
+    
+    def _handle_translate_get(self):
+        """GET /translate?text=...&source=...&target=...，仅限明文，不需要 CORS 预检，浏览器可以缓存并用 ETag 重新验证"""
+        trace = self.tracer.start(self.command, self.path, self.headers.get('X-Request-ID'))
+        try:
+            params = parse_qs(self.path.split('?', 1)[1] if '?' in self.path else '')
+            text = params.get('text', [''])[0]
+            source = params.get('source', ['en'])[0]
+            target = params.get('target', ['zh'])[0]
+            # 截止时间可以放在查询参数里，避免自定义请求头触发预检
+            deadline = parse_deadline({'X-Deadline-Ms': params.get('deadline_ms', [None])[0] or
+                                       self.headers.get('X-Deadline-Ms')})
+            logger.info("收到普通请求")
+            if not text.strip():
+                self._send_json(400, {'error': '缺少翻译文本'})
+                return
+            self._send_translation(text, source, target, deadline)
+        except Exception as e:
+            self._send_translate_error(e)
+        finally:
+            self.tracer.finish(trace)
     
     def do_OPTIONS(self):
         self.send_response(200)
@@ -275,82 +574,256 @@ class SecureTranslationRequestHandler(BaseHTTPRequestHandler):
         self.end_headers()
     
     def do_GET(self):
-        if self.path == '/health':
-            self.send_response(200)
+        path = self.path.split('?', 1)[0]
+        if path == '/health':
+            if self.server.draining:
+                self._send_json(503, {'status': 'draining', 'encrypted': True})
+            else:
+                self._send_json(200, {'status': 'ok', 'encrypted': True})
+        elif path == '/health/live':
+            self._send_json(200, {'status': 'alive'})
+        elif path == '/health/ready':
+            if self.readiness is None:
+                self._send_json(503, {'status': 'not_ready'})
+            else:
+                ready, report = self.readiness.evaluate(self.server)
+                self._send_json(200 if ready else 503, report)
+        elif path == '/cache/stats':
+            self._send_json(200, {
+                'cache': self.proxy.cache.stats(),
+                'memory': self.proxy.memory.stats(),
+                'dictionary': self.proxy.dictionary.stats(),
+                'prewarm': self.prewarmer.status() if self.prewarmer else None
+            })
+        elif path == '/channel':
+            self._handle_channel()
+        elif path == '/translate':
+            self._handle_translate_get()
+        elif path == '/dictionary':
+            query = self.path.split('?', 1)[1] if '?' in self.path else ''
+            with span('dictionary'):
+                status, data = dictionary_response(self.proxy.dictionary, query)
+            # 词典内容只在重新编译时变化，浏览器可以缓存查询结果
+            self._send_json(status, data, {'Cache-Control': 'public, max-age=86400'} if status == 200 else None)
+        elif path == '/admin/profile':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            query = self.path.split('?', 1)[1] if '?' in self.path else ''
+            status, content_type, body = run_profile_request(query)
+            self.send_response(status)
             self._set_cors_headers()
-            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
             self.end_headers()
-            self.wfile.write(json.dumps({'status': 'ok', 'encrypted': True}).encode('utf-8'))
+            self.wfile.write(body)
+        elif path == '/admin/clients':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            self._send_json(200, self.proxy.scheduler.stats())
+        elif path == '/admin/usage':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            query = self.path.split('?', 1)[1] if '?' in self.path else ''
+            self._send_json(200, self.proxy.usage.report(parse_usage_days(query)))
+        elif path == '/admin/upstreams':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            self._send_json(200, self.proxy.router.stats())
+        elif path == '/admin/batching':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            self._send_json(200, self.proxy.batcher.stats())
+        elif path == '/admin/evaluation':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            self._send_json(200, self.proxy.evaluator.stats())
+        elif path == '/admin/llm':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            self._send_json(200, self.proxy.llm.stats())
+        elif path == '/admin/channel':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            self._send_json(200, self.proxy.channel.stats())
+        elif path == '/admin/replay':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            self._send_json(200, self.encryption_manager.replay_guard.stats())
+        elif path == '/admin/slow-requests':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            self._send_json(200, {
+                'stats': self.tracer.stats(),
+                'requests': self.tracer.recent_slow()
+            })
+        elif path.startswith('/jobs/') and self.job_queue is not None:
+            job = self.job_queue.get(path[len('/jobs/'):])
+            if job is None:
+                self._send_json(404, {'error': '任务不存在'})
+            else:
+                self._send_json(200, job.to_status())
         else:
             self.send_response(404)
             self._set_cors_headers()
             self.end_headers()
     
+    def _handle_job_submit(self, payload, is_encrypted):
+        if self.job_queue is None:
+            self._send_payload(404, {'error': '预翻译任务未启用'}, is_encrypted)
+            return
+        try:
+            text, source, target, mode = parse_job_request(payload)
+            job = self.job_queue.submit_document(text, source, target, mode)
+        except ValueError as e:
+            self._send_payload(400, {'error': str(e)}, is_encrypted)
+            return
+        except JobQueueFullError as e:
+            self._send_payload(503, {'error': str(e)}, is_encrypted)
+            return
+        self._send_payload(202, job.to_status(), is_encrypted)
+    
+    def _handle_evaluate(self, payload, deadline, is_encrypted):
+        try:
+            pairs, mode, auto_reference = parse_evaluation_request(payload)
+        except ValueError as e:
+            self._send_payload(400, {'error': str(e)}, is_encrypted)
+            return
+        reference = None
+        if auto_reference:
+            # 参考译文走普通翻译路径（缓存、配额、微批处理），每次最多 EVALUATION_MAX_REFERENCES 句
+            client = self.proxy.scheduler.identify(self)
+            reference = lambda chinese: self.proxy.translate(chinese, 'zh', 'en', client, deadline)
+        with span('evaluate'):
+            result = self.proxy.evaluator.evaluate(pairs, mode, reference)
+        self._send_payload(200, result, is_encrypted)
+
+    def _handle_llm_evaluate(self, payload, is_encrypted):
+        try:
+            chinese, translation, stream = parse_llm_request(payload)
+            # 事件流无法逐段加密，加密请求总是等待完整结果
+            if is_encrypted or not stream:
+                with span('llm_evaluate'):
+                    result = self.proxy.llm.complete(chinese, translation, client_api_key(self.headers))
+                self._send_payload(200, result, is_encrypted)
+                return
+            # 等到第一个片段再发送响应头，生成前就出错时仍能返回对应的状态码
+            with span('llm_first_chunk'):
+                events = self.proxy.llm.open_stream(chinese, translation, client_api_key(self.headers))
+        except ValueError as e:
+            self._send_payload(400, {'error': str(e)}, is_encrypted)
+            return
+        except LLMRelayError as e:
+            self._send_payload(e.status, {'error': e.message}, is_encrypted)
+            return
+        self.send_response(200)
+        self._set_cors_headers()
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            with span('llm_stream'):
+                for event in events:
+                    self.wfile.write(event)
+                    self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info('LLM评估事件流的客户端已断开')
+
+    def _handle_channel(self):
+        connection = websocket_handshake(self)
+        if connection is None:
+            self._send_json(400, {'error': '需要 WebSocket 升级请求'})
+            return
+        # 连接在这个线程中一直保持到客户端断开；服务器关闭时处理完已收到的请求再断开
+        with self.server.upgraded():
+            self.proxy.channel.serve(connection, self.proxy.scheduler.identify(self), self.tracer,
+                                     lambda: self.server.draining, self.encryption_manager)
+    
     def do_POST(self):
+        trace = self.tracer.start(self.command, self.path, self.headers.get('X-Request-ID'))
+        try:
+            self._handle_post()
+        finally:
+            self.tracer.finish(trace)
+    
+    def _handle_post(self):
+        path = self.path.split('?', 1)[0]
+        # 截止时间从收到请求时算起，读取请求体和解密的时间也计算在内
+        deadline = parse_deadline(self.headers)
+        if path == '/jobs' and not is_admin_request(self):
+            # 预翻译任务消耗上游配额，只允许管理员提交；没有读取请求体，不能复用连接
+            self.close_connection = True
+            self._send_json(403, {'error': '无权访问'})
+            return
         try:
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            request_data = json.loads(post_data.decode('utf-8'))
+            try:
+                max_size = get_max_document_size() if path == '/jobs' else None
+                with span('read_body'):
+                    post_data = read_request_body(self, max_size)
+            except RequestBodyError as e:
+                logger.warning(f'请求体读取失败: {e.message}')
+                self.close_connection = True
+                self._send_json(e.status, {'error': e.message})
+                return
+            
+            request_data = json_codec.loads(post_data)
             
             is_encrypted = request_data.get('encrypted', False)
             
             if is_encrypted:
                 logger.info("收到加密请求")
-                decrypted_data = self.encryption_manager.decrypt_object(request_data['data'])
-                text = decrypted_data.get('text', '')
-                source = decrypted_data.get('source', 'en')
-                target = decrypted_data.get('target', 'zh')
+                payload = self.encryption_manager.decrypt_request(request_data, self.headers)
             else:
                 logger.info("收到普通请求")
-                text = request_data.get('text', '')
-                source = request_data.get('source', 'en')
-                target = request_data.get('target', 'zh')
+                payload = request_data
             
-            if not text:
-                self.send_response(400)
-                self._set_cors_headers()
-                self.send_header('Content-Type', 'application/json; charset=utf-8')
-                self.end_headers()
-                error_response = {'error': '缺少翻译文本'}
-                if is_encrypted:
-                    encrypted_error = self.encryption_manager.encrypt_object(error_response)
-                    self.wfile.write(json.dumps({'encrypted': True, 'data': encrypted_error}).encode('utf-8'))
-                else:
-                    self.wfile.write(json.dumps(error_response).encode('utf-8'))
+            if path == '/jobs':
+                self._handle_job_submit(payload, is_encrypted)
                 return
             
-            result = self.proxy.translate(text, source, target)
+            if path == '/evaluate':
+                self._handle_evaluate(payload, deadline, is_encrypted)
+                return
             
-            self.send_response(200)
-            self._set_cors_headers()
-            self.send_header('Content-Type', 'application/json; charset=utf-8')
-            self.end_headers()
+            if path == '/llm/evaluate':
+                self._handle_llm_evaluate(payload, is_encrypted)
+                return
             
-            response_data = {'result': result}
-            if is_encrypted:
-                encrypted_response = self.encryption_manager.encrypt_object(response_data)
-                self.wfile.write(json.dumps({'encrypted': True, 'data': encrypted_response}).encode('utf-8'))
-            else:
-                self.wfile.write(json.dumps(response_data).encode('utf-8'))
+            text = payload.get('text', '')
+            source = payload.get('source', 'en')
+            target = payload.get('target', 'zh')
+            
+            if not text.strip():
+                self._send_payload(400, {'error': '缺少翻译文本'}, is_encrypted)
+                return
+            
+            self._send_translation(text, source, target, deadline, is_encrypted)
             
         except Exception as e:
-            logger.error('翻译错误: ' + str(e))
-            import traceback
-            traceback.print_exc()
-            self.send_response(500)
-            self._set_cors_headers()
-            self.send_header('Content-Type', 'application/json; charset=utf-8')
-            self.end_headers()
-            error_response = {'error': str(e)}
-            self.wfile.write(json.dumps(error_response).encode('utf-8'))
+            self._send_translate_error(e)
     
     def log_message(self, format, *args):
         pass
 
-def run_secure_proxy_server(port=8002, use_https=False, https_port=8443):
-    os.makedirs('logs', exist_ok=True)
+def run_secure_proxy_server(port=8002, use_https=False, https_port=8443, prewarm=None):
+    configure_logging()
     SecureTranslationRequestHandler.initialize()
     
+    if prewarm:
+        handler = SecureTranslationRequestHandler
+        handler.prewarmer = CachePrewarmer(handler.job_queue, handler.proxy.cache)
+        handler.prewarmer.start(**prewarm)
+    
     if use_https:
         try:
             from https_server_config import HTTPSConfig
@@ -360,25 +833,35 @@ def run_secure_proxy_server(port=8002, use_https=False, https_port=8443):
                 logger.warning('HTTPS证书不存在，使用HTTP模式')
                 logger.info('请运行 generate-https-certificate.py 生成HTTPS证书')
                 server_address = ('', port)
-                httpd = HTTPServer(server_address, SecureTranslationRequestHandler)
+                httpd = DrainingHTTPServer(server_address, SecureTranslationRequestHandler)
                 logger.info(f'安全翻译代理服务器运行在 http://localhost:{port}')
             else:
                 server_address = ('', https_port)
-                httpd = https_config.create_https_server(SecureTranslationRequestHandler, '', https_port)
+                httpd = https_config.create_https_server(SecureTranslationRequestHandler, '', https_port,
+                                                          server_class=DrainingHTTPServer)
                 logger.info(f'安全翻译代理服务器运行在 https://localhost:{https_port}')
                 logger.info('HTTPS模式已启用，使用TLS加密')
         except ImportError:
             logger.warning('HTTPS配置模块未找到，使用HTTP模式')
             server_address = ('', port)
-            httpd = HTTPServer(server_address, SecureTranslationRequestHandler)
+            httpd = DrainingHTTPServer(server_address, SecureTranslationRequestHandler)
             logger.info(f'安全翻译代理服务器运行在 http://localhost:{port}')
     else:
         server_address = ('', port)
-        httpd = HTTPServer(server_address, SecureTranslationRequestHandler)
+        httpd = DrainingHTTPServer(server_address, SecureTranslationRequestHandler)
         logger.info(f'安全翻译代理服务器运行在 http://localhost:{port}')
     
     logger.info('加密模式已启用，支持AES-256-GCM加密')
-    httpd.serve_forever()
+    SecureTranslationRequestHandler.encryption_manager.preload()
+    SecureTranslationRequestHandler.upstream_probe.start()
+    shutdown = GracefulShutdown(httpd)
+    shutdown.add_cleanup(SecureTranslationRequestHandler.job_queue.stop)
+    shutdown.add_cleanup(SecureTranslationRequestHandler.upstream_probe.stop)
+    shutdown.add_cleanup(SecureTranslationRequestHandler.proxy.usage.stop)
+    shutdown.add_cleanup(SecureTranslationRequestHandler.proxy.evaluator.stop)
+    shutdown.add_cleanup(SecureTranslationRequestHandler.proxy.llm.stop)
+    shutdown.add_cleanup(SecureTranslationRequestHandler.proxy.channel.stop)
+    shutdown.serve_forever()
 
 if __name__ == '__main__':
     import sys
@@ -386,9 +869,10 @@ if __name__ == '__main__':
     https_port = 8443
     port = 8002
     
-    if use_https:
-        for arg in sys.argv:
-            if arg.startswith('--https-port='):
-                https_port = int(arg.split('=')[1])
+    for arg in sys.argv:
+        if arg.startswith('--port='):
+            port = int(arg.split('=')[1])
+        elif use_https and arg.startswith('--https-port='):
+            https_port = int(arg.split('=')[1])
     
-    run_secure_proxy_server(port, use_https, https_port)
+    run_secure_proxy_server(port, use_https, https_port, parse_prewarm_args(sys.argv))
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+服务端分句模块
+与 script.js 中的 splitChineseSentences / splitByPassage 行为保持一致，
+以生成器方式逐段产出结果，可直接处理大文本或按块读取的文件对象
+"""
+
+import re
+import sys
+import time
+from typing import Iterable, Iterator, List, Union
+
+# 与 JavaScript String.prototype.trim 一致的空白字符集合
+# （Python 的 str.strip() 还会去掉 \x1c-\x1f、\x85，但不会去掉 \ufeff）
+JS_WHITESPACE = (
+    '\t\n\x0b\x0c\r \xa0\u1680'
+    '\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a'
+    '\u2028\u2029\u202f\u205f\u3000\ufeff'
+)
+_WS_CLASS = '[' + re.escape(JS_WHITESPACE) + ']'
+
+# /Passage\s*\d+/gi：JS 的 \d 只匹配 ASCII 数字，/i 也不会把非ASCII字符折叠成ASCII
+PASSAGE_RE = re.compile(r'Passage' + _WS_CLASS + r'*[0-9]+', re.IGNORECASE | re.ASCII)
+# 缓冲区末尾可能是尚未读完的 Passage 标记
+_PARTIAL_PASSAGE_RE = re.compile(
+    r'p(?:a(?:s(?:s(?:a(?:g(?:e' + _WS_CLASS + r'*)?)?)?)?)?)?\Z',
+    re.IGNORECASE | re.ASCII
+)
+
+SENTENCE_END = '。'
+
+TextSource = Union[str, Iterable[str]]
+
+
+def js_trim(text: str) -> str:
+    """按 JavaScript trim 规则去除首尾空白"""
+    return text.strip(JS_WHITESPACE)
+
+
+def _iter_chunks(source: TextSource) -> Iterator[str]:
+    if isinstance(source, str):
+        yield source
+    else:
+        for chunk in source:
+            if chunk:
+                yield chunk
+
+
+def _iter_split(source: TextSource, separator: str) -> Iterator[str]:
+    """按分隔符切分（分隔符保留在片段末尾），最后一段不带分隔符"""
+    pending: List[str] = []
+    for chunk in _iter_chunks(source):
+        start = 0
+        while True:
+            idx = chunk.find(separator, start)
+            if idx < 0:
+                break
+            if pending:
+                pending.append(chunk[start:idx + 1])
+                yield ''.join(pending)
+                pending = []
+            else:
+                yield chunk[start:idx + 1]
+            start = idx + 1
+        if start < len(chunk):
+            pending.append(chunk[start:])
+    yield ''.join(pending)
+
+
+def iter_line_sentences(source: TextSource) -> Iterator[str]:
+    """按换行切分，对应 splitChineseSentences 的 byLine 结果"""
+    for line in _iter_split(source, '\n'):
+        line = js_trim(line)
+        if line:
+            yield line
+
+
+def iter_period_sentences(source: TextSource) -> Iterator[str]:
+    """按句号切分，对应 splitChineseSentences 的 byPeriod 结果"""
+    for sentence in _iter_split(source, SENTENCE_END):
+        sentence = js_trim(sentence)
+        if sentence:
+            yield sentence
+
+
+def iter_passages(source: TextSource) -> Iterator[str]:
+    """
+    按 "Passage N" 标记切分文章，对应 splitByPassage
+
+    找到第一个标记之后，缓冲区只保留当前文章；
+    整个输入都没有标记时与前端一致，返回去除首尾空白的全文（可能为空字符串）。
+    """
+    buf = ''
+    search_pos = 0
+    content_start = None
+    chunks = _iter_chunks(source)
+    final = False
+
+    while not final:
+        chunk = next(chunks, None)
+        if chunk is None:
+            final = True
+        else:
+            # 只在追加新数据时丢弃已产出的部分，避免每个标记都复制一次缓冲区
+            if content_start:
+                buf = buf[content_start:]
+                search_pos -= content_start
+                content_start = 0
+            buf += chunk
+
+        while True:
+            match = PASSAGE_RE.search(buf, search_pos)
+            if match is None:
+                if not final:
+                    partial = _PARTIAL_PASSAGE_RE.search(buf, search_pos)
+                    search_pos = partial.start() if partial else len(buf)
+                break
+            # 匹配到缓冲区末尾时，后续数据可能继续补充数字
+            if not final and match.end() >= len(buf):
+                search_pos = match.start()
+                break
+            if content_start is not None:
+                passage = js_trim(buf[content_start:match.start()])
+                if passage:
+                    yield passage
+            content_start = match.end()
+            search_pos = match.end()
+
+    if content_start is None:
+        yield js_trim(buf)
+    else:
+        passage = js_trim(buf[content_start:])
+        if passage:
+            yield passage
+
+
+def split_chinese_sentences(text: str) -> dict:
+    """与前端 splitChineseSentences 返回结构相同"""
+    return {
+        'byLine': list(iter_line_sentences(text)),
+        'byPeriod': list(iter_period_sentences(text)),
+    }
+
+
+def split_by_passage(text: str) -> List[str]:
+    """与前端 splitByPassage 返回结构相同"""
+    return list(iter_passages(text))
+
+
+# ---------------------------------------------------------------------------
+# 一致性检查与性能测试
+# ---------------------------------------------------------------------------
+
+PARITY_CASES = [
+    "这是第一行。这是第二行\n这是第三行。这是第四行",
+    "这是一个句子。这是第二个句子。这是第三个句子",
+    "这是第一行\n这是第二行\n这是第三行",
+    "这是一个没有分隔符的长句子",
+    "这是第一个句子。。这是第二个句子。。。这是第三个句子",
+    "这是第一行。\n\n这是第二行。\n这是第三行",
+    "",
+    "   \n\u3000\n",
+    "前言\nPassage 1\n第一篇。\nPASSAGE2 第二篇\npassage\t\n 3 第三篇。",
+    "Passage 1 Passage 2 只有第二篇",
+    "\ufeff句子一。\r\n句子二\u3000。\x1c",
+    "Passage ١ 阿拉伯数字不算标记",
+]
+
+
+def _run_js_reference(texts: List[str], script_path: str):
+    """用 node 执行 script.js 中的原始函数，得到前端参考输出"""
+    import json
+    import shutil
+    import subprocess
+
+    node = shutil.which('node')
+    if not node:
+        return None
+
+    with open(script_path, 'r', encoding='utf-8') as f:
+        source = f.read()
+
+    def extract(name):
+        start = source.index('function ' + name + '(')
+        depth = 0
+        for pos in range(source.index('{', start), len(source)):
+            if source[pos] == '{':
+                depth += 1
+            elif source[pos] == '}':
+                depth -= 1
+                if depth == 0:
+                    return source[start:pos + 1]
+        raise ValueError('无法解析函数: ' + name)
+
+    program = '\n'.join([
+        extract('splitByPassage'),
+        extract('splitChineseSentences'),
+        'const texts = JSON.parse(require("fs").readFileSync(0, "utf8"));',
+        'console.log(JSON.stringify(texts.map(t => '
+        '({sentences: splitChineseSentences(t), passages: splitByPassage(t)}))));',
+    ])
+    result = subprocess.run([node, '-e', program], input=json.dumps(texts),
+                            capture_output=True, text=True, encoding='utf-8')
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return json.loads(result.stdout)
+
+
+def _random_texts(count: int, seed: int = 42) -> List[str]:
+    import random
+    rng = random.Random(seed)
+    pieces = ['句子', '。', '\n', ' ', '\u3000', '\r', 'Passage', 'passage ', '12', 'P', 'a',
+              '\t', '\ufeff', '\x1c', '\xa0', '，', '！']
+    return [''.join(rng.choice(pieces) for _ in range(rng.randint(0, 40))) for _ in range(count)]
+
+
+def check_parity(script_path: str = 'script.js') -> bool:
+    """对照前端实现检查输出是否一致，同时检查按块流式输入与整体输入结果一致"""
+    texts = PARITY_CASES + _random_texts(500)
+    reference = _run_js_reference(texts, script_path)
+    if reference is None:
+        print('未找到 node，跳过与前端实现的对比')
+
+    ok = True
+    for i, text in enumerate(texts):
+        sentences = split_chinese_sentences(text)
+        passages = split_by_passage(text)
+        chunks = [text[j:j + 3] for j in range(0, len(text), 3)]
+        streamed = {
+            'byLine': list(iter_line_sentences(chunks)),
+            'byPeriod': list(iter_period_sentences(chunks)),
+        }
+        if streamed != sentences or list(iter_passages(chunks)) != passages:
+            print(f'流式结果不一致: {text!r}')
+            ok = False
+        if reference is not None:
+            expected = reference[i]
+            if sentences != expected['sentences'] or passages != expected['passages']:
+                print(f'与前端结果不一致: {text!r}')
+                print(f'  Python: {sentences} {passages}')
+                print(f'  JS:     {expected["sentences"]} {expected["passages"]}')
+                ok = False
+
+    print(f'一致性检查: {len(texts)} 个用例, {"通过" if ok else "失败"}')
+    return ok
+
+
+def benchmark(size_mb: float = 8.0) -> None:
+    """在多MB文本上测试各切分方式的吞吐量"""
+    unit = ('Passage 1\n这是一个用于测试分句性能的中文句子，其中包含逗号。'
+            '第二句没有换行但有句号。\n  第三行 \u3000\n')
+    text = unit * max(1, int(size_mb * 1024 * 1024 / len(unit.encode('utf-8'))))
+    megabytes = len(text.encode('utf-8')) / (1024 * 1024)
+    chunk_size = 64 * 1024
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+    print(f'测试文本: {megabytes:.1f} MB')
+    for name, func in [('byLine', iter_line_sentences),
+                       ('byPeriod', iter_period_sentences),
+                       ('passages', iter_passages)]:
+        for label, source in [('整体', text), ('分块', chunks)]:
+            start = time.perf_counter()
+            count = sum(1 for _ in func(source))
+            elapsed = time.perf_counter() - start
+            print(f'{name:9s} {label}: {count:8d} 段, {elapsed * 1000:8.1f} ms, '
+                  f'{megabytes / elapsed:7.1f} MB/s')
+
+
+if __name__ == '__main__':
+    if '--benchmark' in sys.argv:
+        size = 8.0
+        for arg in sys.argv:
+            if arg.startswith('--size-mb='):
+                size = float(arg.split('=')[1])
+        benchmark(size)
+    else:
+        sys.exit(0 if check_parity() else 1)
@@ -0,0 +1,164 @@
+"""
+服务器生命周期模块
+收到 SIGTERM 后先把 /health 切换为 draining，让负载均衡停止转发新请求；
+短暂延迟后停止接受连接，在截止时间内等待处理中的请求完成，
+最后执行清理回调（保存任务进度等）并刷新日志
+"""
+
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DRAIN_DELAY = 1.0
+# docker stop / docker-compose 默认10秒后发送 SIGKILL，留出余量
+DEFAULT_SHUTDOWN_TIMEOUT = 8.0
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+class DrainingHTTPServer(ThreadingHTTPServer):
+    """
+    记录处理中的连接数，并通过 draining 属性告诉请求处理器服务器正在关闭
+
+    升级为 WebSocket 的长连接大部分时间空闲，不计入 active_requests（就绪检查用它衡量负载），
+    但关闭时同样等待它们结束
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.draining = False
+        self._active = 0
+        self._upgraded = 0
+        self._idle = threading.Condition()
+
+    @property
+    def active_requests(self) -> int:
+        return self._active - self._upgraded
+
+    @property
+    def upgraded_connections(self) -> int:
+        return self._upgraded
+
+    @contextmanager
+    def upgraded(self):
+        """在请求处理线程中包住升级后的连接，期间该连接不算作处理中的请求"""
+        with self._idle:
+            self._upgraded += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._upgraded -= 1
+
+    def process_request(self, request, client_address):
+        # 在接受连接的线程里计数，避免工作线程启动前被误判为空闲
+        with self._idle:
+            self._active += 1
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self._release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        with self._idle:
+            self._active -= 1
+            if self._active == 0:
+                self._idle.notify_all()
+
+    def wait_idle(self, timeout: float) -> bool:
+        """等待所有处理中的请求完成，超时返回 False"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._active == 0, max(timeout, 0.0))
+
+
+class GracefulShutdown:
+    """
+    代替直接调用 httpd.serve_forever()
+
+    清理回调按注册顺序执行，参数是距截止时间剩余的秒数，
+    例如 TranslationJobQueue.stop 可以直接注册。
+    """
+
+    def __init__(self, httpd: DrainingHTTPServer, drain_delay: Optional[float] = None,
+                 timeout: Optional[float] = None):
+        self.httpd = httpd
+        self.drain_delay = drain_delay if drain_delay is not None else \
+            _env_float('SHUTDOWN_DRAIN_DELAY', DEFAULT_DRAIN_DELAY)
+        self.timeout = timeout if timeout is not None else \
+            _env_float('SHUTDOWN_TIMEOUT', DEFAULT_SHUTDOWN_TIMEOUT)
+        self._cleanups: List[Callable[[float], None]] = []
+        self._deadline = None
+        self._lock = threading.Lock()
+
+    def add_cleanup(self, func: Callable[[float], None]) -> None:
+        self._cleanups.append(func)
+
+    def _begin(self) -> bool:
+        with self._lock:
+            if self._deadline is not None:
+                return False
+            self._deadline = time.monotonic() + self.timeout
+            self.httpd.draining = True
+            return True
+
+    def _remaining(self) -> float:
+        return max(self._deadline - time.monotonic(), 0.0)
+
+    def _handle_signal(self, signum, frame):
+        if not self._begin():
+            return
+        logger.info(f'收到信号 {signum}，开始排空连接，'
+                    f'{self.drain_delay:.1f}秒后停止接受新请求，最长等待{self.timeout:.1f}秒')
+        # serve_forever 运行在主线程，shutdown() 必须从其他线程调用
+        threading.Thread(target=self._stop_accepting, name='shutdown', daemon=True).start()
+
+    def _stop_accepting(self) -> None:
+        time.sleep(min(self.drain_delay, self._remaining()))
+        self.httpd.shutdown()
+
+    def serve_forever(self) -> None:
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self._begin()
+            self._finish()
+
+    def _finish(self) -> None:
+        if not self.httpd.wait_idle(self._remaining()):
+            logger.warning(f'关闭超时，仍有 {self.httpd.active_requests} 个请求和 '
+                           f'{self.httpd.upgraded_connections} 个通道连接未完成')
+        for cleanup in self._cleanups:
+            try:
+                cleanup(self._remaining())
+            except Exception as e:
+                logger.error(f'关闭清理失败: {e}')
+        self.httpd.server_close()
+        logger.info('服务器已关闭')
+        for handler in logging.getLogger().handlers:
+            handler.flush()
+        sys.stdout.flush()
+        sys.stderr.flush()
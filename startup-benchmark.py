@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+代理启动基准测试
+多次冷启动代理进程，测量从启动到第一个请求被接受并返回响应的时间，
+以及此时的常驻内存（RSS）。容器健康检查的启动宽限期很短，
+启动时间应当远小于它。
+
+用法:
+    python startup-benchmark.py [--proxy=secure|plain] [--runs=5] [--budget=10]
+"""
+
+import base64
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROXY_SCRIPTS = {
+    'secure': 'secure-translation-proxy.py',
+    'plain': 'translation-proxy.py',
+}
+POLL_INTERVAL = 0.005
+START_TIMEOUT = 30.0
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _read_rss_kb(pid: int):
+    """读取 /proc/<pid>/status 中的 VmRSS，非Linux系统返回 None"""
+    try:
+        with open(f'/proc/{pid}/status', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _wait_first_response(process: subprocess.Popen, port: int) -> None:
+    deadline = time.perf_counter() + START_TIMEOUT
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'代理进程已退出，返回码 {process.returncode}')
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+        try:
+            # 纯代理没有 /health，返回404同样说明请求已被接受
+            conn.request('GET', '/health')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(POLL_INTERVAL)
+        finally:
+            conn.close()
+    raise RuntimeError(f'{START_TIMEOUT:.0f}秒内未收到响应')
+
+
+def measure_once(script: str, env: dict, workdir: str) -> tuple:
+    port = _free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, script, f'--port={port}'],
+        cwd=workdir, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_first_response(process, port)
+        elapsed = time.perf_counter() - start
+        return elapsed, _read_rss_kb(process.pid)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def benchmark(proxy: str = 'secure', runs: int = 5, budget: float = 10.0) -> None:
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), PROXY_SCRIPTS[proxy])
+    env = dict(os.environ)
+    # 只测启动，不访问腾讯API；未配置的凭证和密钥用占位值代替
+    env.setdefault('TENCENT_SECRET_ID', 'benchmark-secret-id')
+    env.setdefault('TENCENT_SECRET_KEY', 'benchmark-secret-key')
+    env.setdefault('ENCRYPTION_KEY', base64.b64encode(os.urandom(32)).decode('ascii'))
+
+    timings = []
+    rss_values = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for run in range(1, runs + 1):
+            elapsed, rss_kb = measure_once(script, env, workdir)
+            timings.append(elapsed)
+            if rss_kb is not None:
+                rss_values.append(rss_kb)
+            rss_text = f'{rss_kb / 1024:.1f} MB' if rss_kb is not None else 'n/a'
+            print(f'第{run}次: 首个请求 {elapsed * 1000:7.1f} ms, RSS {rss_text}')
+
+    median = statistics.median(timings)
+    print(f'{PROXY_SCRIPTS[proxy]}: 启动到首个请求 '
+          f'最小 {min(timings) * 1000:.1f} ms / 中位数 {median * 1000:.1f} ms / '
+          f'最大 {max(timings) * 1000:.1f} ms')
+    if rss_values:
+        print(f'基线RSS 中位数 {statistics.median(rss_values) / 1024:.1f} MB')
+    if max(timings) > budget:
+        print(f'警告: 启动时间超过健康检查宽限期 {budget:.0f} 秒')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    proxy = 'secure'
+    runs = 5
+    budget = 10.0
+    for arg in sys.argv[1:]:
+        if arg.startswith('--proxy='):
+            proxy = arg.split('=', 1)[1]
+        elif arg.startswith('--runs='):
+            runs = int(arg.split('=', 1)[1])
+        elif arg.startswith('--budget='):
+            budget = float(arg.split('=', 1)[1])
+    if proxy not in PROXY_SCRIPTS:
+        print(f'未知的代理类型: {proxy}，可选 {", ".join(PROXY_SCRIPTS)}')
+        sys.exit(2)
+    benchmark(proxy, runs, budget)
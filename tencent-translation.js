@@ -1,3 +1,113 @@
+// 代理的多路复用通道：一条 WebSocket 连接上同时发送多个带 id 的请求，响应按完成顺序返回，
+// 省去每次查询重新建立连接和 CORS 预检的开销
+class TranslationChannel {
+    constructor(proxyUrl) {
+        this.url = proxyUrl.replace(/^http/, 'ws') + '/channel';
+        this.encryptionManager = null;
+        this.socket = null;
+        this.connecting = null;
+        this.pending = new Map();
+        this.nextId = 0;
+        this.requestTimeoutMs = 10000;
+        // 连接失败后暂停使用通道，期间的请求直接走 HTTP
+        this.retryDelayMs = 60000;
+        this.disabledUntil = 0;
+    }
+
+    isAvailable() {
+        return typeof WebSocket !== 'undefined' && Date.now() >= this.disabledUntil;
+    }
+
+    connect() {
+        if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+            return Promise.resolve(this.socket);
+        }
+        if (this.connecting) {
+            return this.connecting;
+        }
+        this.connecting = new Promise((resolve, reject) => {
+            const socket = new WebSocket(this.url);
+            socket.onopen = () => {
+                this.socket = socket;
+                this.connecting = null;
+                resolve(socket);
+            };
+            socket.onerror = () => {
+                if (this.connecting) {
+                    this.connecting = null;
+                    this.disabledUntil = Date.now() + this.retryDelayMs;
+                    reject(this.channelError('通道连接失败'));
+                }
+            };
+            socket.onclose = () => {
+                if (this.socket === socket) {
+                    this.socket = null;
+                }
+                // 服务器重启或空闲断开后，下一个请求会重新连接
+                for (const [id, request] of this.pending) {
+                    clearTimeout(request.timer);
+                    request.reject(this.channelError('通道已断开'));
+                }
+                this.pending.clear();
+            };
+            socket.onmessage = (event) => this.handleMessage(event.data);
+        });
+        return this.connecting;
+    }
+
+    channelError(message) {
+        const error = new Error(message);
+        error.name = 'ChannelError';
+        return error;
+    }
+
+    async request(op, payload, deadlineMs) {
+        const socket = await this.connect();
+        const id = ++this.nextId;
+        let message = { op: op, ...payload };
+        if (deadlineMs) {
+            message.deadline_ms = deadlineMs;
+        }
+        if (this.encryptionManager) {
+            // 每条消息单独加密，id 保持明文用于匹配响应
+            message = { id: id, ...(await this.encryptionManager.encryptRequest(message)) };
+        } else {
+            message.id = id;
+        }
+
+        return new Promise((resolve, reject) => {
+            const timer = setTimeout(() => {
+                this.pending.delete(id);
+                reject(this.channelError('通道请求超时'));
+            }, deadlineMs ? deadlineMs + 1000 : this.requestTimeoutMs);
+            this.pending.set(id, { resolve, reject, timer });
+            socket.send(JSON.stringify(message));
+        });
+    }
+
+    async handleMessage(raw) {
+        let reply;
+        try {
+            reply = JSON.parse(raw);
+        } catch (error) {
+            console.warn('通道响应格式错误:', error);
+            return;
+        }
+        const request = this.pending.get(reply.id);
+        if (!request) {
+            return;
+        }
+        this.pending.delete(reply.id);
+        clearTimeout(request.timer);
+        try {
+            const data = reply.encrypted ? await this.encryptionManager.decryptObject(reply.data) : reply.data;
+            request.resolve({ status: reply.status, data: data });
+        } catch (error) {
+            request.reject(error);
+        }
+    }
+}
+
 class TencentTranslationDictionary {
     constructor() {
         this.proxyUrl = window.API_CONFIG?.API_BASE_URL || 'http://localhost:8002';
@@ -5,6 +115,14 @@ class TencentTranslationDictionary {
         this.maxCacheSize = 200;
         this.useEncryption = window.API_CONFIG?.USE_ENCRYPTION || false;
         this.secureClient = null;
+        // 单词卡片查询等不了太久，超过这个时间由代理返回过期缓存或超时错误
+        this.lookupDeadlineMs = window.API_CONFIG?.LOOKUP_DEADLINE_MS || 3000;
+        this.channel = window.API_CONFIG?.USE_CHANNEL ? new TranslationChannel(this.proxyUrl) : null;
+        // 代理支持时短文本用 GET /translate：简单请求不需要 CORS 预检，浏览器按 ETag 重新验证缓存
+        this.useGetTranslate = window.API_CONFIG?.USE_GET_TRANSLATE || false;
+        this.maxGetTextLength = 500;
+        // 代理配置了离线词典时先查词典；代理回复词典不可用（未配置或不支持该路由）后本页不再查询
+        this.offlineDictionaryAvailable = window.API_CONFIG?.USE_OFFLINE_DICTIONARY || false;
         
         if (window.API_CONFIG?.USE_ENCRYPTION) {
             this.enableEncryption();
@@ -16,6 +134,9 @@ class TencentTranslationDictionary {
             this.secureClient = new SecureTranslationClient(this.proxyUrl);
             await this.secureClient.initialize();
             this.useEncryption = true;
+            if (this.channel) {
+                this.channel.encryptionManager = this.secureClient.encryptionManager;
+            }
             console.log('加密模式已启用');
             return true;
         }
@@ -26,6 +147,9 @@ class TencentTranslationDictionary {
     async disableEncryption() {
         this.useEncryption = false;
         this.secureClient = null;
+        if (this.channel) {
+            this.channel.encryptionManager = null;
+        }
         console.log('加密模式已禁用');
     }
 
@@ -54,7 +178,12 @@ class TencentTranslationDictionary {
     }
 
     async getSingleWordDefinition(word) {
-        const translation = await this.translate(word, 'en', 'zh');
+        const entry = await this.lookupOffline(word);
+        if (entry) {
+            return this.fromOfflineEntry(word, entry);
+        }
+
+        const translation = await this.translate(word, 'en', 'zh', this.lookupDeadlineMs);
 
         return {
             word: word,
@@ -75,8 +204,83 @@ class TencentTranslationDictionary {
         };
     }
 
+    // 通道可用时经通道发送请求，返回 {status, data}；未启用通道或通道连接失败时返回 null，由调用方改用 HTTP
+    async requestViaChannel(op, payload, deadlineMs) {
+        if (!this.channel || !this.channel.isAvailable()) {
+            return null;
+        }
+        try {
+            return await this.channel.request(op, payload, deadlineMs);
+        } catch (error) {
+            console.warn('通道请求失败，改用HTTP:', error);
+            return null;
+        }
+    }
+
+    // 代理的离线词典：没有配置词典、查不到或请求失败时返回 null，改用翻译接口
+    async lookupOffline(word) {
+        if (!this.offlineDictionaryAvailable) {
+            return null;
+        }
+        const reply = await this.requestViaChannel('dictionary', { word: word.trim() });
+        if (reply) {
+            this.offlineDictionaryAvailable = reply.status !== 503;
+            return reply.status === 200 ? reply.data : null;
+        }
+        try {
+            const response = await fetch(`${this.proxyUrl}/dictionary?word=${encodeURIComponent(word.trim())}`);
+            if (!response.ok) {
+                // 404 只是词典里没有这个词；其他状态说明代理没有可用的词典
+                this.offlineDictionaryAvailable = response.status === 404;
+                return null;
+            }
+            return await response.json();
+        } catch (error) {
+            console.warn('离线词典查询失败:', error);
+            return null;
+        }
+    }
+
+    async fromOfflineEntry(word, entry) {
+        const meanings = (entry.meanings || []).map(meaning => {
+            const definition = meaning.definitions?.[0]?.definition || '';
+            return {
+                partOfSpeech: meaning.partOfSpeech || '释义',
+                definition: definition,
+                chinese: meaning.chinese || '',
+                context: entry.lemma ? `${entry.lemma} 的变形` : '通用语境',
+                definitions: [{ chinese: meaning.chinese || '', definition: definition }]
+            };
+        });
+
+        // 词典只有英文释义时，仍用翻译接口补上中文
+        let translation = meanings.find(meaning => meaning.chinese)?.chinese;
+        if (!translation) {
+            translation = await this.translate(word, 'en', 'zh', this.lookupDeadlineMs);
+            meanings.unshift({
+                partOfSpeech: '释义',
+                definition: word,
+                chinese: translation,
+                context: '通用语境',
+                definitions: [{ chinese: translation, definition: word }]
+            });
+        }
+
+        return {
+            word: entry.word,
+            phonetic: entry.phonetic || '',
+            meanings: meanings,
+            examples: this.generateExamples(word, translation.split(/[,，;；]/)[0]),
+            usage: {
+                frequency: '常用',
+                register: '中性'
+            },
+            source: 'offline'
+        };
+    }
+
     async getPhraseDefinition(phrase) {
-        const translation = await this.translate(phrase, 'en', 'zh');
+        const translation = await this.translate(phrase, 'en', 'zh', this.lookupDeadlineMs);
 
         return {
             word: phrase,
@@ -97,19 +301,38 @@ class TencentTranslationDictionary {
         };
     }
 
-    async translate(text, source, target) {
+    async translate(text, source, target, deadlineMs) {
         try {
             let data;
+            const reply = await this.requestViaChannel('translate', { text, source, target }, deadlineMs);
             
-            if (this.useEncryption && this.secureClient) {
+            if (reply) {
+                data = reply.data;
+            } else if (this.useEncryption && this.secureClient) {
                 const result = await this.secureClient.translate(text, source, target);
                 data = { result: result };
+            } else if (this.useGetTranslate && text.length <= this.maxGetTextLength) {
+                const params = new URLSearchParams({ text, source, target });
+                if (deadlineMs) {
+                    params.set('deadline_ms', String(deadlineMs));
+                }
+                const response = await fetch(`${this.proxyUrl}/translate?${params}`, { cache: 'no-cache' });
+
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+
+                data = await response.json();
             } else {
+                const headers = {
+                    'Content-Type': 'application/json'
+                };
+                if (deadlineMs) {
+                    headers['X-Deadline-Ms'] = String(deadlineMs);
+                }
                 const response = await fetch(this.proxyUrl, {
                     method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
+                    headers: headers,
                     body: JSON.stringify({
                         text: text,
                         source: source,
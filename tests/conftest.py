@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 模块都在仓库根目录，直接运行 pytest 时也能导入
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
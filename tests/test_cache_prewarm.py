@@ -0,0 +1,34 @@
+import time
+
+from cache_prewarm import CachePrewarmer
+from translation_jobs import RateLimiter, TranslationJobQueue
+
+
+class FakeCache:
+    def stats(self):
+        return {}
+
+
+def test_prewarm_larger_than_queue_is_submitted_in_batches(tmp_path):
+    words = [f'word{index}' for index in range(25)]
+    path = tmp_path / 'words.txt'
+    path.write_text('\n'.join(words), encoding='utf-8')
+    translated = []
+    queue = TranslationJobQueue(lambda text, source, target: translated.append(text) or text.upper(),
+                                workers=2, rate_limiter=RateLimiter(10000, 10000), max_queued=10)
+
+    prewarmer = CachePrewarmer(queue, FakeCache(), interval=0.1)
+    prewarmer.start(str(path))
+    # 队列启动前只提交上限一半的词条，不抛出 JobQueueFullError
+    assert (prewarmer.status()['submitted'], queue.depth()) == (5, 5)
+
+    queue.start()
+    deadline = time.monotonic() + 10
+    try:
+        while prewarmer.status()['status'] != 'completed' and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        queue.stop(timeout=2)
+    status = prewarmer.status()
+    assert (status['status'], status['done'], status['failed']) == ('completed', 25, 0)
+    assert sorted(translated) == sorted(words)
@@ -0,0 +1,108 @@
+import json
+import threading
+
+import pytest
+
+from llm_evaluation import LLMEvaluationRelay, LLMRelayError, run_stub_server
+
+CHINESE = '我每天早上七点起床。'
+TRANSLATION = 'I get up at seven every morning.'
+
+
+@pytest.fixture
+def stub():
+    server, handler = run_stub_server(0, delay=0.01)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/v1/chat/completions', handler
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_relay(stub):
+    relays = []
+
+    def make(**kwargs):
+        kwargs.setdefault('api_key', 'server')
+        relay = LLMEvaluationRelay(api_url=stub[0], concurrency=4, cache_size=100, timeout=5, **kwargs)
+        relays.append(relay)
+        return relay
+    yield make
+    for relay in relays:
+        relay.stop()
+
+
+def parse_events(events):
+    parsed = []
+    for event in events:
+        name, data = event.decode('utf-8').strip().split('\n')
+        parsed.append((name[len('event: '):], json.loads(data[len('data: '):])))
+    return parsed
+
+
+def test_stream_yields_deltas_then_done(stub, make_relay):
+    relay = make_relay()
+    events = parse_events(relay.open_stream(CHINESE, TRANSLATION))
+    deltas = [data['content'] for name, data in events if name == 'delta']
+    assert len(deltas) > 1
+    name, done = events[-1]
+    assert name == 'done'
+    assert done == {'content': ''.join(deltas), 'cached': False}
+    assert done['content'].startswith('1. 评分（0-100分）：')
+
+
+def test_repeated_request_is_served_from_cache(stub, make_relay):
+    relay = make_relay()
+    first = relay.complete(CHINESE, TRANSLATION)
+    second = relay.complete(CHINESE, TRANSLATION)
+    assert (first['cached'], second['cached']) == (False, True)
+    assert first['content'] == second['content']
+    assert stub[1].calls == 1
+
+
+def test_concurrent_identical_requests_share_one_upstream_call(stub, make_relay):
+    relay = make_relay()
+    results = []
+    lock = threading.Lock()
+
+    def run():
+        content = relay.complete(CHINESE, TRANSLATION)['content']
+        with lock:
+            results.append(content)
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 8 and len(set(results)) == 1
+    assert stub[1].calls == 1
+    stats = relay.stats()
+    assert stats['coalesced'] + stats['cache_hits'] == 7
+    assert stats['coalesced'] > 0
+
+
+def test_client_keys_do_not_share_results(stub, make_relay):
+    relay = make_relay(api_key='')
+    assert relay.complete(CHINESE, TRANSLATION, 'key-a')['cached'] is False
+    assert relay.complete(CHINESE, TRANSLATION, 'key-b')['cached'] is False
+    assert relay.complete(CHINESE, TRANSLATION, 'key-a')['cached'] is True
+    assert stub[1].calls == 2
+
+
+def test_invalid_key_fails_before_streaming(stub, make_relay):
+    relay = make_relay(api_key='')
+    with pytest.raises(LLMRelayError) as error:
+        relay.open_stream(CHINESE, TRANSLATION, 'invalid')
+    assert error.value.status == 401
+    with pytest.raises(LLMRelayError) as error:
+        relay.complete(CHINESE, TRANSLATION)
+    assert error.value.status == 401
+
+
+def test_upstream_rate_limit_is_passed_through(stub, make_relay):
+    relay = make_relay()
+    with pytest.raises(LLMRelayError) as error:
+        relay.complete(CHINESE, 'RATE_LIMIT')
+    assert error.value.status == 429
+    assert relay.stats()['upstream_errors'] == 1
@@ -0,0 +1,100 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+import json_codec
+from multiplex_channel import MultiplexChannel, WebSocketConnection
+from request_tracing import RequestTracer
+from server_lifecycle import DrainingHTTPServer
+from translation_cache import CachedResponse
+
+
+class FakeProxy:
+    """slow 开头的文本阻塞到 release 被设置，hit 开头的文本命中缓存"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.dictionary = None
+
+    def cached_response(self, text, source='en', target='zh', client=None):
+        return CachedResponse(text.upper()) if text.startswith('hit') else None
+
+    def translate(self, text, source='en', target='zh', client=None, deadline=None):
+        if text.startswith('slow'):
+            self.release.wait(5)
+        return text.upper()
+
+
+def open_session(channel, client):
+    server_sock, client_sock = socket.socketpair()
+    connection = WebSocketConnection(client_sock, client=True)
+    thread = threading.Thread(target=channel.serve,
+                              args=(WebSocketConnection(server_sock), client, RequestTracer(), lambda: False),
+                              daemon=True)
+    thread.start()
+    return connection, thread
+
+
+def send(connection, request_id, text):
+    connection.send_text(json_codec.dumps({'id': request_id, 'op': 'translate', 'text': text}))
+
+
+def receive(connection):
+    return json_codec.loads(connection.receive())
+
+
+def test_busy_session_does_not_block_others():
+    proxy = FakeProxy()
+    channel = MultiplexChannel(proxy, workers=4, session_workers=8, idle_timeout=5)
+    assert channel.session_workers == 3
+    busy, busy_thread = open_session(channel, 'a')
+    other, other_thread = open_session(channel, 'b')
+    for index in range(10):
+        send(busy, index, f'slow {index}')
+    # 缓存命中在读取线程中直接回复，不等前面阻塞的翻译
+    send(busy, 100, 'hit busy')
+    assert receive(busy) == {'id': 100, 'status': 200, 'data': {'result': 'HIT BUSY'}}
+
+    start = time.monotonic()
+    send(other, 1, 'fresh')
+    assert receive(other)['data'] == {'result': 'FRESH'}
+    assert time.monotonic() - start < 1
+
+    proxy.release.set()
+    assert sorted(receive(busy)['id'] for _ in range(10)) == list(range(10))
+    for connection, thread in ((busy, busy_thread), (other, other_thread)):
+        connection.close()
+        thread.join(2)
+    stats = channel.stats()
+    assert (stats['messages'], stats['inline']) == (12, 1)
+    channel.stop()
+
+
+def test_upgraded_connections_are_not_active_requests():
+    entered = threading.Event()
+    leave = threading.Event()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with self.server.upgraded():
+                entered.set()
+                leave.wait(5)
+
+        def log_message(self, *args):
+            pass
+
+    server = DrainingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    sock = socket.create_connection(server.server_address)
+    try:
+        sock.sendall(b'GET /channel HTTP/1.1\r\nHost: test\r\n\r\n')
+        assert entered.wait(2)
+        assert (server.active_requests, server.upgraded_connections) == (0, 1)
+    finally:
+        leave.set()
+        sock.close()
+        server.shutdown()
+        server.server_close()
+    assert server.wait_idle(2)
+    assert server.upgraded_connections == 0
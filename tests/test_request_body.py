@@ -0,0 +1,74 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from request_body import RequestBodyError, read_request_body
+
+
+class FakeHandler:
+    def __init__(self, connection, headers):
+        self.connection = connection
+        self.rfile = connection.makefile('rb')
+        self.headers = headers
+
+
+@pytest.fixture
+def connection():
+    server, client = socket.socketpair()
+    yield server, client
+    server.close()
+    client.close()
+
+
+def test_content_length_body(connection):
+    server, client = connection
+    client.sendall(b'{"text": "hi"}')
+    handler = FakeHandler(server, {'Content-Length': '14'})
+    assert read_request_body(handler, 1024, 1.0) == b'{"text": "hi"}'
+
+
+def test_chunked_body_with_trailer(connection):
+    server, client = connection
+    client.sendall(b'4;ext=1\r\nabcd\r\n3\r\nefg\r\n0\r\nX-Trailer: 1\r\n\r\n')
+    handler = FakeHandler(server, {'Transfer-Encoding': 'chunked'})
+    assert read_request_body(handler, 1024, 1.0) == b'abcdefg'
+
+
+def test_chunked_body_over_limit(connection):
+    server, client = connection
+    client.sendall(b'8\r\n12345678\r\n8\r\n12345678\r\n0\r\n\r\n')
+    handler = FakeHandler(server, {'Transfer-Encoding': 'chunked'})
+    with pytest.raises(RequestBodyError) as error:
+        read_request_body(handler, 10, 1.0)
+    assert error.value.status == 413
+
+
+@pytest.mark.parametrize('headers, body', [
+    ({'Content-Length': '1000'}, b'x' * 1000),
+    ({'Transfer-Encoding': 'chunked'}, b'3e8\r\n' + b'x' * 1000 + b'\r\n0\r\n\r\n'),
+], ids=['content-length', 'chunked'])
+def test_slow_client_hits_total_deadline(connection, headers, body):
+    server, client = connection
+    stop = threading.Event()
+
+    def drip():
+        # 每个字节都在单次读取超时之内到达，只有总时限能让读取结束
+        for byte in body:
+            if stop.wait(0.02):
+                return
+            client.sendall(bytes([byte]))
+
+    thread = threading.Thread(target=drip, daemon=True)
+    thread.start()
+    start = time.monotonic()
+    try:
+        with pytest.raises(RequestBodyError) as error:
+            read_request_body(FakeHandler(server, headers), 4096, 0.3)
+    finally:
+        stop.set()
+        thread.join()
+    assert error.value.status == 408
+    assert time.monotonic() - start < 1.0
+    assert server.gettimeout() is None
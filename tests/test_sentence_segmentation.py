@@ -0,0 +1,63 @@
+import os
+import shutil
+
+import pytest
+
+from sentence_segmentation import (
+    PARITY_CASES, _random_texts, _run_js_reference, iter_line_sentences, iter_passages,
+    iter_period_sentences, split_by_passage, split_chinese_sentences,
+)
+from conftest import ROOT
+
+CASES = [
+    ('这是第一行。这是第二行\n这是第三行。这是第四行',
+     ['这是第一行。这是第二行', '这是第三行。这是第四行'],
+     ['这是第一行。', '这是第二行\n这是第三行。', '这是第四行'],
+     ['这是第一行。这是第二行\n这是第三行。这是第四行']),
+    ('这是第一个句子。。这是第二个句子。。。这是第三个句子',
+     ['这是第一个句子。。这是第二个句子。。。这是第三个句子'],
+     ['这是第一个句子。', '。', '这是第二个句子。', '。', '。', '这是第三个句子'],
+     ['这是第一个句子。。这是第二个句子。。。这是第三个句子']),
+    ('这是第一行。\n\n这是第二行。\n这是第三行',
+     ['这是第一行。', '这是第二行。', '这是第三行'],
+     ['这是第一行。', '这是第二行。', '这是第三行'],
+     ['这是第一行。\n\n这是第二行。\n这是第三行']),
+    ('', [], [], ['']),
+    ('   \n\u3000\n', [], [], ['']),
+    ('前言\nPassage 1\n第一篇。\nPASSAGE2 第二篇\npassage\t\n 3 第三篇。',
+     ['前言', 'Passage 1', '第一篇。', 'PASSAGE2 第二篇', 'passage', '3 第三篇。'],
+     ['前言\nPassage 1\n第一篇。', 'PASSAGE2 第二篇\npassage\t\n 3 第三篇。'],
+     ['第一篇。', '第二篇', '第三篇。']),
+    ('Passage 1 Passage 2 只有第二篇',
+     ['Passage 1 Passage 2 只有第二篇'], ['Passage 1 Passage 2 只有第二篇'], ['只有第二篇']),
+    # JS 的 trim 去掉 \ufeff 但保留 \x1c
+    ('\ufeff句子一。\r\n句子二\u3000。\x1c',
+     ['句子一。', '句子二\u3000。\x1c'], ['句子一。', '句子二\u3000。', '\x1c'],
+     ['句子一。\r\n句子二\u3000。\x1c']),
+    ('Passage ١ 阿拉伯数字不算标记',
+     ['Passage ١ 阿拉伯数字不算标记'], ['Passage ١ 阿拉伯数字不算标记'], ['Passage ١ 阿拉伯数字不算标记']),
+]
+
+
+@pytest.mark.parametrize('text, by_line, by_period, passages', CASES)
+def test_fixed_cases(text, by_line, by_period, passages):
+    assert split_chinese_sentences(text) == {'byLine': by_line, 'byPeriod': by_period}
+    assert split_by_passage(text) == passages
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7])
+def test_streamed_chunks_match_whole_text(chunk_size):
+    for text in PARITY_CASES + _random_texts(200):
+        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        assert list(iter_line_sentences(chunks)) == list(iter_line_sentences(text)), repr(text)
+        assert list(iter_period_sentences(chunks)) == list(iter_period_sentences(text)), repr(text)
+        assert list(iter_passages(chunks)) == list(iter_passages(text)), repr(text)
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 运行 script.js')
+def test_parity_with_script_js():
+    texts = PARITY_CASES + _random_texts(500)
+    reference = _run_js_reference(texts, os.path.join(ROOT, 'script.js'))
+    for text, expected in zip(texts, reference):
+        assert split_chinese_sentences(text) == expected['sentences'], repr(text)
+        assert split_by_passage(text) == expected['passages'], repr(text)
@@ -0,0 +1,22 @@
+import pytest
+
+from text_normalization import TextNormalizer
+
+
+@pytest.mark.parametrize('text, key', [
+    ('Ｈｅｌｌｏ，ｗｏｒｌｄ！', 'Hello,world!'),
+    ('cafe\u0301', 'caf\u00e9'),
+    ('  Apple\u3000 ', 'apple'),
+])
+def test_non_cjk_folds_width_and_composition(text, key):
+    assert TextNormalizer().normalize(text, 'en', 'zh') == key
+
+
+@pytest.mark.parametrize('text', ['① item', 'x² + y²', 'ﬁle'])
+def test_non_cjk_keeps_compatibility_characters(text):
+    # NFKC 会把这些折叠成 1、x2、fi，与不同的原文共用一条缓存
+    assert TextNormalizer().normalize(text, 'en', 'zh') == text
+
+
+def test_cjk_keeps_fullwidth_punctuation():
+    assert TextNormalizer().normalize('ＡＢ你好，', 'zh', 'en') == 'ab你好，'
@@ -0,0 +1,74 @@
+import threading
+import time
+
+from request_deadline import DeadlineExceededError
+from translation_batching import MicroBatcher
+
+
+class Throttled(Exception):
+    pass
+
+
+def make_batcher(delay):
+    calls = []
+
+    def send(texts, source, target, deadline):
+        calls.append(list(texts))
+        time.sleep(delay)
+        return [text.upper() for text in texts], 'r1', 1
+    return MicroBatcher(send, max_window_ms=5, max_batch=8), calls
+
+
+def run_in_thread(func):
+    result = {}
+
+    def run():
+        try:
+            result['value'] = func()
+        except Exception as e:
+            result['error'] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, result
+
+
+def slow_acquire(delay, error=None):
+    def acquire():
+        time.sleep(delay)
+        if error is not None:
+            raise error
+    return acquire
+
+
+def test_concurrent_texts_share_one_call():
+    batcher, calls = make_batcher(0.05)
+    leader, leader_result = run_in_thread(lambda: batcher.submit('a', 'en', 'zh', acquire=slow_acquire(0.1)))
+    time.sleep(0.03)
+    assert batcher.submit('b', 'en', 'zh')[0] == 'B'
+    leader.join()
+    assert leader_result['value'][0] == 'A'
+    assert calls == [['a', 'b']]
+
+
+def test_leader_keeps_its_own_deadline():
+    batcher, calls = make_batcher(0.6)
+    start = time.monotonic()
+    leader, leader_result = run_in_thread(lambda: batcher.submit(
+        'a', 'en', 'zh', start + 0.3, acquire=slow_acquire(0.1)))
+    time.sleep(0.03)
+    assert batcher.submit('b', 'en', 'zh', start + 5)[0] == 'B'
+    leader.join()
+    assert isinstance(leader_result['error'], DeadlineExceededError)
+    assert calls == [['a', 'b']]
+
+
+def test_leader_queue_failure_does_not_fail_members():
+    batcher, calls = make_batcher(0)
+    leader, leader_result = run_in_thread(lambda: batcher.submit(
+        'a', 'en', 'zh', acquire=slow_acquire(0.1, Throttled('busy'))))
+    time.sleep(0.03)
+    assert batcher.submit('b', 'en', 'zh', acquire=slow_acquire(0))[0] == 'B'
+    leader.join()
+    assert isinstance(leader_result['error'], Throttled)
+    assert calls == [['b']]
+
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+import translation_evaluation
+from request_deadline import DeadlineExceededError
+from translation_evaluation import TranslationEvaluator, overlap_counts, sentence_score, similarity_base
+
+WORDS = ['the', 'a', 'student', 'went', 'to', 'school', 'library', 'and', 'read', 'book', 'x']
+
+
+def random_sentences(rng, count):
+    return [[rng.choice(WORDS) for _ in range(rng.randint(0, 12))] for _ in range(count)]
+
+
+@pytest.mark.skipif(translation_evaluation._load_numpy() is None, reason='需要 numpy')
+def test_numpy_overlap_matches_counter_path(monkeypatch):
+    rng = random.Random(7)
+    hypotheses = random_sentences(rng, 300) + [[], ['x'], ['x', 'x', 'x'], ['a', 'a', 'b']]
+    references = random_sentences(rng, 300) + [['x'], [], ['x', 'x'], ['a', 'b', 'a', 'b']]
+    vectorised = overlap_counts(hypotheses, references)
+    monkeypatch.setattr(translation_evaluation, 'numpy', None)
+    assert vectorised == overlap_counts(hypotheses, references)
+    assert vectorised[-4:] == [(0, 0), (0, 0), (2, 1), (3, 1)]
+
+
+def pairs(count):
+    return [{'chinese': '我昨天去了图书馆。', 'translation': 'I went to the library yesterday.'}
+            for _ in range(count)]
+
+
+def test_auto_references_are_capped():
+    calls = []
+
+    def reference(chinese):
+        calls.append(chinese)
+        return 'I went to the library yesterday.'
+
+    evaluator = TranslationEvaluator(workers=1, max_references=3)
+    stats = evaluator.evaluate(pairs(10), reference=reference)['stats']
+    assert len(calls) == 3
+    assert (stats['references'], stats['references_skipped'], stats['partial']) == (3, 7, True)
+
+
+def test_deadline_stops_fetching_references():
+    calls = []
+
+    def reference(chinese):
+        calls.append(chinese)
+        raise DeadlineExceededError('翻译超时')
+
+    evaluator = TranslationEvaluator(workers=1, reference_concurrency=1)
+    stats = evaluator.evaluate(pairs(5), reference=reference)['stats']
+    assert len(calls) == 1
+    assert (stats['reference_failures'], stats['references_skipped']) == (0, 5)
+
+
+def test_sentences_without_reference_use_the_same_scale():
+    evaluator = TranslationEvaluator(workers=1)
+    mixed = pairs(2)
+    mixed[0]['reference'] = 'Yesterday she visited a museum with friends.'
+    result = evaluator.evaluate(mixed)
+    referenced, unreferenced = result['detailedErrors']
+    assert referenced['similarity'] is not None and unreferenced['similarity'] is None
+    # 没有参考译文的句子按有参考译文句子的平均重合度计分，而不是从100分起扣
+    base = similarity_base(referenced['similarity'])
+    assert base < 100
+    assert unreferenced['sentenceScore'] == sentence_score(base, unreferenced['errors'])
+    assert result['stats']['partial'] is True
+    rules_only = evaluator.evaluate(pairs(2))
+    assert rules_only['stats']['partial'] is False
+    assert rules_only['score'] > result['score']
@@ -0,0 +1,123 @@
+import threading
+import time
+import urllib.error
+
+import pytest
+
+from request_deadline import DeadlineExceededError
+from upstream_regions import FAILURE_THRESHOLD, RegionEndpoint, RegionRouter, UpstreamError
+
+
+def make_router(*regions, **kwargs):
+    kwargs.setdefault('timeout', 2.0)
+    kwargs.setdefault('hedge_max_chars', 50)
+    kwargs.setdefault('hedge_delay', 0.05)
+    return RegionRouter([RegionEndpoint(region, f'http://{region}.invalid/') for region in regions], **kwargs)
+
+
+def make_send(behaviour):
+    """behaviour: 区域 -> (延迟秒数, 异常或 None)；返回 send 和记录调用顺序的列表"""
+    calls = []
+    lock = threading.Lock()
+
+    def send(endpoint, timeout):
+        with lock:
+            calls.append(endpoint.region)
+        delay, error = behaviour[endpoint.region]
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return endpoint.region
+    return send, calls
+
+
+def test_fails_over_to_next_region():
+    router = make_router('a', 'b')
+    send, calls = make_send({'a': (0, urllib.error.URLError('down')), 'b': (0, None)})
+    value, endpoint, sent = router.call(send)
+    assert (value, endpoint.region, sent) == ('b', 'b', 2)
+    assert calls == ['a', 'b']
+    regions = {region['region']: region for region in router.stats()['regions']}
+    assert regions['a']['failures'] == 1
+    assert regions['b']['failures'] == 0
+
+
+def test_request_errors_do_not_fail_over():
+    router = make_router('a', 'b')
+    send, calls = make_send({'a': (0, UpstreamError('InvalidParameter', 'bad')), 'b': (0, None)})
+    with pytest.raises(UpstreamError):
+        router.call(send)
+    assert calls == ['a']
+
+
+def test_open_breaker_moves_region_to_the_back():
+    router = make_router('a', 'b')
+    send, _ = make_send({'a': (0, urllib.error.URLError('down')), 'b': (0, None)})
+    for _ in range(FAILURE_THRESHOLD):
+        router.call(send)
+    assert [endpoint.region for endpoint in router.ranked()] == ['b', 'a']
+    send, calls = make_send({'a': (0, None), 'b': (0, None)})
+    assert router.call(send)[1].region == 'b'
+    assert calls == ['b']
+
+
+def test_all_regions_failing_raises_last_error():
+    router = make_router('a', 'b')
+    send, calls = make_send({'a': (0, urllib.error.URLError('a down')),
+                             'b': (0, urllib.error.URLError('b down'))})
+    with pytest.raises(urllib.error.URLError, match='b down'):
+        router.call(send)
+    assert calls == ['a', 'b']
+
+
+def test_hedges_slow_first_region():
+    router = make_router('slow', 'fast')
+    send, calls = make_send({'slow': (0.5, None), 'fast': (0, None)})
+    start = time.monotonic()
+    value, endpoint, sent = router.call(send, hedge=True)
+    assert time.monotonic() - start < 0.4
+    assert (value, sent) == ('fast', 2)
+    assert calls == ['slow', 'fast']
+    stats = router.stats()
+    assert (stats['hedged_requests'], stats['hedge_wins']) == (1, 1)
+
+
+def test_no_hedge_waits_for_first_region():
+    router = make_router('slow', 'fast')
+    send, calls = make_send({'slow': (0.2, None), 'fast': (0, None)})
+    value, _, sent = router.call(send, hedge=False)
+    assert (value, sent) == ('slow', 1)
+    assert calls == ['slow']
+    assert router.stats()['hedged_requests'] == 0
+
+
+def test_deadline_stops_waiting():
+    router = make_router('slow', 'fast')
+    send, calls = make_send({'slow': (0.5, None), 'fast': (0.5, None)})
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        router.call(send, deadline=time.monotonic() + 0.1)
+    assert time.monotonic() - start < 0.4
+    assert calls == ['slow']
+    assert router.stats()['deadline_exceeded'] == 1
+
+
+def test_hedge_delay_follows_the_region_being_tried():
+    router = make_router('a', 'b', 'c')
+    a, b, _ = router.endpoints
+    # a 平时很快，b 的 p95 是 400ms；a 失败后改发 b，应按 b 的 p95 等待，而不是 a 的
+    a._latencies.extend([10.0] * 20)
+    b._latencies.extend([400.0] * 20)
+    send, calls = make_send({'a': (0, urllib.error.URLError('down')), 'b': (0.15, None), 'c': (0, None)})
+    value, _, sent = router.call(send, hedge=True)
+    assert (value, sent) == ('b', 2)
+    assert calls == ['a', 'b']
+    assert router.stats()['hedged_requests'] == 0
+
+
+def test_failed_region_ranks_behind_unsampled_region():
+    router = make_router('a', 'b', 'c')
+    send, calls = make_send({'a': (0, urllib.error.URLError('down')), 'b': (0, None), 'c': (0, None)})
+    router.call(send)
+    # a 只失败过一次，没有成功样本，不能与从未尝试过的 c 一样得分为0
+    assert router.ranked()[-1].region == 'a'
@@ -0,0 +1,74 @@
+"""
+文本规范化模块
+把待翻译文本转换为缓存键，使大小写、首尾空白、全角/半角、Unicode 组合形式
+等不影响译文的差异命中同一条缓存；发往腾讯API的仍是原始文本
+"""
+
+import os
+import re
+import unicodedata
+
+# 这些源语言的全角标点（，。！？）本身就是正常书写形式，不能折叠成半角
+CJK_LANGUAGES = {'zh', 'zh-TW', 'ja', 'ko'}
+LOWERCASE_MODES = ('words', 'always', 'never')
+# "words" 模式下只对单词和短语做小写折叠，与前端 getChineseDefinition 的缓存规则一致
+MAX_PHRASE_WORDS = 4
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_SENTENCE_PUNCTUATION_RE = re.compile(r'[.!?;:。！？；：]')
+# 全角数字和字母 ０-９ Ａ-Ｚ ａ-ｚ
+_FULLWIDTH_ALNUM = {
+    code: code - 0xFEE0
+    for start, end in ((0xFF10, 0xFF19), (0xFF21, 0xFF3A), (0xFF41, 0xFF5A))
+    for code in range(start, end + 1)
+}
+# 其他源语言再加上全角 ASCII 标点 ！-～，全角空格由空白折叠处理
+_FULLWIDTH_ASCII = {code: code - 0xFEE0 for code in range(0xFF01, 0xFF5F)}
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() not in ('0', 'false', 'off', 'no')
+
+
+class TextNormalizer:
+    """按语言对生成缓存键"""
+
+    def __init__(self, enabled: bool = True, lowercase: str = 'words'):
+        if lowercase not in LOWERCASE_MODES:
+            raise ValueError(f'不支持的小写折叠方式: {lowercase}')
+        self.enabled = enabled
+        self.lowercase = lowercase
+
+    @classmethod
+    def from_env(cls) -> 'TextNormalizer':
+        lowercase = os.getenv('TEXT_NORMALIZATION_LOWERCASE', 'words').strip().lower()
+        if lowercase not in LOWERCASE_MODES:
+            lowercase = 'words'
+        return cls(_env_flag('TEXT_NORMALIZATION', True), lowercase)
+
+    def _should_lowercase(self, text: str) -> bool:
+        if self.lowercase == 'always':
+            return True
+        if self.lowercase == 'never':
+            return False
+        return (text.count(' ') < MAX_PHRASE_WORDS
+                and not _SENTENCE_PUNCTUATION_RE.search(text))
+
+    def normalize(self, text: str, source: str, target: str) -> str:
+        if not self.enabled:
+            return text
+
+        if source in CJK_LANGUAGES or source == 'auto':
+            # 只做等价组合形式和全角字母数字的折叠，保留全角标点
+            text = unicodedata.normalize('NFC', text).translate(_FULLWIDTH_ALNUM)
+        else:
+            # 不用 NFKC：它会把 ①、x²、ﬁ 这类有意义的字符折叠成普通字母数字，使不同原文共用一条缓存
+            text = unicodedata.normalize('NFC', text).translate(_FULLWIDTH_ASCII)
+
+        text = _WHITESPACE_RE.sub(' ', text).strip()
+        if self._should_lowercase(text):
+            text = text.lower()
+        return text
@@ -3,21 +3,43 @@
 
 import hashlib
 import hmac
-import json
+import json_codec
 import time
 import sys
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import os
+from http.server import BaseHTTPRequestHandler
 import urllib.request
 import urllib.error
+from urllib.parse import parse_qs
+from request_body import read_request_body, RequestBodyError
+from translation_cache import TranslationCache, CachedResponse
+from translation_jobs import TranslationJobQueue, JobQueueFullError, parse_job_request, get_max_document_size
+from cache_prewarm import CachePrewarmer, parse_prewarm_args
+from request_tracing import RequestTracer, current_trace, span
+from admin_auth import is_admin_request
+from sampling_profiler import run_profile_request
+from server_lifecycle import DrainingHTTPServer, GracefulShutdown
+from health_checks import ReadinessCheck, UpstreamProbe
+from client_quotas import FairScheduler, ThrottledError
+from usage_accounting import UsageTracker, BudgetExhaustedError, parse_usage_days
+from upstream_regions import RegionRouter, UpstreamError
+from request_deadline import DeadlineExceededError, parse_deadline
+from translation_batching import MicroBatcher
+from translation_memory import TranslationMemory, client_match
+from offline_dictionary import OfflineDictionary, dictionary_response
+from translation_evaluation import TranslationEvaluator, parse_evaluation_request
+from llm_evaluation import LLMEvaluationRelay, LLMRelayError, client_api_key, parse_llm_request
+from multiplex_channel import MultiplexChannel, websocket_handshake
 
 sys.stdout.reconfigure(line_buffering=True)
 
 DEBUG_FILE = 'debug.log'
 
 def debug_log(message):
-    with open(DEBUG_FILE, 'a', encoding='utf-8') as f:
-        f.write(message + '\n')
-    print(message)
+    with span('debug_log'):
+        with open(DEBUG_FILE, 'a', encoding='utf-8') as f:
+            f.write(message + '\n')
+        print(message)
 
 class TencentTranslationProxy:
     def __init__(self):
@@ -31,11 +53,20 @@ class TencentTranslationProxy:
                 '或在 .env 文件中配置这些变量'
             )
         
-        self.endpoint = 'tmt.tencentcloudapi.com'
         self.service = 'tmt'
         self.version = '2018-03-21'
-        self.region = 'ap-guangzhou'
         self.action = 'TextTranslate'
+        self.cache = TranslationCache()
+        self.scheduler = FairScheduler.from_env()
+        self.usage = UsageTracker.from_env()
+        self.router = RegionRouter.from_env()
+        self.batcher = MicroBatcher(self._call_upstream)
+        self.cache.refresher = self._translate_upstream
+        self.memory = TranslationMemory()
+        self.dictionary = OfflineDictionary()
+        self.evaluator = TranslationEvaluator()
+        self.llm = LLMEvaluationRelay()
+        self.channel = MultiplexChannel(self)
     
     def sha256_hex(self, s):
         if isinstance(s, bytes):
@@ -67,16 +98,16 @@ class TencentTranslationProxy:
             else:
                 return hmac.new(key.encode('utf-8'), msg.encode('utf-8'), hashlib.sha256).hexdigest()
     
-    def generate_signature(self, payload):
+    def generate_signature(self, payload_bytes, host='tmt.tencentcloudapi.com'):
         timestamp = int(time.time())
         date = time.strftime('%Y-%m-%d', time.gmtime(timestamp))
         
         http_request_method = 'POST'
         canonical_uri = '/'
         canonical_query_string = ''
-        canonical_headers = 'content-type:application/json\nhost:tmt.tencentcloudapi.com\n'
+        canonical_headers = 'content-type:application/json\nhost:' + host + '\n'
         signed_headers = 'content-type;host'
-        hashed_request_payload = self.sha256_hex(json.dumps(payload, separators=(',', ':')))
+        hashed_request_payload = self.sha256_hex(payload_bytes)
         
         canonical_request = (http_request_method + '\n' +
                             canonical_uri + '\n' +
@@ -116,86 +147,517 @@ class TencentTranslationProxy:
         
         return authorization, timestamp
     
-    def translate(self, text, source='en', target='zh'):
-        try:
-            debug_log(f'开始翻译: text={text}, source={source}, target={target}')
-            authorization, timestamp = self.generate_signature({
-                'SourceText': text,
+    def _post(self, endpoint, payload_bytes, timeout, action=None):
+        """向一个区域发送已序列化的请求体，由 RegionRouter 在工作线程中调用"""
+        authorization, timestamp = self.generate_signature(payload_bytes, endpoint.host)
+        headers = {
+            'Authorization': authorization,
+            'Content-Type': 'application/json',
+            'Host': endpoint.host,
+            'X-TC-Action': action or self.action,
+            'X-TC-Timestamp': str(timestamp),
+            'X-TC-Version': self.version,
+            'X-TC-Region': endpoint.region
+        }
+        
+        debug_log(f'发送请求到: {endpoint.url}')
+        debug_log(f'请求头: {headers}')
+        debug_log(f'请求体: {payload_bytes.decode("utf-8")}')
+        
+        req = urllib.request.Request(endpoint.url, data=payload_bytes, headers=headers)
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.read()
+    
+    def _call_upstream(self, texts, source, target, deadline=None):
+        """
+        发送一次上游请求，由 MicroBatcher 调用；多条文本使用 TextTranslateBatch
+        返回 (译文列表, 区域, 发出的请求数)
+        """
+        batch = len(texts) > 1
+        if batch:
+            payload = {
+                'SourceTextList': texts,
                 'Source': source,
                 'Target': target,
                 'ProjectId': 0
-            })
-            
-            url = 'https://' + self.endpoint + '/'
-            headers = {
-                'Authorization': authorization,
-                'Content-Type': 'application/json',
-                'Host': self.endpoint,
-                'X-TC-Action': self.action,
-                'X-TC-Timestamp': str(timestamp),
-                'X-TC-Version': self.version,
-                'X-TC-Region': self.region
             }
-            
+        else:
             payload = {
-                'SourceText': text,
+                'SourceText': texts[0],
                 'Source': source,
                 'Target': target,
                 'ProjectId': 0
             }
-            
-            debug_log(f'发送请求到: {url}')
-            debug_log(f'请求头: {headers}')
-            debug_log(f'请求体: {json.dumps(payload)}')
-            
-            req = urllib.request.Request(url, data=json.dumps(payload, separators=(',', ':')).encode('utf-8'), headers=headers)
-            
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode('utf-8'))
-                debug_log(f'响应数据: {data}')
-                
-                if 'Response' in data and 'Error' in data['Response']:
-                    raise Exception(data['Response']['Error'].get('Message', '翻译失败'))
-                
-                if 'Response' in data and 'TargetText' in data['Response']:
-                    return data['Response']['TargetText']
-                
-                raise Exception('翻译响应格式错误')
-                
+        # 签名和发送使用同一份序列化结果，保证哈希与请求体一致
+        payload_bytes = json_codec.dumps(payload)
+        action = 'TextTranslateBatch' if batch else self.action
+        
+        try:
+            raw_response, endpoint, sent = self.router.call(
+                lambda endpoint, timeout: self._post(endpoint, payload_bytes, timeout, action),
+                hedge=self.router.should_hedge(''.join(texts)), deadline=deadline)
         except urllib.error.HTTPError as e:
+            # 批内所有请求共用这个异常，响应体只能在这里读取一次
             error_msg = 'HTTP错误: ' + str(e.code)
+            error_code = None
             try:
-                error_data = json.loads(e.read().decode('utf-8'))
+                error_data = json_codec.loads(e.read())
                 debug_log(f'HTTP错误详情: {error_data}')
                 if 'Response' in error_data and 'Error' in error_data['Response']:
                     error_msg = error_data['Response']['Error'].get('Message', error_msg)
+                    error_code = error_data['Response']['Error'].get('Code')
             except:
                 pass
+            if error_code:
+                raise UpstreamError(error_code, error_msg, batch)
             raise Exception(error_msg)
+        
+        data = json_codec.loads(raw_response)
+        debug_log(f'响应数据({endpoint.region}): {data}')
+        
+        if 'Response' in data and 'Error' in data['Response']:
+            error = data['Response']['Error']
+            raise UpstreamError(error.get('Code', ''), error.get('Message', '翻译失败'), batch)
+        
+        if batch and 'Response' in data and 'TargetTextList' in data['Response']:
+            results = data['Response']['TargetTextList']
+            if len(results) == len(texts):
+                return results, endpoint, sent
+        if not batch and 'Response' in data and 'TargetText' in data['Response']:
+            return [data['Response']['TargetText']], endpoint, sent
+        
+        raise Exception('翻译响应格式错误')
+    
+    def _stale_fallback(self, text, source, target, error):
+        """截止时间已到：有过期缓存时返回过期结果，否则抛出原来的 DeadlineExceededError"""
+        trace = current_trace()
+        if trace is not None:
+            trace.deadline_missed = True
+        stale = self.cache.get_stale(text, source, target)
+        if stale is None:
+            debug_log(f'翻译超时且没有可用缓存: text={text[:50]}')
+            raise error
+        if trace is not None:
+            trace.served_stale = True
+        debug_log(f'翻译超时，返回过期缓存: text={text[:50]}')
+        return stale
+    
+    def cached_response(self, text, source='en', target='zh', client=None):
+        """精确缓存命中时返回预先序列化的响应，记账与 translate 的命中路径相同；未命中返回 None，调用方再走 translate"""
+        with span('cache'):
+            response = self.cache.get_response(text, source, target)
+        if response is None:
+            return None
+        self.scheduler.note_request(client)
+        debug_log(f'缓存命中: text={text}, source={source}, target={target}')
+        self.usage.record_cached(source, target, len(text))
+        return response
+    
+    def translate(self, text, source='en', target='zh', client=None, deadline=None):
+        self.scheduler.note_request(client)
+        with span('cache'):
+            cached = self.cache.get(text, source, target)
+            negative = self.cache.get_error(text, source, target) if cached is None else None
+        if cached is not None:
+            debug_log(f'缓存命中: text={text}, source={source}, target={target}')
+            self.usage.record_cached(source, target, len(text))
+            return cached
+        if negative is not None:
+            debug_log(f'命中错误缓存: text={text}, code={negative[0]}')
+            raise UpstreamError(*negative)
+        
+        with span('memory'):
+            fuzzy = self.memory.lookup(text, source, target)
+        if fuzzy is not None:
+            reuse = self.memory.mode == 'reuse'
+            trace = current_trace()
+            if trace is not None:
+                trace.fuzzy_match = dict(fuzzy, reused=reuse)
+            if reuse:
+                # 复用的译文不写入精确缓存，原句再次出现时仍以自己的译文为准
+                debug_log(f'翻译记忆命中: text={text}, similarity={fuzzy["similarity"]}')
+                self.usage.record_cached(source, target, len(text))
+                return fuzzy['result']
+        
+        return self._translate_upstream(text, source, target, client, deadline)
+    
+    def _translate_upstream(self, text, source, target, client=None, deadline=None):
+        """调用上游并写入缓存；缓存后台刷新也从这里进入，此时 client 为 None，记在 jobs 名下"""
+        self.usage.check_budget(len(text))
+        try:
+            with span('queue'):
+                admitted = self.scheduler.admit(client, len(text), deadline)
+        except DeadlineExceededError as e:
+            return self._stale_fallback(text, source, target, e)
+        try:
+            debug_log(f'开始翻译: text={text}, source={source}, target={target}')
+            with span('upstream'):
+                # 上游调用名额只由批的发起者排队占用，加入别人批次的请求不再排队
+                result, endpoint, sent = self.batcher.submit(
+                    text, source, target, deadline,
+                    lambda: self.scheduler.acquire_slot(admitted, deadline), self.scheduler.release)
+            
+            # 对冲请求同样计费
+            self.usage.record_upstream(source, target, len(text), calls=sent)
+            self.cache.set(text, source, target, result)
+            self.memory.add(text, source, target, result)
+            return result
+            
+        except DeadlineExceededError as e:
+            # 已发出的请求仍可能被上游计费，这里按失败调用记录
+            self.usage.record_upstream(source, target, len(text), ok=False)
+            return self._stale_fallback(text, source, target, e)
+        except ThrottledError:
+            # 批的发起者排队超时，没有发出上游请求
+            raise
+        except UpstreamError as e:
+            self.usage.record_upstream(source, target, len(text), ok=False)
+            # 合并调用的错误可能只由批内某一条文本引起，不能记到其他文本名下
+            if e.deterministic and not e.batch:
+                self.cache.set_error(text, source, target, e.code, e.message)
+            raise
         except Exception as e:
+            self.usage.record_upstream(source, target, len(text), ok=False)
             debug_log(f'翻译异常: {str(e)}')
             import traceback
             traceback.print_exc()
             raise Exception(str(e))
 
 class TranslationRequestHandler(BaseHTTPRequestHandler):
-    proxy = TencentTranslationProxy()
+    proxy = None
+    job_queue = None
+    prewarmer = None
+    readiness = None
+    tracer = RequestTracer()
+    
+    cors_headers = (
+        ('Access-Control-Allow-Origin', '*'),
+        ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+        ('Access-Control-Allow-Headers', 'Content-Type, X-Client-Token, X-Deadline-Ms, X-LLM-Key, If-None-Match'),
+        ('Access-Control-Expose-Headers', 'X-Request-ID, Retry-After, ETag'),
+    )
+    cors_header_bytes = ''.join(f'{name}: {value}\r\n' for name, value in cors_headers).encode('ascii')
     
     def _set_cors_headers(self):
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        for name, value in self.cors_headers:
+            self.send_header(name, value)
+    
+    def end_headers(self):
+        trace = current_trace()
+        if trace is not None:
+            self.send_header('X-Request-ID', trace.request_id)
+        super().end_headers()
+    
+    def log_request(self, code='-', size='-'):
+        trace = current_trace()
+        if trace is not None:
+            trace.status = int(code) if isinstance(code, int) else code
+    
+    def _send_json(self, status, data, headers=None):
+        body = json_codec.dumps(data)
+        self.send_response(status)
+        self._set_cors_headers()
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_cached(self, response):
+        """
+        写出预先序列化的翻译响应：状态行、响应头和响应体拼好后一次写出，不经过 send_header 和 JSON 序列化；
+        GET/HEAD 请求的 If-None-Match 与 ETag 相同时返回不带响应体的304，POST 忽略该请求头
+        """
+        if self.command in ('GET', 'HEAD') and response.matches(self.headers.get('If-None-Match')):
+            status, head, body = 304, b'ETag: ' + response.etag.encode('ascii') + b'\r\n', b''
+        else:
+            status, head, body = 200, response.header, response.body
+        self.log_request(status)
+        trace = current_trace()
+        request_id = b'X-Request-ID: ' + trace.request_id.encode('ascii') + b'\r\n' if trace is not None else b''
+        self.wfile.write(b''.join((
+            self.protocol_version.encode('ascii'), b' 200 OK\r\n' if status == 200 else b' 304 Not Modified\r\n',
+            b'Server: ', self.version_string().encode('ascii'), b'\r\nDate: ',
+            self.date_time_string().encode('ascii'), b'\r\n', self.cors_header_bytes, head, request_id,
+            b'\r\n', body)))
+    
+    def _send_translation(self, text, source, target, deadline):
+        client = self.proxy.scheduler.identify(self)
+        cached = self.proxy.cached_response(text, source, target, client)
+        if cached is not None:
+            self._send_cached(cached)
+            return
+        
+        with span('translate'):
+            result = self.proxy.translate(text, source, target, client, deadline)
+        
+        response = {'result': result}
+        if current_trace().served_stale:
+            response['stale'] = True
+        if current_trace().fuzzy_match is not None:
+            response['fuzzy'] = client_match(current_trace().fuzzy_match)
+        if len(response) == 1:
+            # 普通结果同样带 ETag，浏览器下次可以直接重新验证
+            self._send_cached(CachedResponse(result))
+        else:
+            self._send_json(200, response)
+    
+    def _send_translate_error(self, e):
+        if isinstance(e, ThrottledError):
+            debug_log('请求被限流: ' + str(e))
+            self._send_json(429, {'error': str(e)}, {'Retry-After': str(max(1, round(e.retry_after)))})
+        elif isinstance(e, BudgetExhaustedError):
+            self._send_json(503, {'error': str(e), 'cache_only': True})
+        elif isinstance(e, DeadlineExceededError):
+            self._send_json(504, {'error': str(e), 'deadline_exceeded': True})
+        elif isinstance(e, UpstreamError):
+            if e.deterministic:
+                self._send_json(400, {'error': e.message, 'code': e.code})
+            else:
+                self._send_json(500, {'error': e.message})
+        else:
+            debug_log('翻译错误: ' + str(e))
+            import traceback
+            traceback.print_exc()
+            self._send_json(500, {'error': str(e)})
+    
+    def _handle_translate_get(self):
+        """GET /translate?text=...&source=...&target=...，不需要 CORS 预检，浏览器可以缓存并用 ETag 重新验证"""
+        trace = self.tracer.start(self.command, self.path, self.headers.get('X-Request-ID'))
+        try:
+            params = parse_qs(self.path.split('?', 1)[1] if '?' in self.path else '')
+            text = params.get('text', [''])[0]
+            source = params.get('source', ['en'])[0]
+            target = params.get('target', ['zh'])[0]
+            # 截止时间可以放在查询参数里，避免自定义请求头触发预检
+            deadline = parse_deadline({'X-Deadline-Ms': params.get('deadline_ms', [None])[0] or
+                                       self.headers.get('X-Deadline-Ms')})
+            debug_log(f'收到翻译请求: text={text}, source={source}, target={target}')
+            if not text.strip():
+                self._send_json(400, {'error': '缺少翻译文本'})
+                return
+            self._send_translation(text, source, target, deadline)
+        except Exception as e:
+            self._send_translate_error(e)
+        finally:
+            self.tracer.finish(trace)
     
     def do_OPTIONS(self):
         self.send_response(200)
         self._set_cors_headers()
         self.end_headers()
     
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/health':
+            if self.server.draining:
+                self._send_json(503, {'status': 'draining'})
+            else:
+                self._send_json(200, {'status': 'ok'})
+        elif path == '/health/live':
+            self._send_json(200, {'status': 'alive'})
+        elif path == '/health/ready':
+            if self.readiness is None:
+                self._send_json(503, {'status': 'not_ready'})
+            else:
+                ready, report = self.readiness.evaluate(self.server)
+                self._send_json(200 if ready else 503, report)
+        elif path == '/cache/stats':
+            self._send_json(200, {
+                'cache': self.proxy.cache.stats(),
+                'memory': self.proxy.memory.stats(),
+                'dictionary': self.proxy.dictionary.stats(),
+                'prewarm': self.prewarmer.status() if self.prewarmer else None
+            })
+        elif path == '/channel':
+            self._handle_channel()
+        elif path == '/translate':
+            self._handle_translate_get()
+        elif path == '/dictionary':
+            query = self.path.split('?', 1)[1] if '?' in self.path else ''
+            with span('dictionary'):
+                status, data = dictionary_response(self.proxy.dictionary, query)
+            # 词典内容只在重新编译时变化，浏览器可以缓存查询结果
+            self._send_json(status, data, {'Cache-Control': 'public, max-age=86400'} if status == 200 else None)
+        elif path == '/admin/profile':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            query = self.path.split('?', 1)[1] if '?' in self.path else ''
+            status, content_type, body = run_profile_request(query)
+            self.send_response(status)
+            self._set_cors_headers()
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif path == '/admin/clients':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            self._send_json(200, self.proxy.scheduler.stats())
+        elif path == '/admin/usage':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            query = self.path.split('?', 1)[1] if '?' in self.path else ''
+            self._send_json(200, self.proxy.usage.report(parse_usage_days(query)))
+        elif path == '/admin/upstreams':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            self._send_json(200, self.proxy.router.stats())
+        elif path == '/admin/batching':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            self._send_json(200, self.proxy.batcher.stats())
+        elif path == '/admin/evaluation':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            self._send_json(200, self.proxy.evaluator.stats())
+        elif path == '/admin/llm':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            self._send_json(200, self.proxy.llm.stats())
+        elif path == '/admin/channel':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            self._send_json(200, self.proxy.channel.stats())
+        elif path == '/admin/slow-requests':
+            if not is_admin_request(self):
+                self._send_json(403, {'error': '无权访问'})
+                return
+            self._send_json(200, {
+                'stats': self.tracer.stats(),
+                'requests': self.tracer.recent_slow()
+            })
+        elif path.startswith('/jobs/') and self.job_queue is not None:
+            job = self.job_queue.get(path[len('/jobs/'):])
+            if job is None:
+                self._send_json(404, {'error': '任务不存在'})
+            else:
+                self._send_json(200, job.to_status())
+        else:
+            self.send_response(404)
+            self._set_cors_headers()
+            self.end_headers()
+    
+    def _handle_job_submit(self, data):
+        if self.job_queue is None:
+            self._send_json(404, {'error': '预翻译任务未启用'})
+            return
+        try:
+            text, source, target, mode = parse_job_request(data)
+            job = self.job_queue.submit_document(text, source, target, mode)
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except JobQueueFullError as e:
+            self._send_json(503, {'error': str(e)})
+            return
+        self._send_json(202, job.to_status())
+    
+    def _handle_evaluate(self, data, deadline):
+        try:
+            pairs, mode, auto_reference = parse_evaluation_request(data)
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        reference = None
+        if auto_reference:
+            # 参考译文走普通翻译路径（缓存、配额、微批处理），每次最多 EVALUATION_MAX_REFERENCES 句
+            client = self.proxy.scheduler.identify(self)
+            reference = lambda chinese: self.proxy.translate(chinese, 'zh', 'en', client, deadline)
+        with span('evaluate'):
+            result = self.proxy.evaluator.evaluate(pairs, mode, reference)
+        self._send_json(200, result)
+
+    def _handle_llm_evaluate(self, data):
+        try:
+            chinese, translation, stream = parse_llm_request(data)
+            if not stream:
+                with span('llm_evaluate'):
+                    result = self.proxy.llm.complete(chinese, translation, client_api_key(self.headers))
+                self._send_json(200, result)
+                return
+            # 等到第一个片段再发送响应头，生成前就出错时仍能返回对应的状态码
+            with span('llm_first_chunk'):
+                events = self.proxy.llm.open_stream(chinese, translation, client_api_key(self.headers))
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except LLMRelayError as e:
+            self._send_json(e.status, {'error': e.message})
+            return
+        self.send_response(200)
+        self._set_cors_headers()
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            with span('llm_stream'):
+                for event in events:
+                    self.wfile.write(event)
+                    self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            debug_log('LLM评估事件流的客户端已断开')
+
+    def _handle_channel(self):
+        connection = websocket_handshake(self)
+        if connection is None:
+            self._send_json(400, {'error': '需要 WebSocket 升级请求'})
+            return
+        # 连接在这个线程中一直保持到客户端断开；服务器关闭时处理完已收到的请求再断开
+        with self.server.upgraded():
+            self.proxy.channel.serve(connection, self.proxy.scheduler.identify(self), self.tracer,
+                                     lambda: self.server.draining)
+    
     def do_POST(self):
+        trace = self.tracer.start(self.command, self.path, self.headers.get('X-Request-ID'))
         try:
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
+            self._handle_post()
+        finally:
+            self.tracer.finish(trace)
+    
+    def _handle_post(self):
+        path = self.path.split('?', 1)[0]
+        # 截止时间从收到请求时算起，读取请求体和解密的时间也计算在内
+        deadline = parse_deadline(self.headers)
+        if path == '/jobs' and not is_admin_request(self):
+            # 预翻译任务消耗上游配额，只允许管理员提交；没有读取请求体，不能复用连接
+            self.close_connection = True
+            self._send_json(403, {'error': '无权访问'})
+            return
+        try:
+            try:
+                max_size = get_max_document_size() if path == '/jobs' else None
+                with span('read_body'):
+                    post_data = read_request_body(self, max_size)
+            except RequestBodyError as e:
+                debug_log(f'请求体读取失败: {e.message}')
+                self.close_connection = True
+                self._send_json(e.status, {'error': e.message})
+                return
+            
+            data = json_codec.loads(post_data)
+            
+            if path == '/jobs':
+                self._handle_job_submit(data)
+                return
+            
+            if path == '/evaluate':
+                self._handle_evaluate(data, deadline)
+                return
+            
+            if path == '/llm/evaluate':
+                self._handle_llm_evaluate(data)
+                return
             
             text = data.get('text', '')
             source = data.get('source', 'en')
@@ -203,40 +665,45 @@ class TranslationRequestHandler(BaseHTTPRequestHandler):
             
             debug_log(f'收到翻译请求: text={text}, source={source}, target={target}')
             
-            if not text:
-                self.send_response(400)
-                self._set_cors_headers()
-                self.send_header('Content-Type', 'application/json; charset=utf-8')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': '缺少翻译文本'}).encode('utf-8'))
+            if not text.strip():
+                self._send_json(400, {'error': '缺少翻译文本'})
                 return
             
-            result = self.proxy.translate(text, source, target)
-            
-            self.send_response(200)
-            self._set_cors_headers()
-            self.send_header('Content-Type', 'application/json; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(json.dumps({'result': result}).encode('utf-8'))
+            self._send_translation(text, source, target, deadline)
             
         except Exception as e:
-            debug_log('翻译错误: ' + str(e))
-            import traceback
-            traceback.print_exc()
-            self.send_response(500)
-            self._set_cors_headers()
-            self.send_header('Content-Type', 'application/json; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': str(e)}).encode('utf-8'))
+            self._send_translate_error(e)
     
     def log_message(self, format, *args):
         pass
 
-def run_proxy_server(port=8002):
+def run_proxy_server(port=8002, prewarm=None):
     server_address = ('', port)
-    httpd = HTTPServer(server_address, TranslationRequestHandler)
+    httpd = DrainingHTTPServer(server_address, TranslationRequestHandler)
+    # 代理在这里而不是导入时创建：评估进程池以 spawn 方式启动，工作进程会重新导入本脚本
+    proxy = TranslationRequestHandler.proxy = TencentTranslationProxy()
+    TranslationRequestHandler.job_queue = TranslationJobQueue.from_env(proxy.translate, proxy.cache.contains)
+    TranslationRequestHandler.job_queue.start()
+    if prewarm:
+        TranslationRequestHandler.prewarmer = CachePrewarmer(TranslationRequestHandler.job_queue, proxy.cache)
+        TranslationRequestHandler.prewarmer.start(**prewarm)
+    proxy.usage.start()
+    probe = UpstreamProbe(proxy.router.endpoints[0].url)
+    probe.start()
+    TranslationRequestHandler.readiness = ReadinessCheck(proxy.cache, TranslationRequestHandler.job_queue, probe)
     print('翻译代理服务器运行在 http://localhost:' + str(port))
-    httpd.serve_forever()
+    shutdown = GracefulShutdown(httpd)
+    shutdown.add_cleanup(TranslationRequestHandler.job_queue.stop)
+    shutdown.add_cleanup(probe.stop)
+    shutdown.add_cleanup(proxy.usage.stop)
+    shutdown.add_cleanup(proxy.evaluator.stop)
+    shutdown.add_cleanup(proxy.llm.stop)
+    shutdown.add_cleanup(proxy.channel.stop)
+    shutdown.serve_forever()
 
 if __name__ == '__main__':
-    run_proxy_server()
+    port = 8002
+    for arg in sys.argv:
+        if arg.startswith('--port='):
+            port = int(arg.split('=')[1])
+    run_proxy_server(port, prewarm=parse_prewarm_args(sys.argv))
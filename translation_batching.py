@@ -0,0 +1,304 @@
+"""
+翻译微批处理模块
+单词卡片查询大多是很短的单条文本，同一语言对的并发请求在几毫秒的窗口内合并，
+用一次 TextTranslateBatch 调用发往上游，结果再分发给各自等待的请求。
+窗口长度按请求到达间隔调整，空闲时不等待；批大小上限按上游延迟加性增、乘性减
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from request_deadline import DeadlineExceededError, remaining
+from request_tracing import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WINDOW_MS = 5.0
+DEFAULT_MAX_BATCH = 20
+# 腾讯 TextTranslateBatch 要求单次请求的文本总长度低于6000字符
+DEFAULT_MAX_BATCH_CHARS = 2000
+DEFAULT_MAX_ITEM_CHARS = 200
+DEFAULT_TARGET_LATENCY_MS = 800.0
+INITIAL_BATCH_LIMIT = 4
+MIN_BATCH_LIMIT = 2
+GAP_ALPHA = 0.2
+# 批大小直方图的桶上界
+HISTOGRAM_BOUNDS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def _bucket_label(index: int) -> str:
+    upper = HISTOGRAM_BOUNDS[index]
+    lower = HISTOGRAM_BOUNDS[index - 1] + 1 if index else 1
+    return str(upper) if lower == upper else f'{lower}-{upper}'
+
+
+class _Item:
+    def __init__(self, text: str, deadline: Optional[float]):
+        self.text = text
+        self.deadline = deadline
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.endpoint = None
+        self.sent = 0
+        # 合并调用因请求内容出错时，各条文本改为单独发送，找出真正出错的那条
+        self.retry_alone = False
+
+
+class _Batch:
+    def __init__(self, item: _Item):
+        self.items = [item]
+        self.chars = len(item.text)
+        self.full = threading.Event()
+
+
+class _PairState:
+    """一个语言对的到达间隔、当前批大小上限和正在收集的批"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.gap_ms = None
+        self.last_arrival = None
+        self.window_ms = 0.0
+        self.open = None
+
+    def note_arrival(self, now: float) -> None:
+        if self.last_arrival is not None:
+            gap_ms = (now - self.last_arrival) * 1000
+            self.gap_ms = gap_ms if self.gap_ms is None else \
+                GAP_ALPHA * gap_ms + (1 - GAP_ALPHA) * self.gap_ms
+        self.last_arrival = now
+
+
+class MicroBatcher:
+    """
+    合并同一语言对的并发翻译请求
+
+    send(texts, source, target, deadline) 发送一次上游请求，返回 (译文列表, 区域, 发出的请求数)。
+    第一个到达的请求作为批的发起者：等待窗口结束或批满，再用 acquire 取得上游调用名额，
+    排队期间批仍然接受新成员，取得名额后关闭批；之后加入的请求只等待结果，不占用名额。
+    批的截止时间取成员中最晚的一个，多于一条时 send 在单独的线程中执行，
+    包括发起者在内的每个成员只按自己的截止时间等待。发起者排队失败时只有发起者以该错误结束，
+    其余成员按各自的截止时间单独发送。超过 max_item_chars 的文本和 max_batch 不大于1时直接单独发送。
+    """
+
+    def __init__(self, send: Callable, max_window_ms: Optional[float] = None,
+                 max_batch: Optional[int] = None, max_chars: Optional[int] = None,
+                 max_item_chars: Optional[int] = None, target_latency_ms: Optional[float] = None):
+        self.send = send
+        self.max_window_ms = max_window_ms if max_window_ms is not None else \
+            _env_float('BATCH_MAX_WINDOW_MS', DEFAULT_MAX_WINDOW_MS)
+        self.max_batch = max_batch if max_batch is not None else \
+            int(_env_float('BATCH_MAX_SIZE', DEFAULT_MAX_BATCH))
+        self.max_chars = max_chars if max_chars is not None else \
+            int(_env_float('BATCH_MAX_CHARS', DEFAULT_MAX_BATCH_CHARS))
+        self.max_item_chars = max_item_chars if max_item_chars is not None else \
+            int(_env_float('BATCH_MAX_ITEM_CHARS', DEFAULT_MAX_ITEM_CHARS))
+        self.target_latency_ms = target_latency_ms if target_latency_ms is not None else \
+            _env_float('BATCH_TARGET_LATENCY_MS', DEFAULT_TARGET_LATENCY_MS)
+        self._lock = threading.Lock()
+        self._pairs = {}
+        self._histogram = [0] * len(HISTOGRAM_BOUNDS)
+        self._overflow = 0
+        self.upstream_calls = 0
+        self.batched_texts = 0
+        self.unbatched_texts = 0
+        self.window_wait_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch > 1 and self.max_window_ms >= 0
+
+    def _pair(self, source: str, target: str) -> _PairState:
+        # 调用方持有 self._lock
+        pair = self._pairs.get((source, target))
+        if pair is None:
+            pair = self._pairs[(source, target)] = _PairState(min(INITIAL_BATCH_LIMIT, self.max_batch))
+        return pair
+
+    def _window_ms(self, pair: _PairState) -> float:
+        """按平均到达间隔估计凑满一批需要的时间；间隔大于最长窗口时等待也没有意义"""
+        if pair.gap_ms is None or pair.gap_ms > self.max_window_ms:
+            return 0.0
+        return min(self.max_window_ms, pair.gap_ms * (pair.limit - 1))
+
+    def _record_size(self, size: int) -> None:
+        # 调用方持有 self._lock
+        for index, bound in enumerate(HISTOGRAM_BOUNDS):
+            if size <= bound:
+                self._histogram[index] += 1
+                return
+        self._overflow += 1
+
+    def submit(self, text: str, source: str, target: str, deadline: Optional[float] = None,
+               acquire: Optional[Callable[[], object]] = None,
+               release: Optional[Callable[[object], None]] = None):
+        """
+        翻译一条文本，返回 (译文, 区域, 发出的请求数)
+
+        acquire() 返回上游调用名额，调用结束后交给 release；只有批的发起者会调用它们
+        """
+        if not self.enabled or len(text) > self.max_item_chars:
+            return self._send_alone(text, source, target, deadline, acquire, release)
+
+        item = _Item(text, deadline)
+        with self._lock:
+            pair = self._pair(source, target)
+            pair.note_arrival(time.monotonic())
+            batch = pair.open
+            joined = (batch is not None and len(batch.items) < pair.limit
+                      and batch.chars + len(text) <= self.max_chars)
+            if joined:
+                batch.items.append(item)
+                batch.chars += len(text)
+                if len(batch.items) >= pair.limit:
+                    batch.full.set()
+            else:
+                batch = pair.open = _Batch(item)
+                window = pair.window_ms = self._window_ms(pair)
+
+        if not joined:
+            if window > 0:
+                left = remaining(deadline)
+                wait = window / 1000 if left is None else min(window / 1000, max(left, 0))
+                started = time.monotonic()
+                with span('batch_window'):
+                    batch.full.wait(wait)
+                with self._lock:
+                    self.window_wait_ms += (time.monotonic() - started) * 1000
+            self._lead(pair, batch, item, source, target, acquire, release)
+        left = remaining(deadline)
+        if not item.done.wait(max(left, 0) if left is not None else None):
+            raise DeadlineExceededError('翻译超时')
+
+        if item.retry_alone:
+            return self._send_alone(text, source, target, deadline, acquire, release)
+        if item.error is not None:
+            raise item.error
+        return item.result, item.endpoint, item.sent
+
+    def _send_alone(self, text: str, source: str, target: str, deadline: Optional[float],
+                    acquire: Optional[Callable[[], object]],
+                    release: Optional[Callable[[object], None]]):
+        ticket = self._acquire(acquire)
+        try:
+            results, endpoint, sent = self.send([text], source, target, deadline)
+        finally:
+            if release is not None:
+                release(ticket)
+        with self._lock:
+            self.upstream_calls += 1
+            self.unbatched_texts += 1
+        return results[0], endpoint, sent
+
+    def _acquire(self, acquire: Optional[Callable[[], object]]):
+        if acquire is None:
+            return None
+        with span('queue'):
+            return acquire()
+
+    def _close(self, pair: _PairState, batch: _Batch) -> None:
+        with self._lock:
+            if pair.open is batch:
+                pair.open = None
+
+    def _lead(self, pair: _PairState, batch: _Batch, leader: _Item, source: str, target: str,
+              acquire: Optional[Callable[[], object]],
+              release: Optional[Callable[[object], None]]) -> None:
+        """发起者取得名额并发出整批；只有一条文本时直接在当前线程中发送"""
+        try:
+            ticket = self._acquire(acquire)
+        except Exception as e:
+            self._close(pair, batch)
+            # 限流或截止时间只针对发起者，其他成员用自己的名额和截止时间重试
+            for item in batch.items:
+                if item is leader:
+                    item.error = e
+                else:
+                    item.retry_alone = True
+                item.done.set()
+            return
+        self._close(pair, batch)
+        if len(batch.items) == 1:
+            self._dispatch(pair, batch.items, source, target, ticket, release)
+            return
+        threading.Thread(target=self._dispatch, args=(pair, batch.items, source, target, ticket, release),
+                         name='batch-send', daemon=True).start()
+
+    def _dispatch(self, pair: _PairState, items: list, source: str, target: str, ticket,
+                  release: Optional[Callable[[object], None]]) -> None:
+        deadlines = [item.deadline for item in items]
+        # 批的截止时间取最晚的一个，截止时间更早的成员各自超时放弃
+        deadline = None if None in deadlines else max(deadlines)
+        started = time.monotonic()
+        ok = split = False
+        try:
+            results, endpoint, sent = self.send([item.text for item in items], source, target, deadline)
+            for item, result in zip(items, results):
+                item.result, item.endpoint, item.sent = result, endpoint, sent
+            ok = True
+        except Exception as e:
+            split = len(items) > 1 and getattr(e, 'deterministic', False)
+            for item in items:
+                item.error = e
+                item.retry_alone = split
+            if split:
+                logger.info(f'合并调用失败（{e}），{len(items)} 条文本改为单独发送')
+        finally:
+            if release is not None:
+                release(ticket)
+        latency_ms = (time.monotonic() - started) * 1000
+
+        with self._lock:
+            self.upstream_calls += 1
+            if len(items) > 1:
+                self.batched_texts += len(items)
+            else:
+                self.unbatched_texts += 1
+            self._record_size(len(items))
+            # 请求内容引起的错误与上游负载无关，不缩小批大小
+            if (not ok and not split) or latency_ms > self.target_latency_ms:
+                pair.limit = max(pair.limit // 2, MIN_BATCH_LIMIT)
+            elif len(items) >= pair.limit:
+                pair.limit = min(pair.limit + 1, self.max_batch)
+        for item in items:
+            item.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            histogram = {_bucket_label(index): count for index, count in enumerate(self._histogram)}
+            histogram[f'>{HISTOGRAM_BOUNDS[-1]}'] = self._overflow
+            batches = sum(self._histogram) + self._overflow
+            texts = self.batched_texts + self.unbatched_texts
+            return {
+                'enabled': self.enabled,
+                'max_window_ms': self.max_window_ms,
+                'max_batch': self.max_batch,
+                'upstream_calls': self.upstream_calls,
+                'texts': texts,
+                'batched_texts': self.batched_texts,
+                'texts_per_call': round(texts / self.upstream_calls, 3) if self.upstream_calls else None,
+                'avg_window_wait_ms': round(self.window_wait_ms / batches, 3) if batches else None,
+                'batch_size_histogram': histogram,
+                'pairs': {
+                    f'{source}->{target}': {
+                        'batch_limit': pair.limit,
+                        'window_ms': round(pair.window_ms, 3),
+                        'arrival_gap_ms': round(pair.gap_ms, 3) if pair.gap_ms is not None else None,
+                    }
+                    for (source, target), pair in self._pairs.items()
+                },
+            }
@@ -0,0 +1,374 @@
+"""
+翻译结果缓存模块
+线程安全的 LRU + TTL 内存缓存，供翻译代理在调用腾讯API前查询。
+热点条目在过期前后由后台线程刷新（提前刷新 / 过期后宽限期内先返回旧结果），
+确定性的上游错误（参数错误、不支持的语言对）短暂缓存，避免相同的无效请求反复调用上游。
+每条缓存同时保存序列化好的响应体和 ETag，命中时代理直接写出，不再重新构造响应
+"""
+
+import hashlib
+import logging
+import os
+import queue
+import random
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import json_codec
+from text_normalization import TextNormalizer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_STALE_TTL = 30 * 24 * 3600
+DEFAULT_REFRESH_AHEAD = 3600
+DEFAULT_STALE_GRACE = 24 * 3600
+DEFAULT_NEGATIVE_TTL = 300
+DEFAULT_TTL_JITTER = 0.1
+DEFAULT_REFRESH_WORKERS = 2
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+class CachedResponse:
+    """
+    翻译接口 {"result": ...} 响应的预先序列化形式
+
+    header 是 Content-Type、Content-Length、ETag 和 Cache-Control 四行响应头的字节，
+    ETag 由响应体的哈希得到，相同译文的 ETag 相同，浏览器可以用 If-None-Match 重新验证
+    """
+
+    __slots__ = ('body', 'etag', 'header')
+
+    def __init__(self, result: str):
+        self.body = json_codec.dumps({'result': result})
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=12).hexdigest() + '"'
+        self.header = (f'Content-Type: application/json; charset=utf-8\r\nContent-Length: {len(self.body)}\r\n'
+                       f'ETag: {self.etag}\r\nCache-Control: no-cache\r\n').encode('ascii')
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """If-None-Match 请求头是否包含当前 ETag（或为 *）"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or self.etag in tags or 'W/' + self.etag in tags
+
+
+class TranslationCache:
+    """
+    按 (source, target, 规范化文本) 缓存翻译结果
+
+    每条缓存同时记录首次写入时的原始文本，命中时如果原始文本不同，
+    说明这次命中来自规范化，计入 normalized_hits。条目为 (译文, 过期时间, 原始文本, CachedResponse)。
+    过期的条目再保留 stale_ttl 秒，请求截止时间到了而上游还没返回时由 get_stale 兜底。
+
+    设置 refresher(text, source, target) 后（负责调用上游并写回缓存），距过期不到 refresh_ahead 秒
+    或过期不超过 stale_grace 秒的条目照常返回，同时在后台刷新，同一条目同时只有一个刷新。
+    写入时有效期随机缩短至多 ttl_jitter 比例，避免同一批写入的条目同时过期。
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[int] = None,
+                 normalizer: Optional[TextNormalizer] = None, stale_ttl: Optional[int] = None,
+                 refresh_ahead: Optional[int] = None, stale_grace: Optional[int] = None,
+                 negative_ttl: Optional[int] = None, ttl_jitter: Optional[float] = None,
+                 refresh_workers: Optional[int] = None):
+        self.max_entries = max_entries if max_entries is not None else \
+            _env_int('TRANSLATION_CACHE_SIZE', DEFAULT_MAX_ENTRIES)
+        self.ttl = ttl if ttl is not None else _env_int('TRANSLATION_CACHE_TTL', DEFAULT_TTL)
+        self.stale_ttl = stale_ttl if stale_ttl is not None else \
+            _env_int('TRANSLATION_CACHE_STALE_TTL', DEFAULT_STALE_TTL)
+        self.refresh_ahead = refresh_ahead if refresh_ahead is not None else \
+            _env_int('TRANSLATION_CACHE_REFRESH_AHEAD', DEFAULT_REFRESH_AHEAD)
+        self.stale_grace = stale_grace if stale_grace is not None else \
+            _env_int('TRANSLATION_CACHE_STALE_GRACE', DEFAULT_STALE_GRACE)
+        self.negative_ttl = negative_ttl if negative_ttl is not None else \
+            _env_int('TRANSLATION_CACHE_NEGATIVE_TTL', DEFAULT_NEGATIVE_TTL)
+        self.ttl_jitter = ttl_jitter if ttl_jitter is not None else \
+            _env_float('TRANSLATION_CACHE_TTL_JITTER', DEFAULT_TTL_JITTER)
+        self.refresh_workers = refresh_workers if refresh_workers is not None else \
+            _env_int('TRANSLATION_CACHE_REFRESH_WORKERS', DEFAULT_REFRESH_WORKERS)
+        self.normalizer = normalizer if normalizer is not None else TextNormalizer.from_env()
+        self.refresher = None
+        self._entries = OrderedDict()
+        self._negative = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._refresh_queue = queue.Queue()
+        self._refresh_threads = []
+        self.hits = 0
+        self.misses = 0
+        self.normalized_hits = 0
+        self.stale_hits = 0
+        self.refresh_ahead_hits = 0
+        self.grace_hits = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.negative_hits = 0
+
+    def make_key(self, text: str, source: str, target: str) -> Tuple[str, str, str]:
+        return (source, target, self.normalizer.normalize(text, source, target))
+
+    def _lookup(self, key, stale: bool = False):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        now = time.time()
+        if entry[1] < now:
+            if entry[1] + max(self.stale_ttl, self.stale_grace) < now:
+                del self._entries[key]
+                return None
+            if not stale:
+                return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _get_entry(self, text: str, source: str, target: str, count_miss: bool = True):
+        key = self.make_key(text, source, target)
+        refresh = self.refresher is not None
+        with self._lock:
+            entry = self._lookup(key, stale=refresh)
+            if entry is not None and refresh:
+                remaining = entry[1] - time.time()
+                if remaining < -self.stale_grace:
+                    entry = None
+                elif remaining < 0:
+                    self.grace_hits += 1
+                    self._schedule_refresh(key, entry[2], source, target)
+                elif remaining < self.refresh_ahead:
+                    self.refresh_ahead_hits += 1
+                    self._schedule_refresh(key, entry[2], source, target)
+            if entry is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+            self.hits += 1
+            if entry[2] != text:
+                self.normalized_hits += 1
+            return entry
+
+    def get(self, text: str, source: str, target: str) -> Optional[str]:
+        entry = self._get_entry(text, source, target)
+        return entry[0] if entry is not None else None
+
+    def get_response(self, text: str, source: str, target: str) -> Optional[CachedResponse]:
+        """
+        命中时返回预先序列化的响应，与 get 一样计入命中并触发后台刷新；
+        未命中不计入 misses，调用方接着走 translate 时由 get 计入
+        """
+        entry = self._get_entry(text, source, target, count_miss=False)
+        return entry[3] if entry is not None else None
+
+    def get_stale(self, text: str, source: str, target: str) -> Optional[str]:
+        """查询结果，包括过期不超过 stale_ttl 的条目；只在截止时间兜底时使用，计入 stale_hits"""
+        key = self.make_key(text, source, target)
+        with self._lock:
+            entry = self._lookup(key, stale=True)
+            if entry is None:
+                return None
+            self.stale_hits += 1
+            return entry[0]
+
+    def contains(self, text: str, source: str, target: str) -> bool:
+        """查询是否已缓存，不计入命中率统计"""
+        key = self.make_key(text, source, target)
+        with self._lock:
+            return self._lookup(key) is not None
+
+    def set(self, text: str, source: str, target: str, result: str) -> None:
+        if self.max_entries <= 0:
+            return
+        key = self.make_key(text, source, target)
+        ttl = self.ttl * (1 - self.ttl_jitter * random.random())
+        response = CachedResponse(result)
+        with self._lock:
+            self._entries[key] = (result, time.time() + ttl, text, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._negative.pop(key, None)
+
+    def get_error(self, text: str, source: str, target: str) -> Optional[Tuple[str, str]]:
+        """查询缓存的上游错误，返回 (错误码, 错误信息)"""
+        if self.negative_ttl <= 0:
+            return None
+        key = self.make_key(text, source, target)
+        with self._lock:
+            entry = self._negative.get(key)
+            if entry is None:
+                return None
+            if entry[2] < time.time():
+                del self._negative[key]
+                return None
+            self.negative_hits += 1
+            return entry[0], entry[1]
+
+    def set_error(self, text: str, source: str, target: str, code: str, message: str) -> None:
+        """缓存一个确定性的上游错误，有效期 negative_ttl 秒"""
+        if self.negative_ttl <= 0 or self.max_entries <= 0:
+            return
+        key = self.make_key(text, source, target)
+        with self._lock:
+            self._negative[key] = (code, message, time.time() + self.negative_ttl)
+            self._negative.move_to_end(key)
+            while len(self._negative) > self.max_entries:
+                self._negative.popitem(last=False)
+
+    def _schedule_refresh(self, key, surface: str, source: str, target: str) -> None:
+        # 调用方持有 self._lock
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        self._refresh_queue.put((key, surface, source, target))
+        if len(self._refresh_threads) < max(self.refresh_workers, 1):
+            thread = threading.Thread(target=self._refresh_loop, name='cache-refresh', daemon=True)
+            self._refresh_threads.append(thread)
+            thread.start()
+
+    def _refresh_loop(self) -> None:
+        while True:
+            key, surface, source, target = self._refresh_queue.get()
+            try:
+                self.refresher(surface, source, target)
+                with self._lock:
+                    self.refreshes += 1
+            except Exception as e:
+                with self._lock:
+                    self.refresh_failures += 1
+                logger.warning(f'后台刷新缓存失败: {e}')
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._negative.clear()
+
+    def is_available(self, timeout: float = 0.1) -> bool:
+        """缓存已启用且锁没有被长时间占用"""
+        if self.max_entries <= 0 or not self._lock.acquire(timeout=timeout):
+            return False
+        self._lock.release()
+        return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'normalization': self.normalizer.enabled,
+                'normalized_hits': self.normalized_hits,
+                'normalized_hit_rate': round(self.normalized_hits / total, 4) if total else 0.0,
+                'stale_ttl': self.stale_ttl,
+                'stale_hits': self.stale_hits,
+                'refresh_ahead': self.refresh_ahead,
+                'refresh_ahead_hits': self.refresh_ahead_hits,
+                'stale_grace': self.stale_grace,
+                'grace_hits': self.grace_hits,
+                'refreshes': self.refreshes,
+                'refresh_failures': self.refresh_failures,
+                'refreshing': len(self._refreshing),
+                'negative_ttl': self.negative_ttl,
+                'negative_entries': len(self._negative),
+                'negative_hits': self.negative_hits,
+            }
+
+
+class _CountingWriter:
+    """记录 write 调用次数的 wfile，对应套接字上的 send 次数"""
+
+    def __init__(self):
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return len(data)
+
+
+def benchmark(rounds: int = 20000) -> None:
+    """比较缓存命中时旧路径（每次 send_header + 重新序列化）与新路径（预先序列化的字节一次写出）的耗时"""
+    from http.server import BaseHTTPRequestHandler
+
+    cors = (('Access-Control-Allow-Origin', '*'),
+            ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+            ('Access-Control-Allow-Headers', 'Content-Type, X-Client-Token, X-Deadline-Ms'),
+            ('Access-Control-Expose-Headers', 'X-Request-ID, Retry-After, ETag'))
+    cors_bytes = ''.join(f'{name}: {value}\r\n' for name, value in cors).encode('ascii')
+    handler = BaseHTTPRequestHandler.__new__(BaseHTTPRequestHandler)
+    handler.request_version = 'HTTP/1.0'
+    handler.requestline = 'POST / HTTP/1.0'
+    handler.log_request = lambda *args: None
+    cache = TranslationCache(max_entries=1000)
+    samples = {'word': ('serendipity', '意外发现珍奇事物的本领'),
+               'passage': ('This is a sentence used to test caching. ' * 60,
+                           '这是一个用于测试缓存的中文句子，其中包含一些常见的标点符号。' * 60)}
+    for text, result in samples.values():
+        cache.set(text, 'en', 'zh', result)
+
+    for name, (text, _) in samples.items():
+        legacy_writer = _CountingWriter()
+        handler.wfile = legacy_writer
+        start = time.perf_counter()
+        for _ in range(rounds):
+            body = json_codec.dumps({'result': cache.get(text, 'en', 'zh')})
+            handler.send_response(200)
+            for header, value in cors:
+                handler.send_header(header, value)
+            handler.send_header('Content-Type', 'application/json; charset=utf-8')
+            handler.send_header('Content-Length', str(len(body)))
+            handler.send_header('X-Request-ID', '0123456789abcdef')
+            handler.end_headers()
+            handler.wfile.write(body)
+        legacy = (time.perf_counter() - start) / rounds * 1e6
+
+        current_writer = _CountingWriter()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            response = cache.get_response(text, 'en', 'zh')
+            current_writer.write(b''.join((
+                b'HTTP/1.0 200 OK\r\nServer: ', handler.version_string().encode('ascii'), b'\r\nDate: ',
+                handler.date_time_string().encode('ascii'), b'\r\n', cors_bytes,
+                response.header, b'X-Request-ID: 0123456789abcdef\r\n\r\n', response.body)))
+        current = (time.perf_counter() - start) / rounds * 1e6
+
+        print(f'{name:8s} 响应体 {len(response.body):6d} 字节: '
+              f'旧路径 {legacy:7.2f} us/命中 ({legacy_writer.writes // rounds} 次写), '
+              f'新路径 {current:7.2f} us/命中 ({current_writer.writes // rounds} 次写), '
+              f'提升 {legacy / current:5.2f}x')
+
+
+if __name__ == '__main__':
+    rounds = 20000
+    for arg in sys.argv:
+        if arg.startswith('--rounds='):
+            rounds = int(arg.split('=')[1])
+    benchmark(rounds)
@@ -0,0 +1,631 @@
+"""
+翻译评估模块
+浏览器里的备用评分（evaluateTranslationWithFallback / analyzeSentence）在主线程上逐句运行，长文章会卡住页面。
+这里在代理端评估整篇文章的句对：每句译文与参考译文（客户端给出，或由代理翻译原文得到）
+按词和二元组计算重合度，再叠加规则检查（拼写、冠词、时态和主谓一致），
+返回 showResult 使用的 detailedErrors 结构。句子分块后交给进程池并行计算，
+安装了 numpy 时每块的重合度用矩阵运算一次算完
+"""
+
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from request_deadline import DeadlineExceededError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 64
+DEFAULT_MAX_PAIRS = 5000
+DEFAULT_REFERENCE_CONCURRENCY = 8
+# 每次请求最多自动获取的参考译文数：参考译文按调用方的配额翻译，超出的句子只做规则检查
+DEFAULT_MAX_REFERENCES = 50
+# 与参考译文的重合度达到该值即不因重合度扣分；学生译文和机器译文措辞不同是正常的
+FULL_MARKS_SIMILARITY = 0.6
+ERROR_PENALTY = 5
+
+_WORD_RE = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?|\d+")
+_CJK_RE = re.compile(r'[一-鿿]')
+
+STOPWORDS = frozenset('''
+a an the and or but if of to in on at by for with from as into than then so that this these those
+is are was were be been being am do does did has have had will would can could should may might must
+i you he she it we they me him her us them my your his its our their not no there here what which who
+'''.split())
+
+COMMON_MISSPELLINGS = {
+    'teh': 'the', 'dont': "don't", 'didnt': "didn't", 'doesnt': "doesn't", 'isnt': "isn't",
+    'cant': "can't", 'couldnt': "couldn't", 'shouldnt': "shouldn't", 'wouldnt': "wouldn't",
+    'recieve': 'receive', 'beleive': 'believe', 'seperate': 'separate', 'definately': 'definitely',
+    'untill': 'until', 'wich': 'which', 'becuase': 'because', 'thier': 'their', 'alot': 'a lot',
+    'occured': 'occurred', 'tommorow': 'tomorrow', 'goverment': 'government', 'enviroment': 'environment',
+}
+
+# 原形 -> (过去式, 过去分词)
+IRREGULAR_VERBS = {
+    'go': ('went', 'gone'), 'eat': ('ate', 'eaten'), 'write': ('wrote', 'written'),
+    'drink': ('drank', 'drunk'), 'speak': ('spoke', 'spoken'), 'break': ('broke', 'broken'),
+    'choose': ('chose', 'chosen'), 'take': ('took', 'taken'), 'give': ('gave', 'given'),
+    'see': ('saw', 'seen'), 'do': ('did', 'done'), 'buy': ('bought', 'bought'),
+    'think': ('thought', 'thought'), 'teach': ('taught', 'taught'), 'catch': ('caught', 'caught'),
+    'bring': ('brought', 'brought'), 'sleep': ('slept', 'slept'), 'swim': ('swam', 'swum'),
+    'sing': ('sang', 'sung'), 'begin': ('began', 'begun'), 'know': ('knew', 'known'),
+    'grow': ('grew', 'grown'), 'throw': ('threw', 'thrown'), 'fly': ('flew', 'flown'),
+    'drive': ('drove', 'driven'), 'ride': ('rode', 'ridden'), 'find': ('found', 'found'),
+    'feel': ('felt', 'felt'), 'keep': ('kept', 'kept'), 'leave': ('left', 'left'),
+    'make': ('made', 'made'), 'get': ('got', 'got'), 'sit': ('sat', 'sat'),
+    'stand': ('stood', 'stood'), 'tell': ('told', 'told'), 'say': ('said', 'said'),
+    'forget': ('forgot', 'forgotten'), 'win': ('won', 'won'), 'meet': ('met', 'met'),
+}
+REGULAR_VERBS = ('play', 'study', 'work', 'watch', 'walk', 'talk', 'learn', 'live', 'listen',
+                 'wait', 'visit', 'help', 'finish', 'travel', 'clean', 'cook', 'open', 'start')
+# 误加 -ed 的不规则动词过去式（goed、eated），排除恰好是真实单词的形式
+WRONG_PAST_FORMS = {
+    (base + 'd' if base.endswith('e') else base + 'ed'): base
+    for base in IRREGULAR_VERBS if base not in ('see', 'feel', 'leave', 'do')
+}
+_BE_VERBS = frozenset(('is', 'are', 'was', 'were', 'am'))
+_HAVE_VERBS = frozenset(('has', 'have', 'had'))
+_THIRD_PERSON = frozenset(('he', 'she', 'it'))
+_PLURAL_SUBJECTS = frozenset(('i', 'you', 'we', 'they'))
+_AUXILIARIES = frozenset(('do', 'does', 'did', 'will', 'would', 'can', 'could', 'should', 'may',
+                          'might', 'must', 'to', 'let', 'make', 'made', 'help', 'if'))
+_SILENT_H = ('hour', 'honest', 'honor', 'honour', 'heir')
+_CONSONANT_SOUND_VOWELS = ('uni', 'use', 'usu', 'eu', 'one', 'once', 'ur')
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def _past_participle(base: str) -> str:
+    if base in IRREGULAR_VERBS:
+        return IRREGULAR_VERBS[base][1]
+    if base.endswith('e'):
+        return base + 'd'
+    if base.endswith('y') and base[-2] not in 'aeiou':
+        return base[:-1] + 'ied'
+    return base + 'ed'
+
+
+def _present_participle(base: str) -> str:
+    if base.endswith('ie'):
+        return base[:-2] + 'ying'
+    if base.endswith('e') and base not in ('see', 'be'):
+        return base[:-1] + 'ing'
+    if base in ('swim', 'sit', 'get', 'begin', 'forget', 'win', 'run', 'stop'):
+        return base + base[-1] + 'ing'
+    return base + 'ing'
+
+
+_BASE_VERBS = frozenset(IRREGULAR_VERBS) | frozenset(REGULAR_VERBS)
+
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """英文单词及其在原文中的字符区间"""
+    if text.isascii():
+        # 只匹配ASCII字母，整体转小写不改变字符位置
+        return [(match.group(), match.start(), match.end()) for match in _WORD_RE.finditer(text.lower())]
+    return [(match.group().lower(), match.start(), match.end()) for match in _WORD_RE.finditer(text)]
+
+
+@lru_cache(maxsize=65536)
+def _stem(word: str) -> str:
+    for suffix in ('ing', 'ed', 'es', 's'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+# numpy 在第一次计算重合度时才导入：导入需要约 200ms，代理启动时不必付出这个开销
+numpy = None
+_numpy_loaded = False
+
+
+def _load_numpy():
+    """导入并返回 numpy；未安装或 EVALUATION_BACKEND=python 时返回 None"""
+    global numpy, _numpy_loaded
+    if not _numpy_loaded:
+        try:
+            if os.getenv('EVALUATION_BACKEND', '').lower() == 'python':
+                raise ImportError
+            import numpy as module
+        except ImportError:
+            module = None
+        numpy, _numpy_loaded = module, True
+    return numpy
+
+
+def backend() -> str:
+    return 'numpy' if _load_numpy() is not None else 'python'
+
+
+def overlap_counts(hypotheses: Sequence[Sequence[str]], references: Sequence[Sequence[str]]) -> List[Tuple[int, int]]:
+    """
+    每个句对的 (一元组重合数, 二元组重合数)，按出现次数截断（clipped counts）
+
+    numpy 可用时整块句对的词先编码成整数，一元组和二元组连同句对序号编码成一个整数键，
+    排序求交集后逐键取最小值，再按句对累加
+    """
+    count = len(hypotheses)
+    if not count:
+        return []
+    if _load_numpy() is None:
+        result = []
+        for hypothesis, reference in zip(hypotheses, references):
+            unigrams = Counter(hypothesis) & Counter(reference)
+            bigrams = Counter(zip(hypothesis, hypothesis[1:])) & Counter(zip(reference, reference[1:]))
+            result.append((sum(unigrams.values()), sum(bigrams.values())))
+        return result
+
+    vocabulary = {}
+
+    def encode(sentences):
+        ids, rows = [], []
+        for row, words in enumerate(sentences):
+            ids.extend([vocabulary.setdefault(word, len(vocabulary)) for word in words])
+            rows.extend([row] * len(words))
+        return numpy.asarray(ids, dtype=numpy.int64), numpy.asarray(rows, dtype=numpy.int64)
+
+    encoded = encode(hypotheses), encode(references)
+    size = len(vocabulary)
+    # 每个句对占 size（一元组）+ size * size（二元组）个键
+    stride = size + size * size
+
+    def counted_keys(ids, rows):
+        same_row = rows[:-1] == rows[1:]
+        bigrams = size + ids[:-1][same_row] * size + ids[1:][same_row]
+        keys = numpy.concatenate((rows * stride + ids, rows[:-1][same_row] * stride + bigrams))
+        return numpy.unique(keys, return_counts=True)
+
+    (hypothesis_keys, hypothesis_counts), (reference_keys, reference_counts) = \
+        counted_keys(*encoded[0]), counted_keys(*encoded[1])
+    shared_keys, hypothesis_index, reference_index = numpy.intersect1d(
+        hypothesis_keys, reference_keys, assume_unique=True, return_indices=True)
+    shared = numpy.minimum(hypothesis_counts[hypothesis_index], reference_counts[reference_index])
+    rows = shared_keys // stride
+    is_unigram = shared_keys % stride < size
+    unigrams = numpy.bincount(rows[is_unigram], weights=shared[is_unigram], minlength=count).astype(numpy.int64)
+    bigrams = numpy.bincount(rows[~is_unigram], weights=shared[~is_unigram], minlength=count).astype(numpy.int64)
+    return list(zip(unigrams.tolist(), bigrams.tolist()))
+
+
+def similarity(hypothesis: Sequence[str], reference: Sequence[str], unigrams: int, bigrams: int) -> float:
+    """一元组和二元组F值的加权平均"""
+    def f_measure(matched, hypothesis_total, reference_total):
+        if not matched or not hypothesis_total or not reference_total:
+            return 0.0
+        precision, recall = matched / hypothesis_total, matched / reference_total
+        return 2 * precision * recall / (precision + recall)
+
+    return (0.6 * f_measure(unigrams, len(hypothesis), len(reference))
+            + 0.4 * f_measure(bigrams, len(hypothesis) - 1, len(reference) - 1))
+
+
+def _position(sentence_index: int, translation: str, start: int, word: str) -> Tuple[str, int]:
+    # addHighlight 按空格切分译文定位单词，这里的序号与之一致
+    word_index = translation.count(' ', 0, start)
+    prefix = f'第{sentence_index}句，' if sentence_index else ''
+    return f'{prefix}第{word_index + 1}个单词"{word}"', word_index
+
+
+def _error(kind: str, description: str, example: str, sentence_index: int = 0, translation: str = '',
+           token: Optional[Tuple[str, int, int]] = None, end: Optional[int] = None) -> dict:
+    error = {'type': kind, 'description': description, 'example': example}
+    if token is None:
+        error['position'] = '整个句子'
+        return error
+    word, start, token_end = token
+    error['position'], error['wordIndex'] = _position(sentence_index, translation, start, translation[start:token_end])
+    error['span'] = [start, end if end is not None else token_end]
+    return error
+
+
+def check_rules(translation: str, tokens: List[Tuple[str, int, int]], sentence_index: int,
+                reference_words: Optional[set] = None) -> List[dict]:
+    """逐词的规则检查，每个错误带译文中的字符区间"""
+    errors = []
+    words = [token[0] for token in tokens]
+    for index, token in enumerate(tokens):
+        word = token[0]
+        previous = words[index - 1] if index else ''
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+        next_word = following[0] if following else ''
+
+        if word in COMMON_MISSPELLINGS:
+            errors.append(_error('拼写错误', '单词拼写错误', f'可能应该是"{COMMON_MISSPELLINGS[word]}"',
+                                 sentence_index, translation, token))
+        elif word in WRONG_PAST_FORMS:
+            base = WRONG_PAST_FORMS[word]
+            errors.append(_error('语法错误', f'动词 "{base}" 的过去式形式错误',
+                                 f'正确过去式应为 "{IRREGULAR_VERBS[base][0]}"', sentence_index, translation, token))
+        elif (reference_words and len(word) >= 4 and word not in reference_words
+              and _stem(word) not in reference_words and not word.isdigit()):
+            candidate = _closest_word(word, reference_words)
+            if candidate is not None:
+                errors.append(_error('拼写错误', '单词拼写错误', f'可能应该是"{candidate}"',
+                                     sentence_index, translation, token))
+
+        if following is None:
+            continue
+        if next_word == word and word.isalpha():
+            errors.append(_error('语法错误', '单词重复', f'"{word} {word}" 中多了一个 "{word}"',
+                                 sentence_index, translation, token, following[2]))
+        elif word in ('a', 'an'):
+            vowel_sound = (next_word[:1] in 'aeiou' and not next_word.startswith(_CONSONANT_SOUND_VOWELS)) \
+                or next_word.startswith(_SILENT_H)
+            if next_word.isalpha() and (word == 'a') == vowel_sound:
+                article = 'an' if vowel_sound else 'a'
+                errors.append(_error('语法错误', '冠词 a/an 使用错误', f'可能应该是"{article} {next_word}"',
+                                     sentence_index, translation, token, following[2]))
+            elif (len(next_word) > 3 and next_word.endswith('s')
+                  and not next_word.endswith(('ss', 'us', 'is', 'ous')) and index + 2 >= len(tokens)
+                  or (index + 2 < len(tokens) and next_word.endswith('s') and len(next_word) > 3
+                      and not next_word.endswith(('ss', 'us', 'is', 'ous')) and words[index + 2] in ('are', 'were'))):
+                errors.append(_error('语法错误', '冠词和名词数不一致', '"a/an" 应该搭配单数名词，复数名词应该搭配 "the" 或不使用冠词',
+                                     sentence_index, translation, token, following[2]))
+        elif word in _BE_VERBS and next_word in _BASE_VERBS and next_word not in ('do', 'read'):
+            errors.append(_error('语法错误', '进行时动词形式错误',
+                                 f'进行时动词应该加ing形式，可能应该是 "{word} {_present_participle(next_word)}"',
+                                 sentence_index, translation, token, following[2]))
+        elif (word in _HAVE_VERBS and next_word in _BASE_VERBS and next_word != _past_participle(next_word)
+              and previous not in _AUXILIARIES and next_word not in ('to', 'do', 'make', 'get')):
+            errors.append(_error('语法错误', '完成时动词形式错误',
+                                 f'完成时动词应该使用过去分词形式，可能应该是 "{word} {_past_participle(next_word)}"',
+                                 sentence_index, translation, token, following[2]))
+        elif previous not in _AUXILIARIES:
+            fixed = None
+            if word in _THIRD_PERSON and next_word in ('have', 'are', 'do', "don't"):
+                fixed = {'have': 'has', 'are': 'is', 'do': 'does', "don't": "doesn't"}[next_word]
+            elif word in _PLURAL_SUBJECTS and next_word in ('is', 'has', 'does', "doesn't"):
+                fixed = 'am' if word == 'i' and next_word == 'is' else \
+                    {'is': 'are', 'has': 'have', 'does': 'do', "doesn't": "don't"}[next_word]
+            elif word in ('we', 'they', 'you') and next_word == 'was':
+                fixed = 'were'
+            if fixed is not None:
+                errors.append(_error('语法错误', '存在主谓不一致', f'可能应该是 "{word} {fixed}"',
+                                     sentence_index, translation, token, following[2]))
+    return errors
+
+
+def _closest_word(word: str, candidates: set) -> Optional[str]:
+    best, best_ratio = None, 0.8
+    for candidate in candidates:
+        if abs(len(candidate) - len(word)) > 1 or candidate[0] != word[0]:
+            continue
+        ratio = SequenceMatcher(None, word, candidate).ratio()
+        if ratio > best_ratio:
+            best, best_ratio = candidate, ratio
+    return best
+
+
+def similarity_base(sentence_similarity: float) -> float:
+    """扣除错误前的句子得分：重合度达到 FULL_MARKS_SIMILARITY 得100分，完全不重合得40分"""
+    return 40 + 60 * min(1.0, sentence_similarity / FULL_MARKS_SIMILARITY)
+
+
+def sentence_score(base: float, errors: list) -> int:
+    return max(0, min(100, round(base - ERROR_PENALTY * len(errors))))
+
+
+def evaluate_chunk(items: List[Tuple[int, str, str, Optional[str]]]) -> List[dict]:
+    """
+    评估一块句对：[(句序号, 原文, 译文, 参考译文)]，返回各句的 detailedErrors 项
+
+    句序号为0表示整篇模式。进程池的工作进程调用这个函数，参数和返回值都是普通数据
+    """
+    tokenized = [(tokenize(translation), tokenize(reference) if reference else None)
+                 for _, _, translation, reference in items]
+    with_reference = [index for index, (_, reference) in enumerate(tokenized) if reference]
+    overlaps = dict(zip(with_reference, overlap_counts(
+        [[word for word, _, _ in tokenized[index][0]] for index in with_reference],
+        [[word for word, _, _ in tokenized[index][1]] for index in with_reference])))
+
+    results = []
+    for index, (sentence_index, chinese, translation, reference) in enumerate(items):
+        tokens, reference_tokens = tokenized[index]
+        words = [word for word, _, _ in tokens]
+        errors = []
+        score = 100.0
+        sentence_similarity = None
+        if reference_tokens:
+            reference_words = [word for word, _, _ in reference_tokens]
+            reference_set = set(reference_words)
+            sentence_similarity = similarity(words, reference_words, *overlaps[index])
+            score = similarity_base(sentence_similarity)
+
+            ratio = len(words) / len(reference_words)
+            if ratio < 0.5:
+                errors.append(_error('内容错误', '翻译内容过于简短，可能遗漏了重要信息', '建议补充更多细节'))
+            elif ratio > 2:
+                errors.append(_error('内容错误', '翻译内容过长，可能包含冗余信息', '建议精简表达'))
+            stems = {_stem(word) for word in words}
+            keywords = [word for word in dict.fromkeys(reference_words)
+                        if word not in STOPWORDS and len(word) > 2 and not word.isdigit()]
+            missing = [word for word in keywords if _stem(word) not in stems]
+            if len(missing) >= 2 and len(missing) * 2 > len(keywords):
+                errors.append(_error('内容错误', '可能遗漏了原文的关键信息',
+                                     '参考译文中的 ' + '、'.join(f'"{word}"' for word in missing[:3]) + ' 未出现在译文中'))
+        else:
+            reference_set = None
+            chinese_chars = len(_CJK_RE.findall(chinese))
+            if chinese_chars >= 10 and len(words) < chinese_chars * 0.2:
+                errors.append(_error('内容错误', '翻译内容过于简短，可能遗漏了重要信息', '建议补充更多细节'))
+
+        errors.extend(check_rules(translation, tokens, sentence_index, reference_set))
+        score = sentence_score(score, errors)
+        results.append({
+            'sentenceIndex': sentence_index,
+            'chinese': chinese,
+            'translation': translation,
+            'errors': errors,
+            'sentenceScore': score,
+            'similarity': round(sentence_similarity, 4) if sentence_similarity is not None else None,
+        })
+    return results
+
+
+def parse_evaluation_request(data: dict) -> Tuple[List[dict], str, bool]:
+    """校验 POST /evaluate 的请求体，返回 (句对, 模式, 是否自动获取参考译文)"""
+    if not isinstance(data, dict):
+        raise ValueError('请求格式错误')
+    mode = data.get('mode', 'sentence')
+    if mode not in ('sentence', 'passage'):
+        raise ValueError('mode 必须是 sentence 或 passage')
+    pairs = data.get('pairs')
+    if not isinstance(pairs, list) or not pairs:
+        raise ValueError('缺少 pairs')
+    if mode == 'passage' and len(pairs) != 1:
+        raise ValueError('整篇模式只能有一个句对')
+    max_pairs = _env_int('EVALUATION_MAX_PAIRS', DEFAULT_MAX_PAIRS)
+    if len(pairs) > max_pairs:
+        raise ValueError(f'句对数超过上限 {max_pairs}')
+    for pair in pairs:
+        if not isinstance(pair, dict) or not isinstance(pair.get('chinese', ''), str) \
+                or not isinstance(pair.get('translation', ''), str) \
+                or not isinstance(pair.get('reference') or '', str):
+            raise ValueError('句对格式错误')
+    return pairs, mode, data.get('references', 'auto') != 'none'
+
+
+def overall_evaluation(score: int) -> str:
+    if score >= 80:
+        return '翻译质量良好'
+    return '翻译质量一般' if score >= 60 else '翻译质量需要改进'
+
+
+class TranslationEvaluator:
+    """
+    翻译评估入口
+
+    不超过一块的请求直接在当前线程中计算，避免进程间传输的开销；更大的请求按 chunk_size 分块交给进程池。
+    进程池在第一次需要时才创建，工作进程以 spawn 方式启动，各自导入 numpy，只执行 evaluate_chunk。
+    """
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                 reference_concurrency: Optional[int] = None, max_references: Optional[int] = None):
+        self.workers = workers if workers is not None else _env_int('EVALUATION_WORKERS', os.cpu_count() or 1)
+        self.chunk_size = max(chunk_size if chunk_size is not None else
+                              _env_int('EVALUATION_CHUNK_SIZE', DEFAULT_CHUNK_SIZE), 1)
+        self.reference_concurrency = reference_concurrency if reference_concurrency is not None else \
+            _env_int('EVALUATION_REFERENCE_CONCURRENCY', DEFAULT_REFERENCE_CONCURRENCY)
+        self.max_references = max_references if max_references is not None else \
+            _env_int('EVALUATION_MAX_REFERENCES', DEFAULT_MAX_REFERENCES)
+        self._pool = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.sentences = 0
+        self.pooled_chunks = 0
+        self.reference_failures = 0
+        self.references_skipped = 0
+        self.total_ms = 0.0
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # 代理是多线程的 HTTP 服务器，fork 出的子进程可能继承其他线程持有的锁而死锁，
+                # 这里用 spawn：工作进程重新导入本模块，只执行 evaluate_chunk
+                context = multiprocessing.get_context('spawn')
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def _fetch_references(self, items: List[list], reference: Callable[[str], str]) -> Tuple[int, int]:
+        """
+        为缺少参考译文的句对调用 reference(原文)，最多 max_references 句；
+        失败或未获取的句对不使用参考译文，返回 (失败数, 未获取数)
+        """
+        missing = [item for item in items if not item[3] and item[1].strip() and item[2].strip()]
+        if not missing:
+            return 0, 0
+        budget = max(self.max_references, 0)
+        skipped = max(len(missing) - budget, 0)
+        missing = missing[:budget]
+        expired = threading.Event()
+
+        def fetch(item):
+            # 截止时间已过，剩下的句子不再发出翻译请求
+            if expired.is_set():
+                return None
+            try:
+                item[3] = reference(item[1])
+                return True
+            except DeadlineExceededError:
+                expired.set()
+                return None
+            except Exception as e:
+                logger.info(f'获取参考译文失败: {e}')
+                return False
+
+        with ThreadPoolExecutor(max_workers=max(self.reference_concurrency, 1)) as executor:
+            outcomes = list(executor.map(fetch, missing))
+        return outcomes.count(False), skipped + outcomes.count(None)
+
+    def evaluate(self, pairs: List[dict], mode: str = 'sentence',
+                 reference: Optional[Callable[[str], str]] = None) -> dict:
+        """评估句对，返回 {'score', 'evaluation', 'detailedErrors', 'stats'}"""
+        start = time.perf_counter()
+        items = [[0 if mode == 'passage' else index + 1, pair.get('chinese', ''), pair.get('translation', ''),
+                  pair.get('reference') or None] for index, pair in enumerate(pairs)]
+        failures, skipped = self._fetch_references(items, reference) if reference is not None else (0, 0)
+        translated = [tuple(item) for item in items if item[2].strip()]
+
+        chunks = [translated[i:i + self.chunk_size] for i in range(0, len(translated), self.chunk_size)]
+        pooled = len(chunks) > 1 and self.workers > 1
+        if pooled:
+            detailed = [result for chunk in self._get_pool().map(evaluate_chunk, chunks) for result in chunk]
+        else:
+            detailed = [result for chunk in chunks for result in evaluate_chunk(chunk)]
+
+        # 部分句子没有参考译文时，这些句子的重合度按其他句子的平均值估计，与有参考译文的句子用同一标准计分，
+        # 否则没有参考译文的句子从100分起扣，会抬高总分
+        similarities = [item['similarity'] for item in detailed if item['similarity'] is not None]
+        partial = 0 < len(similarities) < len(detailed)
+        if partial:
+            base = similarity_base(sum(similarities) / len(similarities))
+            for item in detailed:
+                if item['similarity'] is None:
+                    item['sentenceScore'] = sentence_score(base, item['errors'])
+        score = self._overall_score(mode, items, detailed)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.requests += 1
+            self.sentences += len(translated)
+            self.pooled_chunks += len(chunks) if pooled else 0
+            self.reference_failures += failures
+            self.references_skipped += skipped
+            self.total_ms += elapsed_ms
+        return {
+            'score': score,
+            'evaluation': overall_evaluation(score),
+            'detailedErrors': detailed,
+            'stats': {
+                'sentences': len(items),
+                'evaluated': len(translated),
+                'references': sum(1 for item in translated if item[3]),
+                'reference_failures': failures,
+                'references_skipped': skipped,
+                'partial': partial,
+                'chunks': len(chunks),
+                'pooled': pooled,
+                'backend': backend(),
+                'elapsed_ms': round(elapsed_ms, 3),
+            },
+        }
+
+    @staticmethod
+    def _overall_score(mode: str, items: List[list], detailed: List[dict]) -> int:
+        """与 endPractice 的计分规则一致：分句模式按完成度折算，整篇模式按译文长度封顶"""
+        if mode == 'passage':
+            if not detailed:
+                return 20
+            score = detailed[0]['sentenceScore']
+            chinese, translation = items[0][1], items[0][2]
+            ratio = len(translation) / max(len(chinese), 1)
+            if ratio < 0.3:
+                score = min(60, score)
+            elif ratio < 0.7:
+                score = min(80, score)
+            return score
+        if not detailed:
+            return 30
+        average = round(sum(item['sentenceScore'] for item in detailed) / len(detailed))
+        completion = len(detailed) / len(items)
+        if completion < 1:
+            average = min(80, round(average * completion + (1 - completion) * 40))
+        return max(0, min(100, average))
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        # 每块只需要几十毫秒，取消排队中的块后等待工作进程退出即可，不需要用到 timeout
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'backend': backend(),
+                'workers': self.workers,
+                'pool_started': self._pool is not None,
+                'chunk_size': self.chunk_size,
+                'requests': self.requests,
+                'sentences': self.sentences,
+                'pooled_chunks': self.pooled_chunks,
+                'reference_failures': self.reference_failures,
+                'references_skipped': self.references_skipped,
+                'max_references': self.max_references,
+                'avg_ms': round(self.total_ms / self.requests, 3) if self.requests else None,
+            }
+
+
+def _synthetic_pairs(count: int) -> List[dict]:
+    """随机句对：参考译文由常用词组成，译文在其基础上替换、删除单词并混入典型错误"""
+    rng = random.Random(0)
+    vocabulary = ['student', 'teacher', 'school', 'library', 'morning', 'weekend', 'history', 'science',
+                  'important', 'beautiful', 'quickly', 'together', 'because', 'during', 'village',
+                  'river', 'mountain', 'family', 'friend', 'problem', 'question', 'answer', 'country',
+                  'city', 'people', 'government', 'environment', 'technology', 'culture', 'festival']
+    verbs = ['go', 'eat', 'write', 'play', 'study', 'visit', 'help', 'make', 'take', 'learn']
+    mistakes = ['goed', 'teh', 'a apple', 'is go', 'has went', 'he have', 'the the', 'recieve']
+    pairs = []
+    for _ in range(count):
+        reference = ['the'] + [rng.choice(vocabulary) for _ in range(rng.randint(3, 8))] + \
+            [rng.choice(verbs)] + ['the'] + [rng.choice(vocabulary) for _ in range(rng.randint(3, 8))]
+        translation = [word for word in reference if rng.random() > 0.15]
+        if rng.random() < 0.4:
+            translation.insert(rng.randrange(len(translation) + 1), rng.choice(mistakes))
+        pairs.append({'chinese': '这是一个用于测试评估性能的中文句子。',
+                      'translation': ' '.join(translation).capitalize() + '.',
+                      'reference': ' '.join(reference).capitalize() + '.'})
+    return pairs
+
+
+def benchmark(sentences: int = 1000, rounds: int = 5) -> None:
+    """比较单进程纯Python、单进程当前后端和进程池评估一篇 sentences 句的文章的耗时"""
+    global numpy
+    pairs = _synthetic_pairs(sentences)
+    print(f'{sentences} 句，CPU {os.cpu_count()} 核，重合度后端 {backend()}')
+    installed = numpy
+    variants = [('单进程 python', None, 1)]
+    if installed is not None:
+        variants.append(('单进程 numpy', installed, 1))
+    workers = max(os.cpu_count() or 1, 2)
+    variants.append((f'进程池 x{workers}', installed, workers))
+    for name, module, worker_count in variants:
+        numpy = module
+        evaluator = TranslationEvaluator(workers=worker_count)
+        evaluator.evaluate(pairs)
+        timings = []
+        for _ in range(rounds):
+            result = evaluator.evaluate(pairs)
+            timings.append(result['stats']['elapsed_ms'])
+        evaluator.stop()
+        errors = sum(len(item['errors']) for item in result['detailedErrors'])
+        print(f'{name:14s}: {min(timings):8.1f} ms/篇, {sentences / min(timings) * 1000:9.0f} 句/秒, '
+              f'总分 {result["score"]}, 错误 {errors} 处')
+    numpy = installed
+
+
+if __name__ == '__main__':
+    count = 1000
+    for arg in sys.argv:
+        if arg.startswith('--sentences='):
+            count = int(arg.split('=')[1])
+    benchmark(count)
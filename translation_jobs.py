@@ -0,0 +1,448 @@
+"""
+文档预翻译任务模块
+提交文档后由后台线程按句子逐条调用翻译接口并写入缓存，
+任务进度可查询，使用文件存储时服务重启后会继续未完成的任务
+"""
+
+import base64
+import binascii
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterator, List, Optional
+
+from sentence_segmentation import iter_line_sentences, iter_passages, iter_period_sentences
+
+logger = logging.getLogger(__name__)
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+DEFAULT_WORKERS = 2
+# 腾讯机器翻译默认限频 5 次/秒，预翻译只占用其中一部分，给实时请求留出余量
+DEFAULT_RATE = 3.0
+DEFAULT_MAX_SEGMENTS = 5000
+# 排队中的句子数上限，超过时拒绝新任务，避免队列无限增长
+DEFAULT_MAX_QUEUED = 50000
+# base64 编码的 docx 比普通翻译请求大得多，单独设置请求体上限
+DEFAULT_MAX_DOCUMENT_SIZE = 20 * 1024 * 1024
+# 进度写盘间隔（秒），避免每翻译一句就写一次文件
+SAVE_INTERVAL = 2.0
+
+SEGMENT_MODES = ('line', 'period', 'both')
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def get_max_document_size() -> int:
+    """从环境变量 MAX_JOB_BODY_SIZE 读取任务提交请求体上限（字节）"""
+    return int(_env_float('MAX_JOB_BODY_SIZE', DEFAULT_MAX_DOCUMENT_SIZE))
+
+
+def extract_docx_text(data: bytes) -> str:
+    """与前端 parseDocxFile 相同的规则从 .docx 中提取文本"""
+    # 只有提交docx任务时才需要，避免拖慢代理启动
+    import io
+    import zipfile
+    from xml.etree import ElementTree
+
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as docx:
+            xml_content = docx.read('word/document.xml')
+        root = ElementTree.fromstring(xml_content)
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError):
+        raise ValueError('无效的docx文件')
+
+    full_text = []
+    for paragraph in root.iter(WORD_NS + 'p'):
+        paragraph_text = ''.join(node.text or '' for node in paragraph.iter(WORD_NS + 't'))
+        if next(paragraph.iter(WORD_NS + 'br'), None) is not None:
+            paragraph_text += '\n'
+        if paragraph_text.strip():
+            full_text.append(paragraph_text + '\n')
+    return ''.join(full_text)
+
+
+def iter_document_segments(text: str, mode: str = 'both') -> Iterator[str]:
+    """按前端的文章/分句规则产出需要预翻译的句子，去重且保持顺序"""
+    seen = set()
+    for passage in iter_passages(text):
+        splitters = []
+        if mode in ('line', 'both'):
+            splitters.append(iter_line_sentences)
+        if mode in ('period', 'both'):
+            splitters.append(iter_period_sentences)
+        for splitter in splitters:
+            for segment in splitter(passage):
+                if segment not in seen:
+                    seen.add(segment)
+                    yield segment
+
+
+def parse_job_request(data: dict):
+    """
+    解析任务提交请求，返回 (text, source, target, mode)
+
+    请求体可以直接给出 text，也可以给出 base64 编码的 docx 文件内容。
+    上传的练习文章是中文，默认按 zh -> en 预翻译。
+    """
+    text = data.get('text')
+    docx = data.get('docx')
+    if not text and docx:
+        try:
+            text = extract_docx_text(base64.b64decode(docx))
+        except binascii.Error:
+            raise ValueError('无效的docx文件')
+    if not text:
+        raise ValueError('缺少文档内容')
+    return text, data.get('source', 'zh'), data.get('target', 'en'), data.get('mode', 'both')
+
+
+class RateLimiter:
+    """令牌桶限速器，多个工作线程共享"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0, stop_event: Optional[threading.Event] = None,
+                timeout: Optional[float] = None) -> bool:
+        """阻塞直到取得令牌；stop_event 被设置或超过 timeout 秒时返回 False"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate if self.rate > 0 else 1.0
+            if deadline is not None:
+                if now >= deadline:
+                    return False
+                wait = min(wait, deadline - now)
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class TranslationJob:
+    """单个预翻译任务"""
+
+    def __init__(self, job_id: str, segments: List[str], source: str, target: str,
+                 created_at: Optional[float] = None):
+        self.job_id = job_id
+        self.segments = segments
+        self.source = source
+        self.target = target
+        self.created_at = created_at or time.time()
+        self.finished_at = None
+        self.completed = bytearray(len(segments))
+        self.failed = 0
+        self.cached = 0
+        self.last_error = None
+        self.status = 'queued'
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        return len(self.segments)
+
+    @property
+    def done(self) -> int:
+        return self.completed.count(1)
+
+    def pending_indexes(self) -> List[int]:
+        return [i for i, flag in enumerate(self.completed) if not flag]
+
+    def record(self, index: int, error: Optional[str] = None, cached: bool = False) -> bool:
+        """记录一句的处理结果，返回任务是否因此全部完成"""
+        with self._lock:
+            if self.completed[index]:
+                return False
+            if cached:
+                self.cached += 1
+            if error is not None:
+                self.failed += 1
+                self.last_error = error
+            self.completed[index] = 1
+            if self.status == 'queued':
+                self.status = 'running'
+            if self.done == self.total:
+                self.status = 'completed'
+                self.finished_at = time.time()
+                return True
+            return False
+
+    def to_status(self) -> dict:
+        done = self.done
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'source': self.source,
+            'target': self.target,
+            'total': self.total,
+            'done': done,
+            'failed': self.failed,
+            'cached': self.cached,
+            'progress': round(done / self.total, 4) if self.total else 1.0,
+            'last_error': self.last_error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+    def to_dict(self) -> dict:
+        data = self.to_status()
+        data['segments'] = self.segments
+        data['completed'] = self.completed.hex()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'TranslationJob':
+        job = cls(data['job_id'], data['segments'], data['source'], data['target'],
+                  data.get('created_at'))
+        job.completed = bytearray.fromhex(data.get('completed', '')) or bytearray(len(job.segments))
+        job.failed = data.get('failed', 0)
+        job.cached = data.get('cached', 0)
+        job.last_error = data.get('last_error')
+        job.finished_at = data.get('finished_at')
+        job.status = data.get('status', 'queued')
+        return job
+
+
+class JobStore:
+    """内存任务存储"""
+
+    def __init__(self):
+        self._jobs: Dict[str, TranslationJob] = {}
+        self._lock = threading.Lock()
+
+    def add(self, job: TranslationJob) -> None:
+        with self._lock:
+            self._jobs[job.job_id] = job
+
+    def get(self, job_id: str) -> Optional[TranslationJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def all(self) -> List[TranslationJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def save(self, job: TranslationJob) -> None:
+        pass
+
+    def load_all(self) -> List[TranslationJob]:
+        return []
+
+
+class FileJobStore(JobStore):
+    """每个任务一个JSON文件的持久化任务存储"""
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def save(self, job: TranslationJob) -> None:
+        path = self._path(job.job_id)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load_all(self) -> List[TranslationJob]:
+        jobs = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    job = TranslationJob.from_dict(json.load(f))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f'无法加载预翻译任务 {name}: {e}')
+                continue
+            self.add(job)
+            jobs.append(job)
+        return jobs
+
+
+class JobQueueFullError(Exception):
+    """排队中的句子数加上新任务超过 max_queued"""
+
+
+class TranslationJobQueue:
+    """
+    预翻译任务队列
+
+    translate_func 即代理的 translate(text, source, target)，结果由其自行写入缓存；
+    is_cached(text, source, target) 返回 True 的句子不占用上游限额。
+    """
+
+    def __init__(self, translate_func: Callable[[str, str, str], str],
+                 is_cached: Optional[Callable[[str, str, str], bool]] = None,
+                 store: Optional[JobStore] = None,
+                 workers: Optional[int] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 max_segments: Optional[int] = None,
+                 max_queued: Optional[int] = None):
+        self.translate_func = translate_func
+        self.is_cached = is_cached
+        self.store = store if store is not None else JobStore()
+        self.workers = workers if workers is not None else \
+            int(_env_float('TRANSLATION_JOB_WORKERS', DEFAULT_WORKERS))
+        self.rate_limiter = rate_limiter or RateLimiter(
+            _env_float('TRANSLATION_JOB_RATE', DEFAULT_RATE))
+        self.max_segments = max_segments if max_segments is not None else \
+            int(_env_float('TRANSLATION_JOB_MAX_SEGMENTS', DEFAULT_MAX_SEGMENTS))
+        self.max_queued = max_queued if max_queued is not None else \
+            int(_env_float('TRANSLATION_JOB_MAX_QUEUED', DEFAULT_MAX_QUEUED))
+        self._tasks = queue.Queue()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._dirty = set()
+        self._dirty_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._last_save = time.monotonic()
+
+    @classmethod
+    def from_env(cls, translate_func, is_cached=None) -> 'TranslationJobQueue':
+        """TRANSLATION_JOB_DIR 设置时使用文件存储，否则任务只保存在内存中"""
+        job_dir = os.getenv('TRANSLATION_JOB_DIR')
+        store = FileJobStore(job_dir) if job_dir else JobStore()
+        return cls(translate_func, is_cached, store)
+
+    def start(self) -> None:
+        for job in self.store.load_all():
+            if job.status in ('queued', 'running'):
+                logger.info(f'恢复预翻译任务 {job.job_id}: {job.done}/{job.total}')
+                self._enqueue(job)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'translation-job-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._flush(force=True)
+
+    def depth(self) -> int:
+        """尚未处理的句子数"""
+        return self._tasks.qsize()
+
+    def submit(self, segments: Iterator[str], source: str, target: str,
+               max_segments: Optional[int] = None) -> TranslationJob:
+        if max_segments is None:
+            max_segments = self.max_segments
+        segment_list = []
+        for segment in segments:
+            segment_list.append(segment)
+            if len(segment_list) > max_segments:
+                raise ValueError(f'文档句子数超过上限 {max_segments}')
+        if self.max_queued > 0 and self.depth() + len(segment_list) > self.max_queued:
+            raise JobQueueFullError('预翻译队列已满，请稍后再试')
+        job = TranslationJob(uuid.uuid4().hex, segment_list, source, target)
+        if not segment_list:
+            job.status = 'completed'
+            job.finished_at = time.time()
+        self.store.add(job)
+        self.store.save(job)
+        self._enqueue(job)
+        logger.info(f'已提交预翻译任务 {job.job_id}: {job.total} 句')
+        return job
+
+    def submit_document(self, text: str, source: str, target: str, mode: str = 'both') -> TranslationJob:
+        if mode not in SEGMENT_MODES:
+            raise ValueError(f'不支持的分句方式: {mode}')
+        return self.submit(iter_document_segments(text, mode), source, target)
+
+    def get(self, job_id: str) -> Optional[TranslationJob]:
+        return self.store.get(job_id)
+
+    def _enqueue(self, job: TranslationJob) -> None:
+        for index in job.pending_indexes():
+            self._tasks.put((job, index))
+
+    def _mark_dirty(self, job: TranslationJob) -> None:
+        with self._dirty_lock:
+            self._dirty.add(job)
+        self._flush()
+
+    def _flush(self, force: bool = False) -> None:
+        with self._dirty_lock:
+            if not self._dirty or (not force and time.monotonic() - self._last_save < SAVE_INTERVAL):
+                return
+            jobs = list(self._dirty)
+            self._dirty.clear()
+            self._last_save = time.monotonic()
+        with self._save_lock:
+            for job in jobs:
+                try:
+                    self.store.save(job)
+                except OSError as e:
+                    logger.warning(f'保存预翻译任务 {job.job_id} 失败: {e}')
+
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job, index = self._tasks.get(timeout=0.5)
+            except queue.Empty:
+                self._flush()
+                continue
+            try:
+                self._process(job, index)
+            finally:
+                self._tasks.task_done()
+
+    def _process(self, job: TranslationJob, index: int) -> None:
+        text = job.segments[index]
+        error = None
+        cached = self.is_cached is not None and self.is_cached(text, job.source, job.target)
+        if not cached:
+            if not self.rate_limiter.acquire(stop_event=self._stop):
+                self._tasks.put((job, index))
+                return
+            try:
+                self.translate_func(text, job.source, job.target)
+            except Exception as e:
+                error = str(e)
+                logger.warning(f'预翻译失败 [{job.job_id}#{index}]: {e}')
+
+        finished = job.record(index, error, cached)
+        self._mark_dirty(job)
+        if finished:
+            logger.info(f'预翻译任务完成 {job.job_id}: {job.total} 句, 失败 {job.failed} 句')
+            self._flush(force=True)
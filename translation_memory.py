@@ -0,0 +1,266 @@
+"""
+翻译记忆模块
+学生常把课文里的句子稍作修改后再次翻译（改了标点、多一个词、空白不同），精确缓存都会错过。
+这里对已翻译过的句子建立 MinHash + LSH 分桶索引，查询时只比较少量候选，
+找出相似度超过阈值的最接近句子，作为模糊匹配标注在响应中，或按配置直接复用其译文
+"""
+
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from difflib import SequenceMatcher
+from typing import List, Optional, Tuple
+
+from text_normalization import CJK_LANGUAGES
+
+logger = logging.getLogger(__name__)
+
+MEMORY_MODES = ('off', 'suggest', 'reuse')
+# 每条约 3.4KB（原文、译文、词序列和分桶索引），默认约占 70MB
+DEFAULT_MAX_ENTRIES = 20000
+DEFAULT_THRESHOLD = 0.9
+# 更短的文本差一个词意思就可能完全不同，只走精确缓存
+DEFAULT_MIN_TOKENS = 4
+NUM_PERMUTATIONS = 32
+BAND_ROWS = 4
+MAX_CANDIDATES = 20
+LATENCY_WINDOW = 1000
+_PRIME = (1 << 61) - 1
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def tokenize(text: str, source: str) -> List[str]:
+    """中日韩文本按字切分，其他语言按词切分；标点和空白不参与比较"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    if source in CJK_LANGUAGES:
+        return [ch for ch in text if ch.isalnum()]
+    return _TOKEN_RE.findall(text)
+
+
+def client_match(match: dict) -> dict:
+    """返回给客户端的匹配信息：近似句子的原文可能来自其他用户，只保留在请求追踪中"""
+    return {key: value for key, value in match.items() if key != 'text'}
+
+
+class _Entry:
+    __slots__ = ('pair', 'text', 'result', 'tokens', 'numbers', 'bands')
+
+    def __init__(self, pair, text, result, tokens, numbers, bands):
+        self.pair = pair
+        self.text = text
+        self.result = result
+        self.tokens = tokens
+        self.numbers = numbers
+        self.bands = bands
+
+
+class TranslationMemory:
+    """
+    模糊匹配索引
+
+    每个句子取词（或字）的一元和二元组作为特征，计算 NUM_PERMUTATIONS 个 MinHash，
+    每 BAND_ROWS 个一段作为分桶键；至少有一段相同的句子才成为候选，
+    候选再按词序列的相似度（difflib ratio）精确打分。数字不同的句子不会匹配。
+    """
+
+    def __init__(self, mode: Optional[str] = None, max_entries: Optional[int] = None,
+                 threshold: Optional[float] = None, min_tokens: Optional[int] = None):
+        mode = mode if mode is not None else os.getenv('TRANSLATION_MEMORY_MODE', 'suggest').strip().lower()
+        if mode not in MEMORY_MODES:
+            logger.warning(f'不支持的翻译记忆模式 {mode}，使用 suggest')
+            mode = 'suggest'
+        self.mode = mode
+        self.max_entries = max_entries if max_entries is not None else \
+            int(_env_float('TRANSLATION_MEMORY_SIZE', DEFAULT_MAX_ENTRIES))
+        self.threshold = threshold if threshold is not None else \
+            _env_float('TRANSLATION_MEMORY_THRESHOLD', DEFAULT_THRESHOLD)
+        self.min_tokens = min_tokens if min_tokens is not None else \
+            int(_env_float('TRANSLATION_MEMORY_MIN_TOKENS', DEFAULT_MIN_TOKENS))
+        rng = random.Random(0)
+        self._permutations = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME))
+                              for _ in range(NUM_PERMUTATIONS)]
+        # ((source, target), 词序列) -> 条目，按最近使用排序
+        self._entries = OrderedDict()
+        # (source, target) -> 每段一个 {分桶键: [条目]}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.lookups = 0
+        self.matches = 0
+        self.reuses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off' and self.max_entries > 0
+
+    def _signature_bands(self, tokens: Tuple[str, ...]) -> List[int]:
+        features = {hash(token) for token in tokens}
+        features.update(hash(pair) for pair in zip(tokens, tokens[1:]))
+        signature = [min((a * h + b) % _PRIME for h in features) for a, b in self._permutations]
+        return [hash(tuple(signature[i:i + BAND_ROWS])) for i in range(0, NUM_PERMUTATIONS, BAND_ROWS)]
+
+    def _prepare(self, text: str, source: str):
+        tokens = tokenize(text, source)
+        if len(tokens) < self.min_tokens:
+            return None
+        numbers = tuple(sorted(token for token in tokens if any(ch.isdigit() for ch in token)))
+        return tuple(tokens), numbers
+
+    def add(self, text: str, source: str, target: str, result: str) -> None:
+        if not self.enabled:
+            return
+        prepared = self._prepare(text, source)
+        if prepared is None:
+            return
+        tokens, numbers = prepared
+        pair = (source, target)
+        bands = self._signature_bands(tokens)
+        with self._lock:
+            existing = self._entries.get((pair, tokens))
+            if existing is not None:
+                existing.text, existing.result = text, result
+                self._entries.move_to_end((pair, tokens))
+                return
+            entry = _Entry(pair, text, result, tokens, numbers, bands)
+            self._entries[(pair, tokens)] = entry
+            buckets = self._buckets.get(pair)
+            if buckets is None:
+                buckets = self._buckets[pair] = [{} for _ in bands]
+            for band, key in zip(buckets, bands):
+                band.setdefault(key, []).append(entry)
+            while len(self._entries) > self.max_entries:
+                self._evict(self._entries.popitem(last=False)[1])
+
+    def _evict(self, entry: _Entry) -> None:
+        # 调用方持有 self._lock
+        for band, key in zip(self._buckets[entry.pair], entry.bands):
+            bucket = band[key]
+            bucket.remove(entry)
+            if not bucket:
+                del band[key]
+
+    def lookup(self, text: str, source: str, target: str) -> Optional[dict]:
+        """返回最接近的已翻译句子 {'text', 'result', 'similarity'}，没有超过阈值的返回 None"""
+        if not self.enabled:
+            return None
+        prepared = self._prepare(text, source)
+        if prepared is None:
+            return None
+        start = time.perf_counter()
+        tokens, numbers = prepared
+        bands = self._signature_bands(tokens)
+        best, best_score = None, self.threshold
+        with self._lock:
+            buckets = self._buckets.get((source, target))
+            if buckets is not None:
+                counts = {}
+                for band, key in zip(buckets, bands):
+                    for entry in band.get(key, ()):
+                        counts[entry] = counts.get(entry, 0) + 1
+                candidates = sorted(counts, key=counts.get, reverse=True)[:MAX_CANDIDATES]
+                for entry in candidates:
+                    if entry.numbers != numbers:
+                        continue
+                    matcher = SequenceMatcher(None, tokens, entry.tokens, autojunk=False)
+                    if matcher.real_quick_ratio() < best_score or matcher.quick_ratio() < best_score:
+                        continue
+                    score = matcher.ratio()
+                    if score >= best_score:
+                        best, best_score = entry, score
+                if best is not None:
+                    self._entries.move_to_end((best.pair, best.tokens))
+            self.lookups += 1
+            self._latencies.append(time.perf_counter() - start)
+            if best is None:
+                return None
+            self.matches += 1
+            if self.mode == 'reuse':
+                self.reuses += 1
+            return {'text': best.text, 'result': best.result, 'similarity': round(best_score, 4)}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                'mode': self.mode,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'lookups': self.lookups,
+                'matches': self.matches,
+                'reuses': self.reuses,
+                'match_rate': round(self.matches / self.lookups, 4) if self.lookups else 0.0,
+                'lookup_p50_us': round(latencies[len(latencies) // 2] * 1e6, 1) if latencies else None,
+                'lookup_p99_us': round(latencies[int(len(latencies) * 0.99)] * 1e6, 1) if latencies else None,
+            }
+
+
+def _demo(entries: int = 200000, queries: int = 2000) -> None:
+    """用随机句子填充索引，测量插入耗时、内存和带少量编辑的句子的查询延迟"""
+    import resource
+
+    rng = random.Random(1)
+    vocabulary = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(2, 9)))
+                  for _ in range(20000)]
+    sentences = [' '.join(rng.choice(vocabulary) for _ in range(rng.randint(6, 20))) + '.'
+                 for _ in range(entries)]
+    memory = TranslationMemory(mode='suggest', max_entries=entries)
+
+    start = time.perf_counter()
+    for sentence in sentences:
+        memory.add(sentence, 'en', 'zh', sentence.upper())
+    print(f'插入 {entries} 条: {time.perf_counter() - start:.1f} s, '
+          f'峰值内存 {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB')
+
+    def edit(sentence):
+        words = sentence.rstrip('.').split()
+        choice = rng.random()
+        if choice < 0.33:
+            return ' '.join(words) + '!'
+        if choice < 0.66:
+            words.insert(rng.randrange(len(words)), rng.choice(vocabulary))
+            return ' '.join(words) + '.'
+        return '  '.join(words) + ' .'
+
+    hits = 0
+    latencies = []
+    for sentence in rng.sample(sentences, queries):
+        start = time.perf_counter()
+        match = memory.lookup(edit(sentence), 'en', 'zh')
+        latencies.append((time.perf_counter() - start) * 1e6)
+        hits += match is not None and match['text'] == sentence
+    misses = 0
+    for _ in range(queries):
+        start = time.perf_counter()
+        misses += memory.lookup(' '.join(rng.choice(vocabulary) for _ in range(12)), 'en', 'zh') is None
+        latencies.append((time.perf_counter() - start) * 1e6)
+    latencies.sort()
+    print(f'编辑过的句子命中 {hits}/{queries}，无关句子未命中 {misses}/{queries}；'
+          f'查询 p50 {latencies[len(latencies) // 2]:.0f} us, p99 {latencies[int(len(latencies) * 0.99)]:.0f} us')
+
+
+if __name__ == '__main__':
+    count = 200000
+    for arg in sys.argv:
+        if arg.startswith('--entries='):
+            count = int(arg.split('=')[1])
+    _demo(count)
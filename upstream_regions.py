@@ -0,0 +1,382 @@
+"""
+多区域上游路由模块
+维护一组腾讯翻译API区域接入点，持续记录每个区域的延迟和错误，
+请求优先发往最快的健康区域；连续失败的区域暂时熔断，冷却后再试。
+短文本（单词卡片查询）可以开启对冲：首个请求超过该区域的 p95 延迟仍未返回时，
+向下一个区域再发一次，取先返回的结果
+"""
+
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.error
+from collections import deque
+from typing import Callable, List, Optional
+from urllib.parse import urlsplit
+
+from request_deadline import DeadlineExceededError, remaining
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENDPOINTS = 'ap-guangzhou=https://tmt.tencentcloudapi.com/'
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_HEDGE_MAX_CHARS = 50
+DEFAULT_HEDGE_DELAY = 0.3
+MIN_HEDGE_DELAY = 0.05
+# 样本少于这么多时用默认对冲延迟，而不是不可靠的 p95
+MIN_HEDGE_SAMPLES = 20
+LATENCY_WINDOW = 200
+EWMA_ALPHA = 0.2
+FAILURE_THRESHOLD = 3
+COOLDOWN_SECONDS = 30.0
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+# 这些错误码只取决于请求内容（参数错误、不支持的语言对、文本过长），相同请求重试结果不变
+DETERMINISTIC_ERROR_PREFIXES = ('InvalidParameter', 'MissingParameter', 'UnsupportedOperation')
+
+
+class UpstreamError(Exception):
+    """腾讯API返回的业务错误，batch 表示来自合并后的 TextTranslateBatch 调用"""
+
+    def __init__(self, code: str, message: str, batch: bool = False):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.batch = batch
+
+    @property
+    def deterministic(self) -> bool:
+        return bool(self.code) and self.code.startswith(DETERMINISTIC_ERROR_PREFIXES)
+
+
+def is_region_failure(error: Exception) -> bool:
+    """
+    网络错误、超时和5xx说明该区域不可用，可以换区域重试；
+    4xx 等说明上游已经正常响应，问题在请求本身，换区域也没有用
+    """
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code >= 500
+    return isinstance(error, (urllib.error.URLError, OSError))
+
+
+class RegionEndpoint:
+    """单个区域接入点及其延迟、错误统计"""
+
+    def __init__(self, region: str, url: str):
+        self.region = region
+        self.url = url if url.endswith('/') else url + '/'
+        self.host = urlsplit(self.url).netloc
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.ewma_ms = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        # 进行中请求的开始时间，慢区域的请求还没返回时也能据此降低优先级
+        self._inflight = []
+
+    def begin(self) -> float:
+        # 调用方持有路由器的锁
+        started = time.monotonic()
+        self._inflight.append(started)
+        return started
+
+    def record(self, started: float, ok: bool) -> None:
+        # 调用方持有路由器的锁
+        self._inflight.remove(started)
+        latency = time.monotonic() - started
+        self.requests += 1
+        latency_ms = latency * 1000
+        if ok:
+            self._latencies.append(latency_ms)
+            self.ewma_ms = latency_ms if self.ewma_ms is None else \
+                EWMA_ALPHA * latency_ms + (1 - EWMA_ALPHA) * self.ewma_ms
+            self.error_rate *= 1 - EWMA_ALPHA
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+        else:
+            self.failures += 1
+            self.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * self.error_rate
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= FAILURE_THRESHOLD:
+                self.open_until = time.monotonic() + COOLDOWN_SECONDS
+
+    def forget(self, started: float) -> None:
+        # 调用方持有路由器的锁；被截止时间截断的请求不代表区域的延迟或故障
+        self._inflight.remove(started)
+
+    def available(self, now: float) -> bool:
+        return self.open_until <= now
+
+    def score(self, now: float, failure_ms: float) -> float:
+        """
+        得分越低越优先。还没有任何样本的区域得分为0，会被优先尝试一次；
+        只失败过、没有成功样本的区域按 failure_ms（请求超时）计算延迟，错误率才能起作用
+        """
+        if self.ewma_ms is not None:
+            latency_ms = self.ewma_ms
+        else:
+            latency_ms = failure_ms if self.failures else 0.0
+        if self._inflight:
+            latency_ms = max(latency_ms, (now - self._inflight[0]) * 1000)
+        return latency_ms * (1 + 4 * self.error_rate)
+
+    def percentile_ms(self, fraction: float) -> Optional[float]:
+        if len(self._latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+    def to_dict(self, now: float) -> dict:
+        p50 = self.percentile_ms(0.5)
+        p95 = self.percentile_ms(0.95)
+        return {
+            'region': self.region,
+            'url': self.url,
+            'available': self.available(now),
+            'requests': self.requests,
+            'failures': self.failures,
+            'error_rate': round(self.error_rate, 4),
+            'ewma_ms': round(self.ewma_ms, 1) if self.ewma_ms is not None else None,
+            'p50_ms': round(p50, 1) if p50 is not None else None,
+            'p95_ms': round(p95, 1) if p95 is not None else None,
+        }
+
+
+class RegionRouter:
+    """
+    按延迟和错误率选择区域
+
+    send(endpoint, timeout) 负责签名并发送一次请求；区域故障时换下一个区域，
+    对冲请求的输家在后台线程中完成，结果只用于更新统计。
+    """
+
+    def __init__(self, endpoints: List[RegionEndpoint], timeout: Optional[float] = None,
+                 hedge_max_chars: Optional[int] = None, hedge_delay: Optional[float] = None):
+        if not endpoints:
+            raise ValueError('至少需要配置一个上游区域')
+        self.endpoints = endpoints
+        self.timeout = timeout if timeout is not None else \
+            _env_float('UPSTREAM_TIMEOUT', DEFAULT_TIMEOUT)
+        self.hedge_max_chars = hedge_max_chars if hedge_max_chars is not None else \
+            int(_env_float('UPSTREAM_HEDGE_MAX_CHARS', DEFAULT_HEDGE_MAX_CHARS))
+        self.hedge_delay = hedge_delay if hedge_delay is not None else \
+            _env_float('UPSTREAM_HEDGE_DELAY', DEFAULT_HEDGE_DELAY)
+        self._lock = threading.Lock()
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+
+    @classmethod
+    def from_env(cls) -> 'RegionRouter':
+        """UPSTREAM_ENDPOINTS="ap-guangzhou=https://tmt.ap-guangzhou.tencentcloudapi.com,..." """
+        endpoints = []
+        for item in os.getenv('UPSTREAM_ENDPOINTS', DEFAULT_ENDPOINTS).split(','):
+            if '=' not in item:
+                continue
+            region, url = item.split('=', 1)
+            endpoints.append(RegionEndpoint(region.strip(), url.strip()))
+        return cls(endpoints)
+
+    def should_hedge(self, text: str) -> bool:
+        return len(self.endpoints) > 1 and 0 < len(text) <= self.hedge_max_chars
+
+    def ranked(self) -> List[RegionEndpoint]:
+        """健康区域按得分排序，熔断中的区域排在最后作为兜底"""
+        now = time.monotonic()
+        with self._lock:
+            return sorted(self.endpoints, key=lambda e: (not e.available(now), e.score(now, self.timeout * 1000)))
+
+    def _hedge_after(self, endpoint: RegionEndpoint) -> float:
+        with self._lock:
+            p95 = endpoint.percentile_ms(0.95)
+        if p95 is None:
+            return self.hedge_delay
+        return max(p95 / 1000, MIN_HEDGE_DELAY)
+
+    def _record(self, endpoint: RegionEndpoint, started: float, ok: bool) -> None:
+        with self._lock:
+            was_available = endpoint.available(time.monotonic())
+            endpoint.record(started, ok)
+            if was_available and not endpoint.available(time.monotonic()):
+                logger.warning(f'上游区域 {endpoint.region} 连续失败，熔断 {COOLDOWN_SECONDS:.0f} 秒')
+
+    def _deadline_exceeded(self) -> DeadlineExceededError:
+        with self._lock:
+            self.deadline_exceeded += 1
+        return DeadlineExceededError('翻译超时')
+
+    def call(self, send: Callable[[RegionEndpoint, float], object], hedge: bool = False,
+             timeout: Optional[float] = None, deadline: Optional[float] = None):
+        """
+        返回 (结果, 成功的区域, 实际发出的请求数)
+
+        每次尝试的超时不超过距 deadline 的剩余时间；时间到了不再对冲或换区域，
+        仍在进行的请求留在后台线程中结束，本次调用抛出 DeadlineExceededError
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        candidates = self.ranked()
+        results = queue.Queue()
+        # last 是最近发出的请求所在的区域，对冲延迟按它的 p95 计算
+        state = {'next': 0, 'pending': 0, 'sent': 0, 'last': None}
+
+        def attempt(endpoint, attempt_timeout):
+            with self._lock:
+                started = endpoint.begin()
+            try:
+                value = send(endpoint, attempt_timeout)
+            except Exception as e:
+                failure = is_region_failure(e)
+                left = remaining(deadline)
+                if failure and attempt_timeout < timeout and left is not None and left <= 0:
+                    with self._lock:
+                        endpoint.forget(started)
+                else:
+                    self._record(endpoint, started, not failure)
+                results.put((endpoint, None, e, failure))
+                return
+            self._record(endpoint, started, True)
+            results.put((endpoint, value, None, False))
+
+        def launch():
+            left = remaining(deadline)
+            if left is not None and left <= 0:
+                raise self._deadline_exceeded()
+            endpoint = state['last'] = candidates[state['next']]
+            state['next'] += 1
+            state['pending'] += 1
+            state['sent'] += 1
+            attempt_timeout = timeout if left is None else min(timeout, left)
+            threading.Thread(target=attempt, args=(endpoint, attempt_timeout),
+                             name=f'upstream-{endpoint.region}', daemon=True).start()
+
+        launch()
+        hedged_from = None
+        last_error = None
+        while state['pending']:
+            wait = None
+            if hedge and hedged_from is None and state['next'] < len(candidates):
+                wait = self._hedge_after(state['last'])
+            left = remaining(deadline)
+            if left is not None:
+                wait = max(left if wait is None else min(wait, left), 0)
+            try:
+                endpoint, value, error, failure = results.get(timeout=wait)
+            except queue.Empty:
+                left = remaining(deadline)
+                if left is not None and left <= 0:
+                    raise self._deadline_exceeded()
+                # 请求超过所在区域的 p95 仍未返回，向下一个区域发出对冲请求
+                hedged_from = state['last']
+                with self._lock:
+                    self.hedged_requests += 1
+                launch()
+                continue
+            state['pending'] -= 1
+            if error is None:
+                if hedged_from is not None and endpoint is not hedged_from:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return value, endpoint, state['sent']
+            if not failure:
+                raise error
+            last_error = error
+            logger.warning(f'上游区域 {endpoint.region} 请求失败: {error}')
+            if state['pending'] == 0 and state['next'] < len(candidates):
+                launch()
+        left = remaining(deadline)
+        if left is not None and left <= 0:
+            raise self._deadline_exceeded() from last_error
+        raise last_error
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'hedge_max_chars': self.hedge_max_chars,
+                'hedged_requests': self.hedged_requests,
+                'hedge_wins': self.hedge_wins,
+                'deadline_exceeded': self.deadline_exceeded,
+                'regions': [endpoint.to_dict(now) for endpoint in self.endpoints],
+            }
+
+
+def _demo(requests: int = 200) -> None:
+    """启动三个延迟不同的本地假上游，观察路由和对冲的效果"""
+    import random
+    import urllib.request
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    def make_handler(mean_ms, error_rate):
+        class FakeUpstream(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                time.sleep(random.expovariate(1000 / mean_ms))
+                if random.random() < error_rate:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                body = b'{"Response":{"TargetText":"ok"}}'
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+        return FakeUpstream
+
+    servers = []
+    endpoints = []
+    for region, mean_ms, error_rate in (('fast', 20, 0.0), ('slow', 80, 0.0), ('flaky', 10, 0.3)):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(mean_ms, error_rate))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        endpoints.append(RegionEndpoint(region, f'http://127.0.0.1:{server.server_address[1]}/'))
+
+    def send(endpoint, timeout):
+        request = urllib.request.Request(endpoint.url, data=b'{}', method='POST')
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.read()
+
+    for hedge in (False, True):
+        router = RegionRouter([RegionEndpoint(e.region, e.url) for e in endpoints],
+                              timeout=2.0, hedge_max_chars=50, hedge_delay=0.1)
+        latencies = []
+        winners = {}
+        for _ in range(requests):
+            start = time.perf_counter()
+            _, endpoint, _ = router.call(send, hedge=hedge)
+            latencies.append((time.perf_counter() - start) * 1000)
+            winners[endpoint.region] = winners.get(endpoint.region, 0) + 1
+        latencies.sort()
+        print(f'对冲={"开" if hedge else "关"}: p50 {latencies[len(latencies) // 2]:.1f} ms, '
+              f'p95 {latencies[int(len(latencies) * 0.95)]:.1f} ms, '
+              f'p99 {latencies[int(len(latencies) * 0.99)]:.1f} ms, 成功区域 {winners}')
+        for region in router.stats()['regions']:
+            print(f'    {region}')
+
+    for server in servers:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    count = 200
+    for arg in sys.argv:
+        if arg.startswith('--requests='):
+            count = int(arg.split('=')[1])
+    _demo(count)
@@ -0,0 +1,203 @@
+"""
+上游用量统计模块
+按天、按语言对记录实际发往腾讯API的调用数和字符数，以及由缓存直接返回的部分；
+计数先累加在内存中，由后台线程定期批量写入JSON文件。
+设置月度字符预算后，当月用量耗尽时代理只返回缓存结果，不再调用上游
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USAGE_FILE = 'logs/usage.json'
+DEFAULT_FLUSH_INTERVAL = 10.0
+DEFAULT_RETENTION_DAYS = 400
+COUNTER_NAMES = ('upstream_calls', 'upstream_chars', 'failed_calls', 'cached_calls', 'cached_chars')
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def parse_usage_days(query: str) -> int:
+    """解析 /admin/usage 的 days 参数"""
+    from urllib.parse import parse_qs
+
+    try:
+        return int(parse_qs(query).get('days', ['31'])[0])
+    except ValueError:
+        return 31
+
+
+class BudgetExhaustedError(Exception):
+    """本月字符预算已用完，只能返回缓存结果"""
+
+
+class UsageTracker:
+    """
+    用量计数器
+
+    path 为 None 时只在内存中统计；monthly_budget 为 0 表示不限制。
+    """
+
+    def __init__(self, path: Optional[str] = None, monthly_budget: int = 0,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 retention_days: int = DEFAULT_RETENTION_DAYS):
+        self.path = path
+        self.monthly_budget = monthly_budget
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self._days = {}
+        # 本月上游字符数的缓存，预算检查在每次未命中缓存时都会执行
+        self._month = None
+        self._month_chars = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._load()
+
+    @classmethod
+    def from_env(cls) -> 'UsageTracker':
+        """USAGE_FILE 设为空字符串时不持久化"""
+        path = os.getenv('USAGE_FILE', DEFAULT_USAGE_FILE) or None
+        return cls(path,
+                   int(_env_float('MONTHLY_CHAR_BUDGET', 0)),
+                   _env_float('USAGE_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL),
+                   int(_env_float('USAGE_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)))
+
+    def _load(self) -> None:
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._days = json.load(f).get('days', {})
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f'无法加载用量统计 {self.path}: {e}')
+
+    def start(self) -> None:
+        if not self.path:
+            return
+        self._thread = threading.Thread(target=self._run, name='usage-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _counters(self, source: str, target: str) -> dict:
+        # 调用方持有 self._lock
+        day = self._days.setdefault(time.strftime('%Y-%m-%d'), {})
+        counters = day.get(f'{source}->{target}')
+        if counters is None:
+            counters = day[f'{source}->{target}'] = dict.fromkeys(COUNTER_NAMES, 0)
+        return counters
+
+    def record_cached(self, source: str, target: str, characters: int) -> None:
+        with self._lock:
+            counters = self._counters(source, target)
+            counters['cached_calls'] += 1
+            counters['cached_chars'] += characters
+            self._dirty = True
+
+    def record_upstream(self, source: str, target: str, characters: int, ok: bool = True,
+                        calls: int = 1) -> None:
+        """calls 大于1表示同一段文本发出了多次请求（对冲），每次都按字符计费"""
+        with self._lock:
+            # 先汇总本月已有用量，再累加这次的字符数，避免重复计入
+            self._current_month_chars()
+            counters = self._counters(source, target)
+            if ok:
+                counters['upstream_calls'] += calls
+                counters['upstream_chars'] += characters * calls
+                self._month_chars += characters * calls
+            else:
+                counters['failed_calls'] += 1
+            self._dirty = True
+
+    def _sum_month(self, month: str) -> int:
+        return sum(counters['upstream_chars']
+                   for day, pairs in self._days.items() if day.startswith(month)
+                   for counters in pairs.values())
+
+    def _current_month_chars(self) -> int:
+        # 调用方持有 self._lock；跨月后重新汇总
+        month = time.strftime('%Y-%m')
+        if month != self._month:
+            self._month = month
+            self._month_chars = self._sum_month(month)
+        return self._month_chars
+
+    def month_usage(self, month: Optional[str] = None) -> int:
+        """某月（YYYY-MM，默认本月）发往上游的字符数"""
+        with self._lock:
+            if month is None:
+                return self._current_month_chars()
+            return self._sum_month(month)
+
+    def check_budget(self, characters: int) -> None:
+        """这次调用会超出月度预算时抛出 BudgetExhaustedError"""
+        if self.monthly_budget <= 0:
+            return
+        if self.month_usage() + characters > self.monthly_budget:
+            raise BudgetExhaustedError('本月翻译额度已用完，目前只提供已缓存的翻译')
+
+    def flush(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            cutoff = time.strftime('%Y-%m-%d', time.localtime(time.time() - self.retention_days * 86400))
+            for day in [day for day in self._days if day < cutoff]:
+                del self._days[day]
+            snapshot = json.dumps({'days': self._days}, ensure_ascii=False)
+            self._dirty = False
+        with self._save_lock:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(snapshot)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f'保存用量统计失败: {e}')
+                with self._lock:
+                    self._dirty = True
+
+    def report(self, days: int = 31) -> dict:
+        used = self.month_usage()
+        with self._lock:
+            recent = sorted(self._days)[-days:] if days > 0 else []
+            daily = {day: {pair: dict(counters) for pair, counters in self._days[day].items()}
+                     for day in recent}
+        return {
+            'month': time.strftime('%Y-%m'),
+            'month_upstream_chars': used,
+            'monthly_budget': self.monthly_budget or None,
+            'remaining': max(self.monthly_budget - used, 0) if self.monthly_budget > 0 else None,
+            'cache_only': 0 < self.monthly_budget <= used,
+            'days': daily,
+        }